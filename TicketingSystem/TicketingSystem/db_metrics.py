@@ -0,0 +1,98 @@
+"""
+Connection usage metrics for the configured databases.
+
+Figures are collected per worker process; a monitoring scraper should query
+every worker (or aggregate per host) to get totals.
+
+In pool mode Django signals connection_created on every checkout from the
+pool, so the opened and checkout counts of pooled aliases come from the
+pool's own statistics instead.
+"""
+import threading
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_lock = threading.Lock()
+_counters = {}
+
+
+def _increment(alias, key):
+    with _lock:
+        counters = _counters.setdefault(alias, {'connections_opened': 0, 'checkouts': 0})
+        counters[key] += 1
+
+
+def is_pooled(connection):
+    return connection.vendor == 'postgresql' and connection.pool is not None
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    if not is_pooled(connection):
+        _increment(connection.alias, 'connections_opened')
+
+
+def record_checkouts():
+    """
+    Count one checkout for every connection the current request has open.
+    Must run before Django closes or returns the connections at the end of
+    the request.
+    """
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is not None and not is_pooled(connection):
+            _increment(connection.alias, 'checkouts')
+
+
+def pool_stats(alias):
+    """
+    Statistics of the psycopg pool behind alias, or None when not pooled.
+    """
+    if not is_pooled(connections[alias]):
+        return None
+    pool = connections[alias].pool
+
+    stats = pool.get_stats()
+    in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+    requests = stats.get('requests_num', 0)
+    return {
+        'size': stats.get('pool_size', 0),
+        'min_size': stats.get('pool_min', 0),
+        'max_size': stats.get('pool_max', 0),
+        'available': stats.get('pool_available', 0),
+        'in_use': in_use,
+        'waiting': stats.get('requests_waiting', 0),
+        'checkouts': requests,
+        'checkout_errors': stats.get('requests_errors', 0),
+        'wait_ms_total': stats.get('requests_wait_ms', 0),
+        'wait_ms_avg': round(stats.get('requests_wait_ms', 0) / requests, 3) if requests else 0.0,
+        'saturation': round(in_use / stats['pool_max'], 3) if stats.get('pool_max') else 0.0,
+        'connections_opened': stats.get('connections_num', 0),
+        'connect_ms_total': stats.get('connections_ms', 0),
+    }
+
+
+def database_metrics():
+    """
+    Connection metrics for every configured database alias.
+    """
+    metrics = {}
+    for alias in settings.DATABASES:
+        pool = pool_stats(alias)
+        if pool is None:
+            with _lock:
+                counters = dict(_counters.get(alias, {'connections_opened': 0, 'checkouts': 0}))
+        else:
+            counters = {'connections_opened': pool['connections_opened'], 'checkouts': pool['checkouts']}
+        metrics[alias] = {
+            'mode': settings.POSTGRES_CONN_MODE,
+            'conn_max_age': settings.DATABASES[alias].get('CONN_MAX_AGE', 0),
+            **counters,
+            'reuse_ratio': (
+                round(1 - counters['connections_opened'] / counters['checkouts'], 3)
+                if counters['checkouts'] else 0.0
+            ),
+            'pool': pool,
+        }
+    return metrics
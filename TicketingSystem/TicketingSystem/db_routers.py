@@ -0,0 +1,108 @@
+"""
+Routing of read queries to PostgreSQL read replicas.
+
+Reads only go to a replica while a request has opted in through
+use_replica() (see ReplicaRoutingMiddleware); everything else, including all
+writes, migrations and management commands, uses the primary.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+_read_alias = ContextVar('read_alias', default=None)
+
+_lag_lock = threading.Lock()
+_lag_checked_at = {}
+_replica_healthy = {}
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != 'default']
+
+
+def measure_replica_lag(alias):
+    """
+    Return the replication delay of a replica in seconds. A server that is
+    not in recovery (for example a test mirror) reports no lag.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE "
+            "WHEN NOT pg_is_in_recovery() THEN 0 "
+            "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def is_replica_healthy(alias):
+    """
+    Whether a replica is reachable and within REPLICA_MAX_LAG_SECONDS. The
+    result is cached per process for REPLICA_LAG_CHECK_INTERVAL seconds.
+    """
+    now = time.monotonic()
+    if now - _lag_checked_at.get(alias, float('-inf')) < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return _replica_healthy.get(alias, False)
+
+    with _lag_lock:
+        if now - _lag_checked_at.get(alias, float('-inf')) >= settings.REPLICA_LAG_CHECK_INTERVAL:
+            try:
+                lag = measure_replica_lag(alias)
+                healthy = lag <= settings.REPLICA_MAX_LAG_SECONDS
+                if not healthy:
+                    logger.warning('Replica %s is %.1fs behind, reading from primary', alias, lag)
+            except DatabaseError:
+                logger.warning('Replica %s is unreachable, reading from primary', alias, exc_info=True)
+                healthy = False
+            _replica_healthy[alias] = healthy
+            _lag_checked_at[alias] = now
+    return _replica_healthy[alias]
+
+
+def choose_replica():
+    """
+    Pick a random healthy replica, or None when reads should use the primary.
+    """
+    healthy = [alias for alias in replica_aliases() if is_replica_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+@contextmanager
+def use_replica(alias):
+    """
+    Route ORM reads in this context to alias (None means the primary).
+    """
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send reads to the replica selected for the current context and all writes
+    and migrations to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,84 @@
+"""
+Per-request instrumentation: SQL query count and time, serializer time and
+the most repeated query shapes of sampled requests.
+"""
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+_current = ContextVar('request_metrics', default=None)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def query_shape(sql):
+    """
+    Normalize a SQL statement so that queries differing only in their
+    parameters (including the length of IN lists) share a shape.
+    """
+    sql = LITERALS.sub('%s', sql)
+    return PLACEHOLDER_LISTS.sub('(...)', sql)
+
+
+class RequestMetrics:
+    """
+    Measurements collected while one sampled request is processed.
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.query_shapes = Counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.query_count += 1
+            self.query_shapes[query_shape(sql)] += 1
+
+    def top_query_shapes(self, limit=5):
+        return [
+            {'count': count, 'sql': sql}
+            for sql, count in self.query_shapes.most_common(limit)
+            if count > 1
+        ]
+
+
+def start_request():
+    """
+    Begin collecting metrics for the current context.
+    """
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+class TimedSerializerMixin:
+    """
+    Attribute the time spent in to_representation() to the current request.
+    Only the outermost serializer is timed, so nested serializers are not
+    counted twice. Does nothing unless the request is being sampled.
+    """
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or metrics.serializer_depth:
+            return super().to_representation(instance)
+
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.serializer_depth -= 1
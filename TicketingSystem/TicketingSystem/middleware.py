@@ -0,0 +1,147 @@
+import json
+import logging
+import random
+import re
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from .db_metrics import record_checkouts
+from .db_routers import choose_replica, use_replica
+from .instrumentation import finish_request, start_request
+
+request_logger = logging.getLogger('TicketingSystem.requests')
+slow_request_logger = logging.getLogger('TicketingSystem.slow_requests')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+ADMIN_CHANGELIST = re.compile(r'^/admin/[^/]+/[^/]+/$')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serve safe-method API requests and admin changelists from a read replica.
+
+    Any unsafe request sets a short-lived cookie that keeps the client's reads
+    on the primary for REPLICA_STICKY_SECONDS, so users always see their own
+    writes even when the replicas lag behind.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS_ENABLED:
+            return self.get_response(request)
+
+        alias = choose_replica() if self.can_use_replica(request) else None
+        with use_replica(alias):
+            response = self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE_NAME,
+                str(int(time.time() + settings.REPLICA_STICKY_SECONDS)),
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def can_use_replica(self, request):
+        """
+        Whether this request may read from a replica.
+        """
+        if request.method not in SAFE_METHODS:
+            return False
+        if not (request.path.startswith('/api/') or ADMIN_CHANGELIST.match(request.path)):
+            return False
+        try:
+            sticky_until = int(request.COOKIES.get(settings.REPLICA_STICKY_COOKIE_NAME, 0))
+        except ValueError:
+            sticky_until = 0
+        return sticky_until <= time.time()
+
+
+class ConnectionMetricsMiddleware:
+    """
+    Count database connection checkouts for the metrics endpoint.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        record_checkouts()
+        return response
+
+
+class RequestTimingMiddleware:
+    """
+    Measure where the time of a request goes and report it in a
+    Server-Timing header and a structured log line.
+
+    Only a REQUEST_TIMING_SAMPLE_RATE fraction of requests record SQL and
+    serializer timings; the rest only measure their total duration.
+    Requests slower than SLOW_REQUEST_THRESHOLD_MS are also logged to the
+    slow request log, with their most repeated query shapes when sampled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        if not sample_rate or random.random() >= sample_rate:
+            start = time.perf_counter()
+            response = self.get_response(request)
+            total_ms = (time.perf_counter() - start) * 1000
+            response['Server-Timing'] = f'total;dur={total_ms:.1f}'
+            if total_ms >= settings.SLOW_REQUEST_THRESHOLD_MS:
+                self.log_slow_request(request, response, {'total_ms': round(total_ms, 1)})
+            return response
+
+        metrics, token = start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.record_query))
+                start = time.perf_counter()
+                response = self.get_response(request)
+                total_ms = (time.perf_counter() - start) * 1000
+        finally:
+            finish_request(token)
+
+        sql_ms = metrics.sql_time * 1000
+        serializer_ms = metrics.serializer_time * 1000
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={sql_ms:.1f};desc="{metrics.query_count} queries"',
+            f'serialize;dur={serializer_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+        summary = {
+            'query_count': metrics.query_count,
+            'sql_ms': round(sql_ms, 1),
+            'serializer_ms': round(serializer_ms, 1),
+            'total_ms': round(total_ms, 1),
+        }
+        request_logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **summary,
+        }))
+        if total_ms >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            self.log_slow_request(
+                request, response, {**summary, 'repeated_queries': metrics.top_query_shapes()}
+            )
+        return response
+
+    def log_slow_request(self, request, response, summary):
+        slow_request_logger.warning(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **summary,
+        }))
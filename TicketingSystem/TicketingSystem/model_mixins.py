@@ -0,0 +1,22 @@
+"""
+Model helpers shared by the apps.
+"""
+
+
+class CounterFieldsMixin:
+    """
+    Keep full saves of a loaded instance from writing back the counters in
+    counter_fields, which are only ever changed by UPDATE ... SET field =
+    field + n; the value loaded with the instance may be stale by then.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Deferred fields are left out too, as Model.save() does
+            skipped = {*self.counter_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
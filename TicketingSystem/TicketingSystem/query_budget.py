@@ -0,0 +1,61 @@
+"""
+Per-endpoint SQL query budgets.
+
+Views declare the most queries each HTTP method may run:
+
+    class TicketListView(APIView):
+        query_budget = {'get': QueryBudget(3), 'post': QueryBudget(9)}
+
+A budget is a constant: it must hold however much data the endpoint reads.
+Paginated endpoints declare QueryBudget(n, paginated=True); n then applies to
+every page, and the test runner follows the pagination links to check the
+pages after the first one too.
+
+Budgets are checked by tests (see TicketingSystem.testing); nothing here
+runs at request time.
+"""
+
+IGNORED_METHODS = ('head', 'options')
+
+
+class QueryBudget:
+    """
+    The maximum number of queries one request may run.
+    """
+
+    def __init__(self, queries, paginated=False):
+        self.queries = queries
+        self.paginated = paginated
+
+    def __repr__(self):
+        return f'QueryBudget({self.queries}, paginated={self.paginated})'
+
+
+def get_budget(view_class, method):
+    return getattr(view_class, 'query_budget', {}).get(method.lower())
+
+
+def view_methods(view_class):
+    """
+    HTTP methods a view class implements.
+    """
+    return [
+        method for method in view_class.http_method_names
+        if method not in IGNORED_METHODS and hasattr(view_class, method)
+    ]
+
+
+def missing_budgets(urlpatterns):
+    """
+    Return 'url name: METHOD' for every implemented method of every view in
+    urlpatterns that has no query budget.
+    """
+    missing = []
+    for pattern in urlpatterns:
+        view_class = getattr(pattern.callback, 'view_class', None)
+        if view_class is None:
+            continue
+        for method in view_methods(view_class):
+            if get_budget(view_class, method) is None:
+                missing.append(f'{pattern.name}: {method.upper()}')
+    return missing
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
     'drf_spectacular',
@@ -38,6 +39,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'TicketingSystem.middleware.RequestTimingMiddleware',
+    'TicketingSystem.middleware.ConnectionMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -45,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'TicketingSystem.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'TicketingSystem.urls'
@@ -81,6 +85,51 @@ DATABASES = {
     }
 }
 
+# Connection management for the primary (and replicas):
+#   off        - a new connection per request
+#   persistent - reuse connections for POSTGRES_CONN_MAX_AGE seconds with a
+#                health check before reuse (WSGI workers)
+#   pool       - a psycopg connection pool shared by the threads of a
+#                process (ASGI workers)
+POSTGRES_CONN_MODE = os.getenv('POSTGRES_CONN_MODE', 'off')
+if POSTGRES_CONN_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('POSTGRES_CONN_MAX_AGE', 300))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif POSTGRES_CONN_MODE == 'pool':
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('POSTGRES_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.getenv('POSTGRES_POOL_TIMEOUT', 10)),
+        },
+    }
+
+# Read replicas, as a comma-separated list of host[:port][/name] entries.
+# For example POSTGRES_REPLICAS=replica1:5432,replica2:5432
+# Each replica shares the primary's credentials and mirrors it in tests.
+for index, replica in enumerate(filter(None, os.getenv('POSTGRES_REPLICAS', '').split(',')), start=1):
+    address, _, name = replica.strip().partition('/')
+    host, _, port = address.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['TicketingSystem.db_routers.ReplicaRouter']
+DATABASE_REPLICAS_ENABLED = len(DATABASES) > 1
+
+# Seconds a client's reads stay on the primary after it writes
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+REPLICA_STICKY_COOKIE_NAME = 'db_primary_until'
+
+# Replicas lagging more than this many seconds are skipped
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -101,6 +150,23 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# PBKDF2 runs on a bounded thread pool (see apps.Users.hashers); the other
+# hashers are kept so that existing hashes of those kinds still verify.
+PASSWORD_HASHERS = [
+    'apps.Users.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# PBKDF2 iterations; empty uses Django's default. Measure the effect with
+# `manage.py bench_password_hashing`.
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS') or 0) or None
+# Hashes computed at the same time per process (default: one per CPU)
+PASSWORD_HASHING_THREADS = int(os.getenv('PASSWORD_HASHING_THREADS') or 0) or os.cpu_count()
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -137,8 +203,59 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Proxies in front of the app that append to X-Forwarded-For. Client IPs
+    # (for per-IP throttling) are read that many entries from the end of the
+    # header; with 0 the header is ignored and REMOTE_ADDR is used
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
+}
+
+# Shared cache. Without REDIS_URL each process has its own local memory cache.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# Tickets an agent can see through the API: 'all', or 'assigned' for the
+# tickets assigned to them plus the unassigned queue. Admins always see all.
+TICKET_AGENT_SCOPE = os.getenv('TICKET_AGENT_SCOPE', 'all')
+
+# Token-bucket rate limits for creating tickets, messages and attachments
+# (apps.Tickets.throttling). Each request takes a token from the user's
+# bucket (limit by user_type; a missing rate means unlimited) and from the
+# client IP's bucket. Setting a THROTTLE_* variable to an empty value lifts
+# that limit, e.g. for load tests where every virtual user shares one IP.
+THROTTLE_REDIS_URL = os.getenv('THROTTLE_REDIS_URL', REDIS_URL)
+THROTTLE_REDIS_TIMEOUT = float(os.getenv('THROTTLE_REDIS_TIMEOUT', 0.25))
+TICKET_THROTTLE_RATES = {
+    'customer': {
+        'ticket_create': os.getenv('THROTTLE_CUSTOMER_TICKETS', '20/hour'),
+        'message_create': os.getenv('THROTTLE_CUSTOMER_MESSAGES', '120/hour'),
+        'attachment_upload': os.getenv('THROTTLE_CUSTOMER_ATTACHMENTS', '60/hour'),
+    },
+    'agent': {
+        'ticket_create': os.getenv('THROTTLE_AGENT_TICKETS', '200/hour'),
+        'message_create': os.getenv('THROTTLE_AGENT_MESSAGES', '1200/hour'),
+        'attachment_upload': os.getenv('THROTTLE_AGENT_ATTACHMENTS', '600/hour'),
+    },
+    'admin': {},
+}
+TICKET_THROTTLE_IP_RATES = {
+    'ticket_create': os.getenv('THROTTLE_IP_TICKETS', '300/hour'),
+    'message_create': os.getenv('THROTTLE_IP_MESSAGES', '2400/hour'),
+    'attachment_upload': os.getenv('THROTTLE_IP_ATTACHMENTS', '1200/hour'),
 }
 
+# How long (seconds) a create request's Idempotency-Key is remembered and its
+# response replayed; expired keys are removed by sweep_idempotency_keys
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+# Seconds a request holds its key before a retry may take it over; keep it
+# above the longest request time
+IDEMPOTENCY_KEY_LEASE = int(os.getenv('IDEMPOTENCY_KEY_LEASE', 120))
+
 # DRF Spectacular Configuration
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Ticketing System API',
@@ -193,4 +310,123 @@ REFRESH_TOKEN_COOKIE_NAME = 'refresh_token'
 REFRESH_TOKEN_COOKIE_SECURE = not DEBUG  # True in production (HTTPS only)
 REFRESH_TOKEN_COOKIE_HTTPONLY = True  # Prevents JavaScript access
 REFRESH_TOKEN_COOKIE_SAMESITE = 'Lax'  # CSRF protection
-REFRESH_TOKEN_COOKIE_MAX_AGE = 60 * 60 * 24  # 1 day in seconds
\ No newline at end of file
+REFRESH_TOKEN_COOKIE_MAX_AGE = 60 * 60 * 24  # 1 day in seconds
+# Ticket activity log
+TICKET_ACTIVITY_PAGE_SIZE = 50
+TICKET_ACTIVITY_MAX_PAGE_SIZE = 200
+TICKET_ACTIVITY_ARCHIVE_DIR = os.getenv('TICKET_ACTIVITY_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'activity'))
+
+# Ticket message threads
+TICKET_MESSAGE_PAGE_SIZE = 50
+TICKET_MESSAGE_MAX_PAGE_SIZE = 200
+
+# Near-duplicate detection at ticket creation (apps.Tickets.dedup): open
+# tickets created within the window are compared, and up to LIMIT with an
+# estimated similarity of at least THRESHOLD are recorded for staff and
+# returned to the creator if they may see them
+TICKET_DUPLICATE_WINDOW_DAYS = int(os.getenv('TICKET_DUPLICATE_WINDOW_DAYS', 7))
+TICKET_DUPLICATE_THRESHOLD = float(os.getenv('TICKET_DUPLICATE_THRESHOLD', 0.5))
+TICKET_DUPLICATE_LIMIT = 5
+TICKET_DUPLICATE_MAX_CANDIDATES = 200
+
+# Priority triage model written by train_priority_model (apps.Tickets.triage)
+TICKET_PRIORITY_MODEL_PATH = os.getenv('TICKET_PRIORITY_MODEL_PATH', str(BASE_DIR / 'triage' / 'priority.model'))
+
+# Reply suggestions from resolved tickets (apps.Tickets.suggestions): tickets
+# returned by default and at most, staff replies shown per ticket, and the
+# most postings read per query
+TICKET_SUGGESTION_LIMIT = 5
+TICKET_SUGGESTION_MAX_LIMIT = 20
+TICKET_SUGGESTION_REPLIES = 3
+TICKET_SUGGESTION_MAX_POSTINGS = int(os.getenv('TICKET_SUGGESTION_MAX_POSTINGS', 5000))
+
+# Attachment previews (generate_previews, apps.Tickets.previews): lines and
+# characters per line of text previews, the longest side of image
+# thumbnails in pixels, rendering processes, and attachments saved per batch
+TICKET_ATTACHMENT_PREVIEW_LINES = int(os.getenv('TICKET_ATTACHMENT_PREVIEW_LINES', 20))
+TICKET_ATTACHMENT_PREVIEW_LINE_LENGTH = 200
+TICKET_ATTACHMENT_THUMBNAIL_SIZE = int(os.getenv('TICKET_ATTACHMENT_THUMBNAIL_SIZE', 320))
+TICKET_ATTACHMENT_PREVIEW_WORKERS = int(os.getenv('TICKET_ATTACHMENT_PREVIEW_WORKERS', os.cpu_count() or 1))
+TICKET_ATTACHMENT_PREVIEW_BATCH_SIZE = 100
+
+# Attachment storage quotas in bytes (apps.Tickets.quotas): the most a user
+# may upload and the most one ticket may hold; 0 disables a quota. The
+# storage report lists this many tickets and users by default and at most
+USER_ATTACHMENT_QUOTA_BYTES = int(os.getenv('USER_ATTACHMENT_QUOTA_BYTES', 5 * 1024 ** 3))
+TICKET_ATTACHMENT_QUOTA_BYTES = int(os.getenv('TICKET_ATTACHMENT_QUOTA_BYTES', 1024 ** 3))
+ATTACHMENT_STORAGE_REPORT_LIMIT = 20
+ATTACHMENT_STORAGE_REPORT_MAX_LIMIT = 200
+
+# Customer context for agents (apps.Users.context): recent orders and
+# tickets returned, and seconds a context stays cached
+CUSTOMER_CONTEXT_ORDERS = 5
+CUSTOMER_CONTEXT_TICKETS = 5
+CUSTOMER_CONTEXT_CACHE_TTL = int(os.getenv('CUSTOMER_CONTEXT_CACHE_TTL', 300))
+
+# Purging deleted tickets (purge_deleted_tickets, apps.Tickets.purge): rows
+# deleted per transaction
+TICKET_PURGE_BATCH_SIZE = int(os.getenv('TICKET_PURGE_BATCH_SIZE', 1000))
+
+# Ticket event outbox (apps.Tickets.events)
+OUTBOX_PAGE_SIZE = 500
+OUTBOX_MAX_PAGE_SIZE = 5000
+# Events are kept this many days, and until every consumer is past them
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', 7))
+
+# Webhook delivery (deliver_webhooks): connections shared by every
+# subscription, request timeout in seconds, and attempts before a request
+# is dead-lettered, with exponential backoff (in seconds) between them
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 200))
+WEBHOOK_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', 10))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 8))
+WEBHOOK_BACKOFF_BASE = float(os.getenv('WEBHOOK_BACKOFF_BASE', 1))
+WEBHOOK_BACKOFF_MAX = float(os.getenv('WEBHOOK_BACKOFF_MAX', 300))
+# Outbox events read per subscription at a time, and seconds between polls
+WEBHOOK_PAGE_SIZE = 1000
+WEBHOOK_POLL_INTERVAL = float(os.getenv('WEBHOOK_POLL_INTERVAL', 1))
+WEBHOOK_DEAD_LETTER_PAGE_SIZE = 50
+WEBHOOK_DEAD_LETTER_MAX_PAGE_SIZE = 200
+
+# Legacy ticket import (import_tickets and the admin import endpoint): rows
+# written per transaction, users/orders kept in each lookup cache, and the
+# longest NDJSON line accepted
+TICKET_IMPORT_BATCH_SIZE = int(os.getenv('TICKET_IMPORT_BATCH_SIZE', 2000))
+TICKET_IMPORT_CACHE_SIZE = int(os.getenv('TICKET_IMPORT_CACHE_SIZE', 100000))
+TICKET_IMPORT_MAX_LINE_BYTES = int(os.getenv('TICKET_IMPORT_MAX_LINE_BYTES', 8 * 1024 * 1024))
+
+# Email ingestion (ingest_mail): messages written per transaction, parsing
+# processes, and the largest message accepted
+MAIL_INGEST_BATCH_SIZE = int(os.getenv('MAIL_INGEST_BATCH_SIZE', 500))
+MAIL_INGEST_WORKERS = int(os.getenv('MAIL_INGEST_WORKERS', os.cpu_count() or 1))
+MAIL_MAX_MESSAGE_BYTES = int(os.getenv('MAIL_MAX_MESSAGE_BYTES', 25 * 1024 * 1024))
+
+# Admin changelists count rows exactly below this size and use the
+# PostgreSQL planner estimate above it
+ADMIN_EXACT_COUNT_LIMIT = int(os.getenv('ADMIN_EXACT_COUNT_LIMIT', 100000))
+
+# Request instrumentation
+# Fraction of requests that record SQL and serializer timings (0 disables)
+REQUEST_TIMING_SAMPLE_RATE = float(os.getenv('REQUEST_TIMING_SAMPLE_RATE', 0))
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'TicketingSystem.requests': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'TicketingSystem.slow_requests': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
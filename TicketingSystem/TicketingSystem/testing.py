@@ -0,0 +1,80 @@
+"""
+Test support: checking endpoints against their query budgets
+(TicketingSystem.query_budget).
+
+QueryBudgetTestCase calls an endpoint against growing fixtures and fails if
+a request goes over budget or if the query count grows with the data.
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from .query_budget import get_budget
+
+# Test cases run inside a transaction, which turns every atomic block into
+# savepoint statements that a request would not send in production
+SAVEPOINT_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Base class for tests that check endpoints against their query budgets.
+    """
+
+    sizes = (1, 10, 50)
+
+    def measure(self, method, request):
+        """
+        Send one request and return (response, captured queries). The cache is
+        cleared first so every measurement includes the cold path.
+        """
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(**request)
+        queries = [
+            query for query in context.captured_queries
+            if not query['sql'].startswith(SAVEPOINT_STATEMENTS)
+        ]
+        return response, queries
+
+    def check_request(self, budget, label, response, queries):
+        self.assertLess(
+            response.status_code, 400,
+            f'{label} returned {response.status_code}: {getattr(response, "data", response.content)}'
+        )
+        if len(queries) > budget.queries:
+            self.fail(
+                f'{label} ran {len(queries)} queries, budget is {budget.queries}:\n'
+                + '\n'.join(query['sql'] for query in queries)
+            )
+
+    def assertQueryBudget(self, view_class, method, setup, sizes=None):
+        """
+        For every size, call setup(size) to grow the fixtures and return the
+        request kwargs (path, data, format, ...), send the request and check
+        the queries it ran against the view's budget.
+        """
+        method = method.lower()
+        budget = get_budget(view_class, method)
+        self.assertIsNotNone(budget, f'{view_class.__name__} has no query budget for {method.upper()}')
+
+        counts = {}
+        for size in sizes or self.sizes:
+            request = setup(size)
+            label = f'{method.upper()} {request["path"]} ({view_class.__name__}, size {size})'
+            response, queries = self.measure(method, request)
+            self.check_request(budget, label, response, queries)
+            counts[size] = len(queries)
+
+            if budget.paginated and method == 'get':
+                for key in ('next', 'previous'):
+                    link = response.data.get(key)
+                    if link:
+                        page_response, page_queries = self.measure('get', {'path': link})
+                        self.check_request(budget, f'{label} {key} page', page_response, page_queries)
+
+        first = counts[min(counts)]
+        self.assertTrue(
+            all(count <= first for count in counts.values()),
+            f'{view_class.__name__} {method.upper()} query count grows with the data: {counts}'
+        )
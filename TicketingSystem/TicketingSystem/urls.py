@@ -4,6 +4,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from .views import DatabaseMetricsView
 
 urlpatterns = [
     # Admin
@@ -20,6 +21,9 @@ urlpatterns = [
 
     # User API
     path('api/v1/users/', include('apps.Users.urls')),
+
+    # Monitoring
+    path('api/v1/metrics/database/', DatabaseMetricsView.as_view(), name='database-metrics'),
 ]
 
 # Serve media files in development
@@ -0,0 +1,27 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status, permissions
+from drf_spectacular.utils import extend_schema, OpenApiResponse
+from .db_metrics import database_metrics
+
+
+@extend_schema(
+    tags=['Monitoring'],
+    summary='Database Connection Metrics',
+    description=(
+        'Connection reuse, pool wait time, checkout count and saturation for each '
+        'configured database, as seen by the worker process serving the request.'
+    ),
+    responses={
+        200: OpenApiResponse(description='Metrics per database alias'),
+        403: OpenApiResponse(description='Permission denied - staff only'),
+    }
+)
+class DatabaseMetricsView(APIView):
+    """
+    Expose database connection metrics for monitoring.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(database_metrics(), status=status.HTTP_200_OK)
@@ -1,34 +1,141 @@
 from django.contrib import admin
-from .models import Ticket, TicketMessage, TicketAttachment, TicketActivity
+from TicketingSystem.admin_mixins import LargeTableAdminMixin
+from .models import (
+    Ticket, TicketMessage, TicketAttachment, TicketActivity, ActivityArchive, TicketDeletionRecord, ImportCheckpoint,
+    IngestedMail, OutboxEvent, ConsumerOffset, WebhookSubscription, WebhookDeadLetter, TicketDuplicate,
+)
+from .quotas import AttachmentRefundAdminMixin
+from .webhooks import delete_subscriptions
 
 
 @admin.register(Ticket)
-class TicketAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'assigned_to', 'topic', 'status', 'priority', 'created_at', 'updated_at', 'resolved_at']
-    list_filter = ['status', 'priority', 'created_at', 'updated_at', 'resolved_at']
-    search_fields = ['id', 'user__username', 'assigned_to__username', 'topic']
-    readonly_fields = ['id', 'created_at', 'updated_at']
+class TicketAdmin(AttachmentRefundAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = [
+        'id', 'user', 'assigned_to', 'topic', 'status', 'priority', 'suggested_priority', 'attachment_bytes',
+        'created_at', 'updated_at', 'resolved_at'
+    ]
+    list_filter = ['status', 'priority', 'suggested_priority', 'created_at', 'updated_at', 'resolved_at']
+    list_select_related = ['user', 'assigned_to']
+    search_uuid_fields = ['id', 'order__id']
+    search_email_fields = ['user__email', 'assigned_to__email']
+    search_text_fields = ['topic']
+    raw_id_fields = ['user', 'order', 'assigned_to']
+    readonly_fields = ['id', 'attachment_bytes', 'created_at', 'updated_at']
+    attachment_lookups = ['ticket']
 
 
 @admin.register(TicketMessage)
-class TicketMessageAdmin(admin.ModelAdmin):
+class TicketMessageAdmin(AttachmentRefundAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('ticket', 'user', 'is_staff_message', 'created_at')
     list_filter = ('is_staff_message', 'created_at')
-    search_fields = ('ticket__id', 'message', 'user__username')
+    list_select_related = ('ticket', 'user')
+    search_uuid_fields = ('ticket__id',)
+    search_email_fields = ('user__email',)
+    search_text_fields = ('message',)
+    raw_id_fields = ('ticket', 'user')
     readonly_fields = ('created_at',)
+    attachment_lookups = ('message',)
 
 
 @admin.register(TicketAttachment)
-class TicketAttachmentAdmin(admin.ModelAdmin):
-    list_display = ('filename', 'ticket', 'uploaded_by', 'filesize', 'uploaded_at')
-    list_filter = ('uploaded_at',)
+class TicketAttachmentAdmin(AttachmentRefundAdminMixin, admin.ModelAdmin):
+    list_display = ('filename', 'ticket', 'uploaded_by', 'filesize', 'preview_status', 'uploaded_at')
+    list_filter = ('preview_status', 'uploaded_at')
     search_fields = ('filename', 'ticket__id')
-    readonly_fields = ('filename', 'filesize', 'uploaded_at')
+    readonly_fields = (
+        'filename', 'filesize', 'uploaded_at', 'content_type', 'preview_status', 'thumbnail', 'width', 'height',
+        'preview_text', 'line_count'
+    )
+    attachment_lookups = ('pk',)
 
 
 @admin.register(TicketActivity)
-class TicketActivityAdmin(admin.ModelAdmin):
+class TicketActivityAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('ticket', 'action', 'performed_by', 'timestamp')
     list_filter = ('action', 'timestamp')
-    search_fields = ('ticket__id', 'details')
-    readonly_fields = ('action', 'performed_by', 'details', 'timestamp')
\ No newline at end of file
+    list_select_related = ('ticket', 'performed_by')
+    search_uuid_fields = ('ticket__id',)
+    search_email_fields = ('performed_by__email',)
+    search_text_fields = ('details',)
+    raw_id_fields = ('ticket',)
+    readonly_fields = ('action', 'performed_by', 'details', 'timestamp')
+
+
+@admin.register(ActivityArchive)
+class ActivityArchiveAdmin(admin.ModelAdmin):
+    list_display = ('partition', 'range_start', 'range_end', 'row_count', 'archived_at')
+    readonly_fields = ('partition', 'range_start', 'range_end', 'path', 'index_path', 'row_count', 'archived_at')
+
+
+@admin.register(TicketDuplicate)
+class TicketDuplicateAdmin(admin.ModelAdmin):
+    list_display = ('ticket', 'duplicate', 'similarity', 'created_at')
+    list_filter = ('created_at',)
+    list_select_related = ('ticket', 'duplicate')
+    search_fields = ('ticket__id', 'duplicate__id')
+    raw_id_fields = ('ticket', 'duplicate')
+    readonly_fields = ('similarity', 'created_at')
+
+
+@admin.register(TicketDeletionRecord)
+class TicketDeletionRecordAdmin(admin.ModelAdmin):
+    list_display = ('ticket_id', 'topic', 'owner', 'deleted_by', 'deleted_at', 'purged_at', 'attachment_bytes')
+    search_fields = ('ticket_id', 'topic')
+    readonly_fields = (
+        'ticket_id', 'topic', 'owner', 'deleted_by', 'deleted_at', 'purged_at', 'message_count', 'attachment_count',
+        'attachment_bytes',
+    )
+
+
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('source', 'line_count', 'ticket_count', 'message_count', 'error_count', 'updated_at')
+    search_fields = ('source',)
+    readonly_fields = (
+        'line_count', 'byte_offset', 'ticket_count', 'message_count', 'attachment_count', 'error_count',
+        'created_at', 'updated_at',
+    )
+
+
+@admin.register(IngestedMail)
+class IngestedMailAdmin(admin.ModelAdmin):
+    list_display = ('message_id', 'ticket', 'created_at')
+    search_fields = ('message_id',)
+    raw_id_fields = ('ticket',)
+    readonly_fields = ('message_id', 'ticket', 'created_at')
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'ticket_id', 'actor_id', 'created_at')
+    list_filter = ('event_type',)
+    search_uuid_fields = ('ticket_id',)
+    readonly_fields = ('ticket_id', 'event_type', 'actor_id', 'payload', 'created_at')
+
+
+@admin.register(ConsumerOffset)
+class ConsumerOffsetAdmin(admin.ModelAdmin):
+    list_display = ('consumer', 'offset', 'updated_at')
+    search_fields = ('consumer',)
+
+
+@admin.register(WebhookSubscription)
+class WebhookSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'url', 'batch_size', 'max_concurrency', 'is_active', 'created_at')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'url')
+    readonly_fields = ('secret', 'created_by', 'created_at', 'updated_at')
+
+    def delete_model(self, request, obj):
+        delete_subscriptions(WebhookSubscription.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_subscriptions(queryset)
+
+
+@admin.register(WebhookDeadLetter)
+class WebhookDeadLetterAdmin(admin.ModelAdmin):
+    list_display = ('subscription', 'first_offset', 'last_offset', 'attempts', 'status_code', 'created_at')
+    list_select_related = ('subscription',)
+    raw_id_fields = ('subscription',)
+    readonly_fields = ('first_offset', 'last_offset', 'payload', 'attempts', 'status_code', 'error', 'created_at')
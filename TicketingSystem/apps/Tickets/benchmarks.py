@@ -0,0 +1,277 @@
+"""
+Micro-benchmarks for the hot serializers, run on in-memory fixtures.
+
+Timings are divided by a fixed pure-Python calibration workload, so a
+baseline recorded on one machine can be compared with a run on another. The
+workload is timed alongside every case, their samples interleaved, so
+frequency scaling or other load during the run slows both alike instead of
+skewing the ratio.
+
+The baseline records the serializers as they are: a change to a benchmarked
+serializer or its fixtures should come with a regenerated baseline
+(bench_serializers --update-baseline).
+"""
+import gc
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from apps.Users.models import User, Order
+from apps.Users.serializers import UserRegistrationSerializer
+from .models import Ticket, TicketMessage, TicketAttachment, TicketActivity
+from .serializers import (
+    TicketListSerializer,
+    TicketDetailSerializer,
+    TicketMessageSerializer,
+    TicketActivitySerializer,
+)
+
+MIN_RUN_SECONDS = 0.02
+REPEATS = 25
+
+
+def calibration_workload():
+    """
+    A fixed mix of dict, string and attribute work similar to what
+    serializers do.
+    """
+    rows = []
+    for index in range(20000):
+        row = {'id': index, 'name': f'user-{index}', 'flag': index % 3 == 0}
+        rows.append(str(row['id']) + row['name'].upper())
+    return rows
+
+
+def calls_per_sample(func):
+    """
+    How many calls of func last about MIN_RUN_SECONDS.
+    """
+    func()
+    start = time.perf_counter()
+    func()
+    single = max(time.perf_counter() - start, 1e-7)
+    return max(1, int(MIN_RUN_SECONDS / single))
+
+
+def best_times(*funcs):
+    """
+    Best-of-REPEATS wall time of one call of each of funcs, with each sample
+    averaged over enough calls to last MIN_RUN_SECONDS. The funcs take turns
+    sample by sample, so the ratios between their times hold steady however
+    the machine's speed varies over the run.
+    """
+    numbers = [calls_per_sample(func) for func in funcs]
+    samples = [[] for _ in funcs]
+    gc.disable()
+    try:
+        for _ in range(REPEATS):
+            for func, number, times in zip(funcs, numbers, samples):
+                start = time.perf_counter()
+                for _ in range(number):
+                    func()
+                times.append((time.perf_counter() - start) / number)
+    finally:
+        gc.enable()
+    return [min(times) for times in samples]
+
+
+def peak_allocation(func):
+    """
+    Peak memory in bytes allocated while func runs.
+    """
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+class Fixtures:
+    """
+    Unsaved model instances wired together through relation and prefetch
+    caches, so serializers never touch the database.
+    """
+
+    def __init__(self):
+        self.now = timezone.now()
+        self.sequence = 0
+        self.customer = self.user('customer')
+        self.agent = self.user('agent')
+        self.order = Order(
+            id=uuid.uuid4(), user=self.customer, order_number='ORD-1', total_price=10,
+            status='delivered', created_at=self.now,
+        )
+
+    def next_id(self):
+        self.sequence += 1
+        return self.sequence
+
+    def user(self, user_type):
+        index = self.next_id()
+        return User(
+            id=uuid.uuid4(), username=f'{user_type}{index}', email=f'{user_type}{index}@example.com',
+            first_name=user_type.capitalize(), last_name=str(index), user_type=user_type,
+        )
+
+    def ticket(self, messages=0, activities=0):
+        ticket = Ticket(
+            id=uuid.uuid4(), user=self.customer, assigned_to=self.agent, order=self.order,
+            topic='Order has not arrived', description='My order has not arrived yet. ' * 10,
+            status='in_progress', priority='medium', created_at=self.now, updated_at=self.now,
+        )
+        message_list = [self.message(ticket, index) for index in range(messages)]
+        attachment_list = [
+            attachment for message in message_list
+            for attachment in message._prefetched_objects_cache['attachments']
+        ]
+        activity_list = [self.activity(ticket, index) for index in range(activities)]
+        ticket._prefetched_objects_cache = {
+            'messages': self.cached(TicketMessage, message_list),
+            'attachments': self.cached(TicketAttachment, attachment_list),
+            'activities': self.cached(TicketActivity, activity_list),
+        }
+        return ticket
+
+    def message(self, ticket, index):
+        author = self.agent if index % 2 else self.customer
+        message = TicketMessage(
+            id=self.next_id(), ticket=ticket, user=author, message='Thanks, any update on this? ' * 5,
+            is_staff_message=author is self.agent, created_at=self.now + timedelta(minutes=index),
+        )
+        attachments = [
+            TicketAttachment(
+                id=self.next_id(), ticket=ticket, message=message, file=f'ticket_attachments/log{index}.txt',
+                filename=f'log{index}.txt', filesize=1024, uploaded_at=message.created_at, uploaded_by=author,
+            )
+            for _ in range(1 if index % 3 == 0 else 0)
+        ]
+        message._prefetched_objects_cache = {'attachments': self.cached(TicketAttachment, attachments)}
+        return message
+
+    def activity(self, ticket, index):
+        return TicketActivity(
+            id=self.next_id(), ticket=ticket, action='status_changed', performed_by=self.agent,
+            details='Status changed from open to in_progress', timestamp=self.now + timedelta(minutes=index),
+        )
+
+    @staticmethod
+    def cached(model, objects):
+        """
+        A queryset that is already evaluated to objects.
+        """
+        queryset = model.objects.none()
+        queryset._result_cache = list(objects)
+        queryset._prefetch_done = True
+        return queryset
+
+
+def registration_payloads(count):
+    return [
+        {
+            'email': f'bench{index}@example.com',
+            'username': f'bench{index}',
+            'password': 'Bench-Passw0rd!2024',
+            'password_confirmation': 'Bench-Passw0rd!2024',
+            'first_name': 'Bench',
+            'last_name': str(index),
+        }
+        for index in range(count)
+    ]
+
+
+def validate_registrations(payloads):
+    """
+    Validate registration payloads; any queries run in a rolled back
+    transaction.
+    """
+    with transaction.atomic():
+        for payload in payloads:
+            UserRegistrationSerializer(data=payload).is_valid()
+        transaction.set_rollback(True)
+
+
+def build_cases(fixtures):
+    """
+    Return {case name: (objects per call, callable)}.
+    """
+    cases = {}
+    for size in (10, 100, 1000):
+        tickets = [fixtures.ticket(messages=3) for _ in range(size)]
+        cases[f'TicketListSerializer[{size}]'] = (
+            size, lambda tickets=tickets: TicketListSerializer(tickets, many=True).data
+        )
+
+        ticket = fixtures.ticket(messages=size)
+        messages = list(ticket._prefetched_objects_cache['messages'])
+        cases[f'TicketMessageSerializer[{size}]'] = (
+            size, lambda messages=messages: TicketMessageSerializer(messages, many=True).data
+        )
+
+        activity_ticket = fixtures.ticket(activities=size)
+        activities = list(activity_ticket._prefetched_objects_cache['activities'])
+        cases[f'TicketActivitySerializer[{size}]'] = (
+            size, lambda activities=activities: TicketActivitySerializer(activities, many=True).data
+        )
+
+    for size in (10, 100, 500):
+        ticket = fixtures.ticket(messages=size, activities=size)
+        cases[f'TicketDetailSerializer[{size}]'] = (
+            size, lambda ticket=ticket: TicketDetailSerializer(ticket).data
+        )
+
+    for size in (1, 10):
+        payloads = registration_payloads(size)
+        cases[f'UserRegistrationSerializer[{size}]'] = (
+            size, lambda payloads=payloads: validate_registrations(payloads)
+        )
+    return cases
+
+
+def run_benchmarks(selected=None, log=None):
+    """
+    Run every case (or those whose name starts with one of selected) and
+    return the results keyed by case name.
+    """
+    results = {}
+    calibrations = []
+    for name, (count, func) in build_cases(Fixtures()).items():
+        if selected and not any(name.startswith(prefix) for prefix in selected):
+            continue
+        try:
+            seconds, calibration = best_times(func, calibration_workload)
+            peak = peak_allocation(func)
+        except DatabaseError as exc:
+            if log:
+                log(f'Skipping {name}: {exc}')
+            continue
+        calibrations.append(calibration)
+        results[name] = {
+            'ns_per_object': round(seconds / count * 1e9),
+            'relative_time': round(seconds / count / calibration, 6),
+            'peak_bytes_per_object': round(peak / count),
+        }
+        if log:
+            log(f"{name:<36} {results[name]['ns_per_object']:>12,} ns/obj {results[name]['peak_bytes_per_object']:>10,} B/obj")
+    return {'calibration_ns': round(min(calibrations, default=0) * 1e9), 'cases': results}
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """
+    Return a list of human readable regressions: cases whose relative time
+    or peak allocation grew by more than threshold percent.
+    """
+    regressions = []
+    for name, current in results['cases'].items():
+        previous = baseline['cases'].get(name)
+        if not previous:
+            continue
+        for metric in ('relative_time', 'peak_bytes_per_object'):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold / 100):
+                change = (current[metric] / previous[metric] - 1) * 100
+                regressions.append(f'{name}: {metric} {change:+.0f}% ({previous[metric]} -> {current[metric]})')
+    return regressions
@@ -0,0 +1,129 @@
+"""
+Helpers for writing large numbers of rows quickly: COPY on PostgreSQL,
+batched bulk_create elsewhere.
+"""
+import csv
+import io
+from django.db import connections, transaction
+
+
+def is_timestamp(field):
+    return getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+
+
+def pre_save_value(field, obj):
+    """
+    The value saved for ``field`` on a new row. auto_now/auto_now_add
+    timestamps set on the instance are kept, so historical or synthetic
+    rows keep their times; missing ones are filled in on the instance.
+    """
+    if is_timestamp(field):
+        if getattr(obj, field.attname) is None:
+            return field.pre_save(obj, True)
+        return getattr(obj, field.attname)
+    return field.pre_save(obj, True)
+
+
+def supports_copy(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def copy_fields(model):
+    """
+    Concrete fields written by COPY; auto incremented primary keys are left
+    to the database.
+    """
+    return [
+        field for field in model._meta.concrete_fields
+        if not (field.primary_key and field.auto_created)
+    ]
+
+
+def _csv_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'adapted'):
+        # psycopg2 Json adapter for JSONField values
+        return value.dumps(value.adapted)
+    return value
+
+
+def copy_row(fields, obj, connection):
+    return [field.get_db_prep_save(pre_save_value(field, obj), connection) for field in fields]
+
+
+def copy_objects(model, objs, using='default'):
+    """
+    Insert unsaved model instances with a single COPY statement. Auto
+    incremented primary keys are left to the database; other values,
+    including timestamps, are written exactly as set on the instances.
+    """
+    connection = connections[using]
+    fields = copy_fields(model)
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(field.column) for field in fields)
+    sql = f'COPY {qn(model._meta.db_table)} ({columns}) FROM STDIN'
+
+    with connection.cursor() as cursor, connection.wrap_database_errors:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy'):
+            # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                for obj in objs:
+                    copy.write_row(copy_row(fields, obj, connection))
+        else:
+            # psycopg2
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for obj in objs:
+                writer.writerow([_csv_value(value) for value in copy_row(fields, obj, connection)])
+            buffer.seek(0)
+            raw_cursor.copy_expert(f"{sql} WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+def batch_objects(model, objs, batch_size=5000, using='default'):
+    """
+    Insert unsaved instances with batched INSERT statements, like
+    bulk_create() but keeping the timestamps set on the instances. Primary
+    keys are set on the instances where the database returns them.
+    """
+    connection = connections[using]
+    fields = copy_fields(model)
+    for obj in objs:
+        for field in fields:
+            if is_timestamp(field):
+                pre_save_value(field, obj)
+    returning_fields = (
+        model._meta.db_returning_fields if connection.features.can_return_rows_from_bulk_insert else None
+    )
+    batch_size = min(batch_size, max(connection.ops.bulk_batch_size(fields, objs), 1))
+    queryset = model._base_manager.using(using)
+    with transaction.atomic(using=using, savepoint=False):
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            # raw inserts skip Field.pre_save(), which would overwrite the
+            # auto_now/auto_now_add values filled in above
+            rows = queryset._insert(batch, fields=fields, returning_fields=returning_fields, raw=True, using=using)
+            for obj, row in zip(batch, rows or ()):
+                for field, value in zip(returning_fields, row):
+                    setattr(obj, field.attname, value)
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = using
+
+
+def insert_objects(model, objs, batch_size=5000, use_copy=True, using='default'):
+    """
+    Insert unsaved instances using COPY when available, falling back to
+    batched INSERTs. Timestamps set on the instances are kept.
+    """
+    if not objs:
+        return
+    if use_copy and supports_copy(using):
+        copy_objects(model, objs, using=using)
+    else:
+        batch_objects(model, objs, batch_size=batch_size, using=using)
@@ -0,0 +1,166 @@
+"""
+Near-duplicate ticket detection.
+
+A ticket's topic and description are reduced to a MinHash signature of
+SIGNATURE_SIZE values over its word shingles; the share of positions in
+which two signatures agree estimates the Jaccard similarity of the two
+texts. Signatures are split into BANDS bands of ROWS values and each band is
+hashed into a bucket. Tickets sharing at least one bucket are candidates,
+and the index table is only ever searched by bucket, so a lookup costs the
+same however many tickets are open.
+
+With 32 bands of 4 rows, texts with a similarity of 0.5 share a bucket
+about 87% of the time and texts at 0.8 more than 99.99% of the time;
+candidates are then ranked by their estimated similarity.
+
+Every ticket is searched, whoever creates the ticket: the matches are kept
+as TicketDuplicate rows for staff, and the creator is only told about the
+ones they may see.
+"""
+import hashlib
+import random
+import re
+from array import array
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, Value
+from django.utils import timezone
+from .models import Ticket, TicketDuplicate, TicketFingerprint, TicketFingerprintBand, ticket_visibility
+
+SIGNATURE_SIZE = 128
+BANDS = 32
+ROWS = SIGNATURE_SIZE // BANDS
+# Only tickets in these statuses are reported as duplicates
+OPEN_STATUSES = ('open', 'in_progress')
+
+# Universal hash functions (a * x + b) mod PRIME standing in for permutations
+PRIME = (1 << 61) - 1
+_generator = random.Random(0x6D696E68617368)
+PERMUTATIONS = [(_generator.randrange(1, PRIME), _generator.randrange(PRIME)) for _ in range(SIGNATURE_SIZE)]
+WORD = re.compile(r'\w+')
+# Fingerprint only the start of long descriptions, bounding the cost at
+# creation time to a few milliseconds
+DESCRIPTION_LIMIT = 2000
+
+
+def shingles(text):
+    """
+    The set of overlapping word pairs in text, lowercased. Texts of a single
+    word are their own shingle.
+    """
+    words = WORD.findall(text.lower())
+    if len(words) < 2:
+        return set(words)
+    return {f'{first} {second}' for first, second in zip(words, words[1:])}
+
+
+def minhash(text):
+    """
+    MinHash signature of text: SIGNATURE_SIZE unsigned 32-bit values.
+    """
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'little') % PRIME
+        for shingle in shingles(text)
+    ] or [0]
+    return array('I', (min((a * value + b) % PRIME for value in hashes) & 0xFFFFFFFF for a, b in PERMUTATIONS))
+
+
+def band_buckets(signature):
+    """
+    One signed 64-bit bucket per band, with the band number mixed in so
+    equal values in different bands do not collide.
+    """
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(bytes([band]) + rows.tobytes(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'little', signed=True))
+    return buckets
+
+
+def similarity(signature, other):
+    """
+    Estimated Jaccard similarity of the texts behind two signatures.
+    """
+    return sum(a == b for a, b in zip(signature, other)) / SIGNATURE_SIZE
+
+
+def ticket_text(ticket):
+    return f'{ticket.topic}\n{ticket.description[:DESCRIPTION_LIMIT]}'
+
+
+def load_signature(data):
+    signature = array('I')
+    signature.frombytes(bytes(data))
+    return signature
+
+
+def index_tickets(tickets):
+    """
+    Store the signatures and band buckets of newly created tickets. Returns
+    {ticket id: signature}.
+    """
+    signatures = {ticket.pk: minhash(ticket_text(ticket)) for ticket in tickets}
+    TicketFingerprint.objects.bulk_create([
+        TicketFingerprint(ticket=ticket, signature=signatures[ticket.pk].tobytes()) for ticket in tickets
+    ])
+    TicketFingerprintBand.objects.bulk_create([
+        TicketFingerprintBand(ticket=ticket, bucket=bucket, created_at=ticket.created_at)
+        for ticket in tickets
+        for bucket in band_buckets(signatures[ticket.pk])
+    ])
+    return signatures
+
+
+def index_recent_tickets(tickets):
+    """
+    index_tickets() for the tickets of a bulk insert (mail, imports) that
+    duplicate detection can still find: open and inside the window.
+    """
+    since = timezone.now() - timedelta(days=settings.TICKET_DUPLICATE_WINDOW_DAYS)
+    recent = [ticket for ticket in tickets if ticket.status in OPEN_STATUSES and ticket.created_at >= since]
+    if recent:
+        index_tickets(recent)
+
+
+def find_duplicates(ticket, user, signature=None):
+    """
+    Recent open tickets that are likely duplicates of ticket, most similar
+    first, each with its estimated similarity set on it and visible set to
+    whether user may see it.
+    """
+    signature = signature or minhash(ticket_text(ticket))
+    since = timezone.now() - timedelta(days=settings.TICKET_DUPLICATE_WINDOW_DAYS)
+    condition = ticket_visibility(user)
+    candidates = Ticket.objects.filter(
+        status__in=OPEN_STATUSES,
+        created_at__gte=since,
+        pk__in=TicketFingerprintBand.objects.filter(
+            bucket__in=band_buckets(signature), created_at__gte=since
+        ).values('ticket_id'),
+    ).exclude(pk=ticket.pk).select_related('fingerprint').only(
+        'id', 'topic', 'status', 'created_at', 'fingerprint__signature'
+    ).annotate(
+        visible=Value(True) if condition is None else ExpressionWrapper(condition, output_field=BooleanField())
+    ).order_by('-created_at')[:settings.TICKET_DUPLICATE_MAX_CANDIDATES]
+
+    duplicates = []
+    for candidate in candidates:
+        candidate.similarity = similarity(signature, load_signature(candidate.fingerprint.signature))
+        if candidate.similarity >= settings.TICKET_DUPLICATE_THRESHOLD:
+            duplicates.append(candidate)
+    duplicates.sort(key=lambda candidate: candidate.similarity, reverse=True)
+    return duplicates
+
+
+def flag_duplicates(ticket, user, signature=None):
+    """
+    Record the likely duplicates of a new ticket as TicketDuplicate rows for
+    staff and return those user may see, most similar first.
+    """
+    duplicates = find_duplicates(ticket, user, signature)
+    TicketDuplicate.objects.bulk_create([
+        TicketDuplicate(ticket=ticket, duplicate=duplicate, similarity=duplicate.similarity)
+        for duplicate in duplicates[:settings.TICKET_DUPLICATE_LIMIT]
+    ])
+    return [duplicate for duplicate in duplicates if duplicate.visible][:settings.TICKET_DUPLICATE_LIMIT]
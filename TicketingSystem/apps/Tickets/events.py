@@ -0,0 +1,107 @@
+"""
+Transactional outbox for ticket events.
+
+Every TicketActivity is written together with an OutboxEvent, in the same
+transaction as the change it records. Events are numbered by their id, the
+offset; consumers read the events after the last offset they processed and
+store their new offset with commit_offset().
+
+Offsets must become visible in order, or a consumer that has read up to
+offset 10 could later miss a slower transaction's offset 9. On PostgreSQL,
+writers therefore take a transaction-level advisory lock before inserting
+events, which holds back the next writer until the current one commits.
+Only the outbox insert is serialized; record events as late in the
+transaction as possible.
+"""
+from django.db import connections, transaction
+from .models import TicketActivity, OutboxEvent, ConsumerOffset
+
+# pg_advisory_xact_lock key for outbox writers ('outbox' in ASCII)
+OUTBOX_LOCK_ID = 0x6F7574626F78
+
+
+def lock_outbox(using='default'):
+    """
+    Serialize outbox writers until the current transaction ends.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [OUTBOX_LOCK_ID])
+
+
+def event_for_activity(activity, **payload):
+    """
+    The OutboxEvent describing a (possibly unsaved) TicketActivity.
+    """
+    return OutboxEvent(
+        ticket_id=activity.ticket_id,
+        event_type=activity.action,
+        actor_id=activity.performed_by_id,
+        payload={'details': activity.details, **payload},
+        created_at=activity.timestamp,
+    )
+
+
+def emit_events(events, using='default'):
+    """
+    Append unsaved OutboxEvents. Must run inside the transaction that makes
+    the changes they describe.
+    """
+    if not events:
+        return []
+    with transaction.atomic(using=using):
+        lock_outbox(using)
+        return OutboxEvent.objects.using(using).bulk_create(events)
+
+
+def record_activities(ticket, performed_by, entries):
+    """
+    Log changes to ticket, given as [(action, details, payload)], as
+    TicketActivity rows and outbox events in one transaction.
+    """
+    with transaction.atomic():
+        activities = TicketActivity.objects.bulk_create([
+            TicketActivity(ticket=ticket, action=action, performed_by=performed_by, details=details)
+            for action, details, _ in entries
+        ])
+        emit_events([
+            event_for_activity(activity, **payload)
+            for activity, (_, _, payload) in zip(activities, entries)
+        ])
+    return activities
+
+
+def record_activity(ticket, action, performed_by, details, **payload):
+    return record_activities(ticket, performed_by, [(action, details, payload)])[0]
+
+
+def read_events(after=0, limit=500, event_types=None, ticket_id=None):
+    """
+    Up to limit events with an offset greater than after, oldest first.
+    """
+    events = OutboxEvent.objects.filter(id__gt=after).order_by('id')
+    if event_types:
+        events = events.filter(event_type__in=event_types)
+    if ticket_id:
+        events = events.filter(ticket_id=ticket_id)
+    return list(events[:limit])
+
+
+def get_offset(consumer):
+    return ConsumerOffset.objects.filter(consumer=consumer).values_list('offset', flat=True).first() or 0
+
+
+def commit_offset(consumer, offset):
+    """
+    Record that consumer has processed every event up to offset and return
+    its ConsumerOffset. Offsets never move backwards.
+    """
+    with transaction.atomic():
+        committed, created = ConsumerOffset.objects.select_for_update().get_or_create(
+            consumer=consumer, defaults={'offset': offset}
+        )
+        if not created and committed.offset < offset:
+            committed.offset = offset
+            committed.save(update_fields=['offset', 'updated_at'])
+    return committed
@@ -0,0 +1,166 @@
+"""
+Idempotency-Key support for create endpoints.
+
+The first request with a key inserts an IdempotencyKey row before doing any
+work; the unique (user, key) constraint makes concurrent duplicates fail that
+insert, so they are turned away without holding locks. Once the request
+finishes its response is stored on the row and replayed for repeats until
+the key expires.
+
+A claim is a lease that runs out after IDEMPOTENCY_KEY_LEASE seconds. If the
+worker holding it dies before storing a response, a retry after the lease
+has run out takes the key over instead of getting 409 until the key expires.
+The lease must outlast the slowest request, or a slow request and its retry
+may both do the work.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Responses worth replaying; anything else lets the client try again
+REPLAYABLE_STATUSES = range(200, 500)
+RETRYABLE_STATUSES = (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    name=HEADER,
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.HEADER,
+    description=(
+        'Unique key for this request. Repeating a request with the same key '
+        'returns the original response instead of creating a duplicate.'
+    ),
+    required=False
+)
+
+
+def request_fingerprint(request):
+    """
+    Hash of the method, path and body, used to refuse a key reused for a
+    different request. Uploaded files count by name and size.
+    """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {key: values for key, values in data.lists() if key not in request.FILES}
+    files = sorted((name, upload.name, upload.size) for name, upload in request.FILES.items())
+    payload = json.dumps([request.method, request.path, data, files], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim_key(request, key, fingerprint):
+    """
+    Insert the key row for this request, or take over one whose lease ran
+    out. Returns (record, None) when the request should go ahead, or
+    (None, response) when it must not.
+    """
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE)
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=request.user,
+                    key=key,
+                    request_hash=fingerprint,
+                    locked_until=locked_until,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                ), None
+        except IntegrityError:
+            pass
+
+        existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if existing is None:
+            # Released by a failed request (or swept) since our insert; claim it again
+            continue
+        if existing.expires_at <= now:
+            existing.delete()
+            continue
+        if existing.status_code is None and existing.locked_until is not None and existing.locked_until > now:
+            return None, Response(
+                {"error": f"A request with this {HEADER} is still being processed"},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Retry-After': '1'}
+            )
+        if existing.request_hash != fingerprint:
+            return None, Response(
+                {"error": f"{HEADER} has already been used for a different request"},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if existing.status_code is None:
+            # The request holding the key never finished; take the key over
+            # unless another retry got there first
+            if IdempotencyKey.objects.filter(
+                pk=existing.pk, status_code__isnull=True, locked_until=existing.locked_until
+            ).update(locked_until=locked_until):
+                existing.locked_until = locked_until
+                return existing, None
+            continue
+        return None, Response(
+            existing.response_body, status=existing.status_code, headers={'Idempotent-Replayed': 'true'}
+        )
+
+    return None, Response(
+        {"error": f"A request with this {HEADER} is still being processed"},
+        status=status.HTTP_409_CONFLICT,
+        headers={'Retry-After': '1'}
+    )
+
+
+def is_replay(request):
+    """
+    Whether the request's Idempotency-Key already holds a stored response,
+    which @idempotent replays without running the handler.
+    """
+    key = request.headers.get(HEADER)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return False
+    return IdempotencyKey.objects.filter(
+        user=request.user, key=key, status_code__isnull=False, expires_at__gt=timezone.now()
+    ).exists()
+
+
+def idempotent(view_method):
+    """
+    Make a create handler honour the Idempotency-Key header. Requests
+    without the header are handled as before.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        record, response = claim_key(request, key, request_fingerprint(request))
+        if response is not None:
+            return response
+
+        # Only while this request still holds the lease
+        claim = IdempotencyKey.objects.filter(pk=record.pk, locked_until=record.locked_until)
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            claim.delete()
+            raise
+
+        if response.status_code in REPLAYABLE_STATUSES and response.status_code not in RETRYABLE_STATUSES:
+            claim.update(status_code=response.status_code, response_body=response.data)
+        else:
+            claim.delete()
+        return response
+
+    return wrapper
@@ -0,0 +1,417 @@
+"""
+Streaming import of tickets from a legacy helpdesk.
+
+The input is NDJSON: one ticket per line, with its conversation nested in it.
+
+    {"external_id": "HD-1042", "user": "jane@example.com", "order": "ORD-77",
+     "assigned_to": "agent@example.com", "topic": "Refund", "description": "...",
+     "status": "closed", "priority": "low", "created_at": "2021-03-04T10:00:00Z",
+     "updated_at": "...", "resolved_at": "...",
+     "messages": [
+        {"user": "jane@example.com", "message": "...", "created_at": "...",
+         "is_staff": false,
+         "attachments": [{"path": "legacy/1042/invoice.pdf", "filename": "invoice.pdf",
+                          "filesize": 52311, "uploaded_at": "..."}]}
+     ]}
+
+Users are matched by email and orders by order number through bounded LRU
+caches, misses being looked up a batch at a time. Records are inserted in
+batches, each in one transaction that also advances the stream's
+ImportCheckpoint, so an interrupted import resumes after the last committed
+batch. Memory use is bounded by the batch size, the cache size and the
+maximum line length, whatever the size of the stream.
+"""
+import json
+import os
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.Users.context import invalidate_customer_context
+from apps.Users.models import Order
+from .bulk import batch_objects, insert_objects, supports_copy
+from .dedup import index_recent_tickets
+from .events import emit_events, event_for_activity
+from .models import Ticket, TicketMessage, TicketAttachment, TicketActivity, ImportCheckpoint
+from .partitions import ensure_partitions, month_start
+from .quotas import charge
+
+User = get_user_model()
+
+LOOKUP_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+TICKET_STATUSES = {value for value, _ in Ticket.STATUS_CHOICES}
+TICKET_PRIORITIES = {value for value, _ in Ticket.PRIORITY_CHOICES}
+
+
+class RecordError(ValueError):
+    """
+    A line that cannot be imported; it is reported and skipped.
+    """
+
+
+class CheckpointConflict(Exception):
+    """
+    Another import advanced the same checkpoint concurrently.
+    """
+
+
+class LookupCache:
+    """
+    Least recently used mapping of natural keys (emails, order numbers) to
+    rows, filled in bulk by loader(keys) -> {key: value}. Keys the loader does
+    not return are cached as None.
+    """
+
+    def __init__(self, loader, maxsize):
+        self.loader = loader
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def resolve(self, keys):
+        found, missing = {}, []
+        for key in set(keys):
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                found[key] = self.entries[key]
+            else:
+                missing.append(key)
+
+        missing.sort()
+        for start in range(0, len(missing), LOOKUP_CHUNK_SIZE):
+            chunk = missing[start:start + LOOKUP_CHUNK_SIZE]
+            loaded = self.loader(chunk)
+            for key in chunk:
+                found[key] = self.entries[key] = loaded.get(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return found
+
+    def forget(self, keys):
+        for key in keys:
+            self.entries.pop(key, None)
+
+
+def load_users(emails):
+    return {
+        email: (user_id, is_staff)
+        for email, user_id, is_staff in User.objects.filter(email__in=emails).values_list('email', 'id', 'is_staff')
+    }
+
+
+def load_orders(order_numbers):
+    return dict(Order.objects.filter(order_number__in=order_numbers).values_list('order_number', 'id'))
+
+
+def read_lines(stream, start, max_line_bytes):
+    """
+    Yield (end offset, line) for every line of a binary stream after byte
+    offset start. Lines longer than max_line_bytes are yielded as None
+    without being held in memory.
+    """
+    if start:
+        try:
+            stream.seek(start)
+        except (AttributeError, OSError, ValueError):
+            remaining = start
+            while remaining:
+                chunk = stream.read(min(remaining, 1 << 20))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+
+    offset = start
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        offset += len(line)
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            # Skip the rest of the oversized line
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(1 << 20)
+                offset += len(line)
+            yield offset, None
+        else:
+            yield offset, line
+
+
+def parse_time(value, field, default=None):
+    if value in (None, ''):
+        return default
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise RecordError(f'{field} is not a valid datetime')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def require_text(record, field, max_length=None):
+    value = record.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise RecordError(f'{field} is required')
+    if max_length and len(value) > max_length:
+        raise RecordError(f'{field} is longer than {max_length} characters')
+    return value
+
+
+class TicketImporter:
+    """
+    Import an NDJSON stream of tickets under the checkpoint for source.
+    """
+
+    def __init__(self, source, batch_size=None, cache_size=None, max_line_bytes=None,
+                 create_users=False, use_copy=True, progress=None):
+        self.source = source
+        self.batch_size = batch_size or settings.TICKET_IMPORT_BATCH_SIZE
+        self.max_line_bytes = max_line_bytes or settings.TICKET_IMPORT_MAX_LINE_BYTES
+        self.create_users = create_users
+        self.use_copy = use_copy and supports_copy()
+        self.progress = progress
+        cache_size = cache_size or settings.TICKET_IMPORT_CACHE_SIZE
+        self.users = LookupCache(load_users, cache_size)
+        self.orders = LookupCache(load_orders, cache_size)
+        self.partitions_since = None
+        self.errors = []
+        self.checkpoint = None
+
+    def run(self, stream):
+        """
+        Import every line after the checkpoint. Returns the checkpoint.
+        """
+        self.checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=self.source)
+        line_number = self.checkpoint.line_count
+        pending, pending_rows = [], 0
+        for offset, line in read_lines(stream, self.checkpoint.byte_offset, self.max_line_bytes):
+            line_number += 1
+            if line is None:
+                record = RecordError(f'line is longer than {self.max_line_bytes} bytes')
+            elif not line.strip():
+                record = None
+            else:
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        raise RecordError('line is not a JSON object')
+                except ValueError as exc:
+                    record = exc if isinstance(exc, RecordError) else RecordError(f'invalid JSON: {exc}')
+            pending.append((line_number, offset, record))
+            if isinstance(record, dict):
+                pending_rows += 1 + sum(
+                    1 + len(message.get('attachments') or [])
+                    for message in record.get('messages') or [] if isinstance(message, dict)
+                )
+            # Skipped lines count too, so a long run of them still moves the
+            # checkpoint forward
+            if pending_rows >= self.batch_size or len(pending) >= self.batch_size:
+                self.flush(pending)
+                pending, pending_rows = [], 0
+        if pending:
+            self.flush(pending)
+        return self.checkpoint
+
+    def record_error(self, line_number, error):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': str(error)})
+
+    def resolve_lookups(self, records):
+        """
+        Load the users and orders the batch refers to, creating missing
+        requesters first when create_users is set.
+        """
+        emails, order_numbers = set(), set()
+        for record in records:
+            for value in (record.get('user'), record.get('assigned_to')):
+                if isinstance(value, str):
+                    emails.add(value)
+            if isinstance(record.get('order'), str):
+                order_numbers.add(record['order'])
+            for message in record.get('messages') or []:
+                if isinstance(message, dict):
+                    for value in [message.get('user')] + [
+                        attachment.get('uploaded_by') for attachment in message.get('attachments') or []
+                        if isinstance(attachment, dict)
+                    ]:
+                        if isinstance(value, str):
+                            emails.add(value)
+
+        users = self.users.resolve(emails)
+        if self.create_users:
+            requesters = {record['user'] for record in records if isinstance(record.get('user'), str)}
+            missing = sorted(email for email in requesters if users.get(email) is None and '@' in email)
+            if missing:
+                User.objects.bulk_create([
+                    User(email=email, username=email[:150], password=make_password(None), user_type='customer')
+                    for email in missing
+                ], ignore_conflicts=True)
+                self.users.forget(missing)
+                users.update(self.users.resolve(missing))
+        return users, self.orders.resolve(order_numbers)
+
+    def build(self, record, users, orders, now):
+        """
+        Turn one record into unsaved rows: (ticket, [(message, [attachment])],
+        activity).
+        """
+        def user_for(email, field):
+            if not isinstance(email, str) or users.get(email) is None:
+                raise RecordError(f'{field} {email!r} does not match any user')
+            return users[email]
+
+        user_id, _ = user_for(record.get('user'), 'user')
+        assigned_to_id = None
+        if record.get('assigned_to'):
+            assigned_to_id, _ = user_for(record['assigned_to'], 'assigned_to')
+        order_id = None
+        if record.get('order'):
+            order_id = orders.get(record['order']) if isinstance(record['order'], str) else None
+            if order_id is None:
+                raise RecordError(f"order {record['order']!r} does not exist")
+
+        ticket_status = record.get('status') or 'open'
+        if ticket_status not in TICKET_STATUSES:
+            raise RecordError(f'status {ticket_status!r} is not one of {sorted(TICKET_STATUSES)}')
+        priority = record.get('priority') or 'low'
+        if priority not in TICKET_PRIORITIES:
+            raise RecordError(f'priority {priority!r} is not one of {sorted(TICKET_PRIORITIES)}')
+
+        created_at = parse_time(record.get('created_at'), 'created_at', now)
+        ticket = Ticket(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            order_id=order_id,
+            assigned_to_id=assigned_to_id,
+            topic=require_text(record, 'topic', Ticket._meta.get_field('topic').max_length),
+            description=require_text(record, 'description'),
+            status=ticket_status,
+            priority=priority,
+            created_at=created_at,
+            resolved_at=parse_time(record.get('resolved_at'), 'resolved_at'),
+        )
+
+        last = created_at
+        conversation = []
+        messages = record.get('messages') or []
+        if not isinstance(messages, list):
+            raise RecordError('messages must be a list')
+        path_length = TicketAttachment._meta.get_field('file').max_length
+        for position, item in enumerate(messages):
+            if not isinstance(item, dict):
+                raise RecordError(f'messages[{position}] is not an object')
+            author_id, author_is_staff = user_for(item.get('user'), f'messages[{position}].user')
+            message = TicketMessage(
+                ticket_id=ticket.id,
+                user_id=author_id,
+                message=require_text(item, 'message'),
+                is_staff_message=bool(item.get('is_staff', author_is_staff)),
+                created_at=parse_time(item.get('created_at'), f'messages[{position}].created_at', created_at),
+            )
+            last = max(last, message.created_at)
+
+            attachments = []
+            for index, entry in enumerate(item.get('attachments') or []):
+                field = f'messages[{position}].attachments[{index}]'
+                if not isinstance(entry, dict):
+                    raise RecordError(f'{field} is not an object')
+                path = require_text(entry, 'path', path_length)
+                uploaded_by_id = author_id
+                if entry.get('uploaded_by'):
+                    uploaded_by_id, _ = user_for(entry['uploaded_by'], f'{field}.uploaded_by')
+                filesize = entry.get('filesize')
+                if filesize is not None and not isinstance(filesize, int):
+                    raise RecordError(f'{field}.filesize must be an integer')
+                attachments.append(TicketAttachment(
+                    ticket_id=ticket.id,
+                    uploaded_by_id=uploaded_by_id,
+                    file=path,
+                    filename=(entry.get('filename') or os.path.basename(path))[:255],
+                    filesize=filesize,
+                    uploaded_at=parse_time(entry.get('uploaded_at'), f'{field}.uploaded_at', message.created_at),
+                ))
+            conversation.append((message, attachments))
+
+        ticket.updated_at = parse_time(record.get('updated_at'), 'updated_at', last)
+        external_id = record.get('external_id')
+        activity = TicketActivity(
+            ticket_id=ticket.id,
+            action='created',
+            performed_by_id=user_id,
+            details=(f'Imported from legacy ticket {external_id}' if external_id else 'Imported from legacy system')[:500],
+            timestamp=created_at,
+        )
+        return ticket, conversation, activity
+
+    def flush(self, pending):
+        """
+        Insert the valid records of a batch and advance the checkpoint past
+        every line of it, in one transaction.
+        """
+        records = [record for _, _, record in pending if isinstance(record, dict)]
+        users, orders = self.resolve_lookups(records)
+        now = timezone.now()
+
+        tickets, conversation, activities, errors = [], [], [], 0
+        for line_number, _, record in pending:
+            if record is None:
+                continue
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                ticket, messages, activity = self.build(record, users, orders, now)
+            except RecordError as exc:
+                errors += 1
+                self.record_error(line_number, exc)
+                continue
+            tickets.append(ticket)
+            conversation.extend(messages)
+            activities.append(activity)
+
+        if activities:
+            oldest = month_start(min(activity.timestamp for activity in activities))
+            if self.partitions_since is None or oldest < self.partitions_since:
+                ensure_partitions(TicketActivity._meta.db_table, since=oldest)
+                self.partitions_since = oldest
+
+        messages = [message for message, _ in conversation]
+        attachments = []
+        checkpoint = self.checkpoint
+        last_line, last_offset, _ = pending[-1]
+        with transaction.atomic():
+            insert_objects(Ticket, tickets, batch_size=self.batch_size, use_copy=self.use_copy)
+            index_recent_tickets(tickets)
+            # INSERT rather than COPY: the attachments need the message ids
+            batch_objects(TicketMessage, messages, batch_size=self.batch_size)
+            for message, message_attachments in conversation:
+                for attachment in message_attachments:
+                    attachment.message_id = message.pk
+                    attachments.append(attachment)
+            insert_objects(TicketAttachment, attachments, batch_size=self.batch_size, use_copy=self.use_copy)
+            charge(attachments)
+            invalidate_customer_context(ticket.user_id for ticket in tickets)
+            insert_objects(TicketActivity, activities, batch_size=self.batch_size, use_copy=self.use_copy)
+            emit_events([event_for_activity(activity) for activity in activities])
+
+            counts = {
+                'line_count': last_line,
+                'byte_offset': last_offset,
+                'ticket_count': checkpoint.ticket_count + len(tickets),
+                'message_count': checkpoint.message_count + len(messages),
+                'attachment_count': checkpoint.attachment_count + len(attachments),
+                'error_count': checkpoint.error_count + errors,
+                'updated_at': now,
+            }
+            updated = ImportCheckpoint.objects.filter(
+                pk=checkpoint.pk, byte_offset=checkpoint.byte_offset
+            ).update(**counts)
+            if not updated:
+                raise CheckpointConflict(f'{self.source} is being imported by another process')
+
+        for field, value in counts.items():
+            setattr(checkpoint, field, value)
+        if self.progress:
+            self.progress(checkpoint)
@@ -0,0 +1,466 @@
+"""
+Turning support email into tickets.
+
+Mail is read from a maildir (new/ is processed and moved to cur/) or an mbox
+(read from the byte offset stored in its ImportCheckpoint). Messages are
+parsed, and their attachments written to storage, on a process pool; the
+results are written to the database a batch per transaction.
+
+A message joins an existing ticket when it carries the ticket's reply token
+(see reply_token()) in its subject or X-Ticket-ID header, or when it
+replies to an email that was already ingested, and its sender owns the
+ticket or is staff. Any other message opens a new ticket. Every ingested
+Message-ID is recorded, so a message delivered or read twice is only
+stored once.
+"""
+import email
+import hashlib
+import multiprocessing
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from email import policy
+from email.utils import getaddresses, parseaddr
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import get_valid_filename
+from apps.Users.context import invalidate_customer_context
+from .bulk import insert_objects, supports_copy
+from .dedup import index_recent_tickets
+from .events import emit_events, event_for_activity
+from .importer import LookupCache
+from .models import Ticket, TicketMessage, TicketAttachment, TicketActivity, IngestedMail, ImportCheckpoint
+from .quotas import charge
+
+User = get_user_model()
+
+UUID_PATTERN = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+TOKEN_PATTERN = re.compile(rf'\[Ticket #({UUID_PATTERN})\]', re.IGNORECASE)
+QUOTE_HEADER = re.compile(r'^\s*On .+ wrote:\s*$', re.MULTILINE)
+ATTACHMENT_PATH = 'ticket_attachments/'
+
+
+def reply_token(ticket):
+    """
+    Token to put in the subject of email about ticket, so that replies are
+    filed on it.
+    """
+    return f'[Ticket #{ticket.pk}]'
+
+
+def strip_quoted(text):
+    """
+    Drop the quoted history from a reply: everything from an "On ... wrote:"
+    line on, and lines starting with '>'.
+    """
+    match = QUOTE_HEADER.search(text)
+    if match:
+        text = text[:match.start()]
+    return '\n'.join(line for line in text.splitlines() if not line.lstrip().startswith('>')).strip()
+
+
+def is_automatic(message):
+    """
+    Auto-replies and bulk mail; answering them would start mail loops.
+    """
+    auto_submitted = (message.get('Auto-Submitted') or 'no').strip().lower()
+    precedence = (message.get('Precedence') or '').strip().lower()
+    return auto_submitted != 'no' or precedence in ('bulk', 'junk', 'list', 'auto_reply')
+
+
+def parse_message(item):
+    """
+    Parse one raw message, given as a path or bytes, into a plain dict that
+    can travel back from a worker process. Attachments are written to
+    storage here, so only their names cross the process boundary.
+    """
+    key, source = item
+    try:
+        if isinstance(source, bytes):
+            raw = source
+        else:
+            with open(source, 'rb') as handle:
+                raw = handle.read(settings.MAIL_MAX_MESSAGE_BYTES + 1)
+        if len(raw) > settings.MAIL_MAX_MESSAGE_BYTES:
+            return {'key': key, 'error': f'message is larger than {settings.MAIL_MAX_MESSAGE_BYTES} bytes'}
+
+        message = email.message_from_bytes(raw, policy=policy.default)
+        if is_automatic(message):
+            return {'key': key, 'skipped': 'automatic reply'}
+        sender = parseaddr(str(message.get('From', '')))[1]
+        if '@' not in sender:
+            return {'key': key, 'error': 'missing sender address'}
+
+        subject = str(message.get('Subject', '')).strip()
+        body = message.get_body(preferencelist=('plain', 'html'))
+        text = ''
+        if body is not None:
+            text = body.get_content()
+            if body.get_content_type() == 'text/html':
+                text = strip_tags(text)
+        tokens = TOKEN_PATTERN.findall(f"{subject} {message.get('X-Ticket-ID', '')}")
+        references = [
+            address for _, address in getaddresses(
+                [str(message.get('In-Reply-To', '')), str(message.get('References', ''))]
+            ) if address
+        ]
+
+        attachments = []
+        for part in message.iter_attachments():
+            content = part.get_payload(decode=True) or b''
+            filename = get_valid_filename(part.get_filename() or 'attachment') or 'attachment'
+            path = default_storage.save(
+                ATTACHMENT_PATH + filename, ContentFile(content),
+                max_length=TicketAttachment._meta.get_field('file').max_length
+            )
+            attachments.append({'path': path, 'filename': filename[:255], 'filesize': len(content)})
+
+        message_id = parseaddr(str(message.get('Message-ID', '')))[1] or f'sha256:{hashlib.sha256(raw).hexdigest()}'
+        return {
+            'key': key,
+            'message_id': message_id[:255],
+            'sender': sender,
+            'subject': subject,
+            'text': text.strip(),
+            'tokens': [token.lower() for token in tokens],
+            'references': [reference[:255] for reference in references],
+            'attachments': attachments,
+        }
+    except Exception as exc:
+        return {'key': key, 'error': f'cannot parse message: {exc}'}
+
+
+def iter_maildir(path):
+    """
+    Yield (path, path) for every message waiting in the new/ directory of a
+    maildir, oldest first (maildir names start with the delivery time).
+    """
+    new = os.path.join(path, 'new')
+    for name in sorted(entry.name for entry in os.scandir(new) if entry.is_file() and not entry.name.startswith('.')):
+        file_path = os.path.join(new, name)
+        yield file_path, file_path
+
+
+def mark_seen(file_path):
+    """
+    Move a processed maildir message from new/ to cur/ with the Seen flag.
+    """
+    directory, name = os.path.split(file_path)
+    os.rename(file_path, os.path.join(os.path.dirname(directory), 'cur', f'{name}:2,S'))
+
+
+def iter_mbox(path, start=0):
+    """
+    Yield (end offset, raw message) for every message of an mbox after byte
+    offset start, reading one line at a time. Messages larger than
+    MAIL_MAX_MESSAGE_BYTES are yielded as None without being kept.
+    """
+    limit = settings.MAIL_MAX_MESSAGE_BYTES
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        offset = start
+        lines, size, started, previous_blank = [], 0, False, True
+        for line in handle:
+            if line.startswith(b'From ') and previous_blank:
+                if started:
+                    yield offset, (b''.join(lines) if lines is not None else None)
+                lines, size, started = [], 0, True
+            elif started:
+                size += len(line)
+                if lines is not None:
+                    if size > limit:
+                        lines = None
+                    else:
+                        lines.append(line)
+            offset += len(line)
+            previous_blank = line in (b'\n', b'\r\n')
+        if started:
+            yield offset, (b''.join(lines) if lines is not None else None)
+
+
+def load_users_by_email(keys):
+    """
+    Users by upper-cased email, matched through the UPPER(email) index.
+    """
+    users = User.objects.annotate(email_upper=Upper('email')).filter(email_upper__in=keys)
+    return {upper: (user_id, is_staff) for upper, user_id, is_staff in users.values_list('email_upper', 'id', 'is_staff')}
+
+
+def initialize_worker():
+    django.setup()
+
+
+class MailIngester:
+    """
+    Parse raw messages on a process pool and file them as tickets and
+    replies, a batch per transaction.
+    """
+
+    def __init__(self, batch_size=None, workers=None, create_users=True, use_copy=True, progress=None):
+        self.batch_size = batch_size or settings.MAIL_INGEST_BATCH_SIZE
+        self.workers = settings.MAIL_INGEST_WORKERS if workers is None else workers
+        self.create_users = create_users
+        self.use_copy = use_copy and supports_copy()
+        self.progress = progress
+        self.users = LookupCache(load_users_by_email, settings.TICKET_IMPORT_CACHE_SIZE)
+        self.pool = None
+        self.stats = {'tickets': 0, 'replies': 0, 'attachments': 0, 'duplicates': 0, 'skipped': 0, 'errors': 0}
+        self.errors = []
+
+    def __enter__(self):
+        if self.workers:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn' if os.name == 'nt' else 'fork'),
+                initializer=initialize_worker,
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+
+    def parse(self, items):
+        if self.pool is None:
+            return [parse_message(item) for item in items]
+        chunksize = max(1, len(items) // (self.workers * 4))
+        return list(self.pool.map(parse_message, items, chunksize=chunksize))
+
+    def ingest_maildir(self, path):
+        batch = []
+        for item in iter_maildir(path):
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self.ingest_maildir_batch(batch)
+                batch = []
+        if batch:
+            self.ingest_maildir_batch(batch)
+        return self.stats
+
+    def ingest_maildir_batch(self, items):
+        parsed = self.parse(items)
+        self.store(parsed)
+        # Only once the batch is committed; a crash before this re-reads the
+        # messages and the recorded Message-IDs turn them into duplicates
+        for message in parsed:
+            mark_seen(message['key'])
+        self.report()
+
+    def ingest_mbox(self, path):
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=f'mbox:{os.path.abspath(path)}')
+        batch = []
+        for offset, raw in iter_mbox(path, checkpoint.byte_offset):
+            batch.append((offset, raw))
+            if len(batch) >= self.batch_size:
+                self.ingest_mbox_batch(checkpoint, batch)
+                batch = []
+        if batch:
+            self.ingest_mbox_batch(checkpoint, batch)
+        return self.stats
+
+    def ingest_mbox_batch(self, checkpoint, items):
+        parsed = self.parse([(offset, raw) for offset, raw in items if raw is not None])
+        parsed += [
+            {'key': offset, 'error': f'message is larger than {settings.MAIL_MAX_MESSAGE_BYTES} bytes'}
+            for offset, raw in items if raw is None
+        ]
+
+        def advance(counts):
+            checkpoint.line_count += len(items)
+            checkpoint.byte_offset = items[-1][0]
+            checkpoint.ticket_count += counts['tickets']
+            checkpoint.message_count += counts['replies']
+            checkpoint.attachment_count += counts['attachments']
+            checkpoint.error_count += counts['errors']
+            checkpoint.save()
+
+        self.store(parsed, on_commit=advance)
+        self.report()
+
+    def report(self):
+        if self.progress:
+            self.progress(self.stats)
+
+    def record_error(self, key, error):
+        self.stats['errors'] += 1
+        if len(self.errors) < 100:
+            self.errors.append({'message': str(key), 'error': error})
+
+    def discard(self, message):
+        for attachment in message.get('attachments', ()):
+            default_storage.delete(attachment['path'])
+
+    def resolve_senders(self, messages):
+        keys = {message['sender'].upper() for message in messages}
+        users = self.users.resolve(keys)
+        missing = sorted(
+            message['sender'] for message in messages
+            if users.get(message['sender'].upper()) is None
+        )
+        if missing and self.create_users:
+            User.objects.bulk_create([
+                User(email=address, username=address[:150], password=make_password(None), user_type='customer')
+                for address in dict.fromkeys(missing)
+            ], ignore_conflicts=True)
+            upper = {address.upper() for address in missing}
+            self.users.forget(upper)
+            users.update(self.users.resolve(upper))
+        return users
+
+    def resolve_threads(self, messages):
+        """
+        Owners of the tickets named by tokens, and the tickets of the emails
+        replied to: ({ticket id: owner id}, {message id: (ticket id, owner id)}).
+        """
+        ticket_ids = set()
+        for message in messages:
+            for token in message['tokens']:
+                try:
+                    ticket_ids.add(uuid.UUID(token))
+                except ValueError:
+                    pass
+        owners = dict(Ticket.objects.filter(pk__in=ticket_ids).values_list('id', 'user_id'))
+        references = {reference for message in messages for reference in message['references']}
+        threads = {
+            message_id: (ticket_id, owner_id)
+            for message_id, ticket_id, owner_id in IngestedMail.objects.filter(
+                message_id__in=references, ticket__deleted_at__isnull=True
+            ).values_list('message_id', 'ticket_id', 'ticket__user_id')
+        }
+        return owners, threads
+
+    def store(self, parsed, on_commit=None):
+        counts = {'tickets': 0, 'replies': 0, 'attachments': 0, 'errors': 0}
+        messages = []
+        for message in parsed:
+            if 'error' in message:
+                counts['errors'] += 1
+                self.record_error(message['key'], message['error'])
+            elif 'skipped' in message:
+                self.stats['skipped'] += 1
+            else:
+                messages.append(message)
+
+        seen = set(IngestedMail.objects.filter(
+            message_id__in=[message['message_id'] for message in messages]
+        ).values_list('message_id', flat=True))
+        users = self.resolve_senders(messages)
+        owners, threads = self.resolve_threads(messages)
+        now = timezone.now()
+
+        tickets, replies, activities, ingested, kept = [], [], [], [], []
+        for message in messages:
+            if message['message_id'] in seen:
+                self.stats['duplicates'] += 1
+                self.discard(message)
+                continue
+            seen.add(message['message_id'])
+            sender = users.get(message['sender'].upper())
+            if sender is None:
+                counts['errors'] += 1
+                self.record_error(message['key'], f"unknown sender {message['sender']}")
+                self.discard(message)
+                continue
+            sender_id, sender_is_staff = sender
+            kept.append(message)
+
+            ticket_id = None
+            candidates = [(uuid.UUID(token), owners.get(uuid.UUID(token))) for token in message['tokens']]
+            candidates += [threads[reference] for reference in message['references'] if reference in threads]
+            for candidate_id, owner_id in candidates:
+                if owner_id is not None and (sender_is_staff or owner_id == sender_id):
+                    ticket_id = candidate_id
+                    break
+
+            text = strip_quoted(message['text']) if ticket_id else message['text']
+            text = text[:TicketMessage._meta.get_field('message').max_length]
+            if ticket_id is None:
+                ticket = Ticket(
+                    id=uuid.uuid4(),
+                    user_id=sender_id,
+                    topic=(message['subject'] or '(no subject)')[:Ticket._meta.get_field('topic').max_length],
+                    description=text or '(empty message)',
+                    created_at=now,
+                    updated_at=now,
+                )
+                tickets.append(ticket)
+                ticket_id = ticket.id
+                owners[ticket_id] = sender_id
+                activities.append(TicketActivity(
+                    ticket_id=ticket_id, action='created', performed_by_id=sender_id,
+                    details=f'Ticket created from email: {ticket.topic}'[:500], timestamp=now,
+                ))
+                counts['tickets'] += 1
+                names = ', '.join(attachment['filename'] for attachment in message['attachments'])
+                reply_text = f'Attached to the original email: {names}' if names else None
+            else:
+                reply_text = text or '(empty message)'
+                activities.append(TicketActivity(
+                    ticket_id=ticket_id, action='message_added', performed_by_id=sender_id,
+                    details=f'{"Staff" if sender_is_staff else "User"} added a message by email', timestamp=now,
+                ))
+                counts['replies'] += 1
+            threads[message['message_id']] = (ticket_id, owners.get(ticket_id, sender_id))
+            ingested.append(IngestedMail(message_id=message['message_id'], ticket_id=ticket_id, created_at=now))
+
+            if reply_text is not None:
+                reply = TicketMessage(
+                    ticket_id=ticket_id, user_id=sender_id, message=reply_text,
+                    is_staff_message=sender_is_staff, created_at=now,
+                )
+                attachments = [
+                    TicketAttachment(
+                        ticket_id=ticket_id, uploaded_by_id=sender_id, file=attachment['path'],
+                        filename=attachment['filename'], filesize=attachment['filesize'], uploaded_at=now,
+                    )
+                    for attachment in message['attachments']
+                ]
+                replies.append((reply, attachments))
+                counts['attachments'] += len(attachments)
+                activities.extend(
+                    TicketActivity(
+                        ticket_id=ticket_id, action='attachment_added', performed_by_id=sender_id,
+                        details=f'Attachment added: {attachment.filename}'[:500], timestamp=now,
+                    )
+                    for attachment in attachments
+                )
+
+        try:
+            with transaction.atomic():
+                insert_objects(Ticket, tickets, batch_size=self.batch_size, use_copy=self.use_copy)
+                index_recent_tickets(tickets)
+                # bulk_create rather than COPY: the attachments need the message ids
+                TicketMessage.objects.bulk_create([reply for reply, _ in replies], batch_size=self.batch_size)
+                attachments = []
+                for reply, reply_attachments in replies:
+                    for attachment in reply_attachments:
+                        attachment.message_id = reply.pk
+                        attachments.append(attachment)
+                insert_objects(TicketAttachment, attachments, batch_size=self.batch_size, use_copy=self.use_copy)
+                charge(attachments)
+                invalidate_customer_context(ticket.user_id for ticket in tickets)
+                insert_objects(TicketActivity, activities, batch_size=self.batch_size, use_copy=self.use_copy)
+                emit_events([event_for_activity(activity) for activity in activities])
+                IngestedMail.objects.bulk_create(ingested, batch_size=self.batch_size)
+                if on_commit:
+                    on_commit(counts)
+        except Exception:
+            # parse_message already wrote the attachments to storage and
+            # nothing refers to them once the batch is rolled back
+            for message in kept:
+                self.discard(message)
+            raise
+
+        for key in ('tickets', 'replies', 'attachments'):
+            self.stats[key] += counts[key]
+        return counts
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from apps.Tickets.models import TicketActivity
+from apps.Tickets.partitions import (
+    add_months,
+    archive_partition,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+    month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Create upcoming monthly TicketActivity partitions and archive partitions '
+        'older than the retention window to compressed files.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months', type=int, default=12,
+            help='Number of months of activity to keep in the database (default: 12).'
+        )
+        parser.add_argument(
+            '--months-ahead', type=int, default=3,
+            help='Number of future monthly partitions to create (default: 3).'
+        )
+        parser.add_argument(
+            '--output-dir', default=None,
+            help='Directory for archive files (default: TICKET_ACTIVITY_ARCHIVE_DIR).'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only list the partitions that would be archived.'
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        table = TicketActivity._meta.db_table
+        connection = connections[options['database']]
+        if not is_partitioned(connection, table):
+            raise CommandError(f'{table} is not a partitioned PostgreSQL table.')
+
+        if not options['dry_run']:
+            for name in ensure_partitions(table, options['months_ahead'], using=options['database']):
+                self.stdout.write(f'Created partition {name}')
+
+        cutoff = add_months(month_start(timezone.now()), -options['keep_months'])
+        expired = [partition for partition in list_partitions(connection, table) if partition[2] <= cutoff]
+        if not expired:
+            self.stdout.write('No partitions to archive.')
+            return
+
+        for name, range_start, range_end in expired:
+            if options['dry_run']:
+                self.stdout.write(f'Would archive {name} ({range_start:%Y-%m})')
+                continue
+            archive = archive_partition(
+                table, name, range_start, range_end,
+                output_dir=options['output_dir'],
+                using=options['database'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Archived {name}: {archive.row_count} rows -> {archive.path}'
+            ))
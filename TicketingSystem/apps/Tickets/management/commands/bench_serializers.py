@@ -0,0 +1,56 @@
+import json
+import platform
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.Tickets.benchmarks import compare_to_baseline, run_benchmarks
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'benchmark_baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the hot serializers on in-memory fixtures and fail when one is '
+        'more than --threshold percent slower than the stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file.')
+        parser.add_argument(
+            '--threshold', type=float, default=30.0,
+            help='Allowed slowdown (or allocation growth) in percent before failing (default: 30).'
+        )
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Write the results as the new baseline instead of comparing.'
+        )
+        parser.add_argument('--output', help='Also write the results as JSON to this file.')
+        parser.add_argument('cases', nargs='*', help='Only run cases whose name starts with these prefixes.')
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(selected=options['cases'], log=self.stdout.write)
+        results['meta'] = {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'recorded_at': timezone.now().isoformat(),
+        }
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            raise CommandError(f'No baseline at {baseline_path}; run with --update-baseline first.')
+        baseline = json.loads(baseline_path.read_text())
+        regressions = compare_to_baseline(results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} serializer regression(s) over {options['threshold']:.0f}%:\n"
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('No serializer regressions.'))
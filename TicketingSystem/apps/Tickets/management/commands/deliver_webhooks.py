@@ -0,0 +1,46 @@
+import time
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from apps.Tickets.webhooks import WebhookDispatcher
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver ticket events from the outbox to the registered webhooks. Runs until '
+        'interrupted unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Deliver the pending events and exit.')
+        parser.add_argument('--interval', type=float, help='Seconds between checks for new events.')
+        parser.add_argument('--max-connections', type=int, help='Connections shared by every webhook.')
+        parser.add_argument('--timeout', type=float, help='Seconds before a request is abandoned.')
+        parser.add_argument('--max-attempts', type=int, help='Attempts before a request is dead-lettered.')
+
+    def handle(self, *args, **options):
+        dispatcher = WebhookDispatcher(
+            max_connections=options['max_connections'],
+            timeout=options['timeout'],
+            max_attempts=options['max_attempts'],
+        )
+        started = time.perf_counter()
+
+        async def deliver():
+            async with dispatcher:
+                if options['once']:
+                    await dispatcher.run_once()
+                else:
+                    await dispatcher.run(options['interval'])
+
+        try:
+            async_to_sync(deliver)()
+        except KeyboardInterrupt:
+            pass
+
+        stats = dispatcher.stats
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Delivered {stats['events']} events in {stats['requests']} requests "
+            f"({stats['requests'] / max(elapsed, 1e-9):.0f} per second), "
+            f"{stats['failures']} failed attempts, {stats['dead_letters']} dead letters"
+        ))
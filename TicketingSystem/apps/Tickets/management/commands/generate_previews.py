@@ -0,0 +1,37 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.Tickets.previews import PreviewGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Render thumbnails of image attachments and previews of text attachments uploaded since '
+        'the last run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Rendering processes; 0 renders in this process.')
+        parser.add_argument('--batch-size', type=int, help='Attachments saved per batch.')
+        parser.add_argument(
+            '--interval', type=float, help='Keep running and check for new attachments every this many seconds.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        processed = 0
+        with PreviewGenerator(batch_size=options['batch_size'], workers=options['workers']) as generator:
+            while True:
+                processed += generator.run_once()
+                for error in generator.errors:
+                    self.stderr.write(f"Attachment {error['attachment']}: {error['error']}")
+                generator.errors = []
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+
+        stats = generator.stats
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} attachments: {stats['ready']} previews, {stats['unsupported']} unsupported, "
+            f"{stats['failed']} failed ({elapsed:.1f}s)"
+        ))
@@ -0,0 +1,78 @@
+import gzip
+import os
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.Tickets.importer import CheckpointConflict, TicketImporter
+from apps.Tickets.models import ImportCheckpoint
+
+
+class Command(BaseCommand):
+    help = (
+        'Import tickets with their messages and attachment metadata from an NDJSON '
+        'export of a legacy helpdesk. Interrupted imports resume from their checkpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file (optionally .gz), or '-' for standard input.")
+        parser.add_argument(
+            '--source',
+            help='Checkpoint name for this stream (default: the absolute path). Required for standard input.'
+        )
+        parser.add_argument('--batch-size', type=int, help='Rows written per transaction.')
+        parser.add_argument('--cache-size', type=int, help='Users and orders kept in each lookup cache.')
+        parser.add_argument('--max-line-bytes', type=int, help='Longest line accepted; longer ones are skipped.')
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Create unknown ticket requesters as customers without a usable password.'
+        )
+        parser.add_argument('--no-copy', action='store_true', help='Use batched INSERTs even on PostgreSQL.')
+        parser.add_argument('--restart', action='store_true', help='Discard the checkpoint and start from the top.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            if not options['source']:
+                raise CommandError('--source is required when reading standard input.')
+            source, stream = options['source'], sys.stdin.buffer
+        else:
+            if not os.path.exists(path):
+                raise CommandError(f'{path} does not exist.')
+            source = options['source'] or os.path.abspath(path)
+            stream = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+        if options['restart']:
+            ImportCheckpoint.objects.filter(source=source).delete()
+
+        started = time.perf_counter()
+
+        def progress(checkpoint):
+            self.stdout.write(
+                f'line {checkpoint.line_count}: {checkpoint.ticket_count} tickets, '
+                f'{checkpoint.message_count} messages, {checkpoint.attachment_count} attachments, '
+                f'{checkpoint.error_count} errors ({time.perf_counter() - started:.1f}s)'
+            )
+
+        importer = TicketImporter(
+            source,
+            batch_size=options['batch_size'],
+            cache_size=options['cache_size'],
+            max_line_bytes=options['max_line_bytes'],
+            create_users=options['create_users'],
+            use_copy=not options['no_copy'],
+            progress=progress if options['verbosity'] > 0 else None,
+        )
+        try:
+            with stream:
+                checkpoint = importer.run(stream)
+        except CheckpointConflict as exc:
+            raise CommandError(str(exc))
+
+        for error in importer.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if checkpoint.error_count > len(importer.errors):
+            self.stderr.write(f'... and {checkpoint.error_count - len(importer.errors)} more errors')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {checkpoint.ticket_count} tickets and {checkpoint.message_count} messages '
+            f'from {source} in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,69 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.Tickets.mail import MailIngester
+
+
+class Command(BaseCommand):
+    help = (
+        'File support email from a maildir or mbox as tickets and replies. Replies are matched '
+        'to their ticket by reply token or by the email they answer.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Maildir directory or mbox file.')
+        parser.add_argument(
+            '--format', choices=['maildir', 'mbox'],
+            help='Mailbox format (default: maildir for a directory, mbox for a file).'
+        )
+        parser.add_argument('--workers', type=int, help='Parsing processes; 0 parses in this process.')
+        parser.add_argument('--batch-size', type=int, help='Messages written per transaction.')
+        parser.add_argument(
+            '--no-create-users', action='store_true',
+            help='Reject mail from unknown senders instead of creating customers for them.'
+        )
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk_create even on PostgreSQL.')
+        parser.add_argument('--interval', type=int, help='Keep running and check for new mail every this many seconds.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+        mailbox_format = options['format'] or ('maildir' if os.path.isdir(path) else 'mbox')
+        if mailbox_format == 'maildir' and not os.path.isdir(os.path.join(path, 'new')):
+            raise CommandError(f'{path} is not a maildir (it has no new/ directory).')
+
+        started = time.perf_counter()
+
+        def progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{stats['tickets']} tickets, {stats['replies']} replies, {stats['attachments']} attachments, "
+                f"{stats['duplicates']} duplicates, {stats['skipped']} skipped, {stats['errors']} errors "
+                f"({elapsed:.1f}s)"
+            )
+
+        ingester = MailIngester(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            create_users=not options['no_create_users'],
+            use_copy=not options['no_copy'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        with ingester:
+            while True:
+                if mailbox_format == 'maildir':
+                    stats = ingester.ingest_maildir(path)
+                else:
+                    stats = ingester.ingest_mbox(path)
+                for error in ingester.errors:
+                    self.stderr.write(f"{error['message']}: {error['error']}")
+                ingester.errors = []
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+
+        progress(stats)
+        processed = stats['tickets'] + stats['replies']
+        rate = processed / max(time.perf_counter() - started, 1e-9) * 60
+        self.stdout.write(self.style.SUCCESS(f'Filed {processed} emails ({rate:.0f} per minute)'))
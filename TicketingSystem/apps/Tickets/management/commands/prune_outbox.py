@@ -0,0 +1,36 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+from apps.Tickets.models import OutboxEvent, ConsumerOffset
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete outbox events older than the retention period that every registered '
+        'consumer has already processed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.OUTBOX_RETENTION_DAYS,
+            help='Keep events at least this many days.'
+        )
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Never delete what a consumer has yet to read
+        slowest = ConsumerOffset.objects.aggregate(offset=Min('offset'))['offset']
+        events = OutboxEvent.objects.filter(created_at__lt=cutoff)
+        if slowest is not None:
+            events = events.filter(id__lte=slowest)
+
+        total = 0
+        while True:
+            ids = list(events.order_by('id').values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            total += OutboxEvent.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(f'Deleted {total} outbox events')
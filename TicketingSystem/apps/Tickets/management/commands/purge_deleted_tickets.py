@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.Tickets.purge import purge_deleted_tickets
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove deleted tickets with their messages, attachments and activity, a batch of rows at a '
+        'time, and delete their attachment files.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per transaction.')
+        parser.add_argument(
+            '--interval', type=float, help='Keep running and check for deleted tickets every this many seconds.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        purged = 0
+        while True:
+            purged += purge_deleted_tickets(batch_size=options['batch_size'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} deleted tickets ({elapsed:.1f}s)'))
@@ -0,0 +1,46 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from apps.Tickets.dedup import OPEN_STATUSES, index_tickets
+from apps.Tickets.models import Ticket, TicketFingerprint, TicketFingerprintBand
+
+
+class Command(BaseCommand):
+    help = (
+        'Fingerprint recent open tickets that have no fingerprint yet (such as reopened tickets or '
+        'tickets created before the index) and drop index rows older than the duplicate detection window.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.TICKET_DUPLICATE_WINDOW_DAYS,
+            help='Index tickets created within this many days.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tickets fingerprinted per transaction.')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+
+        pruned = 0
+        while True:
+            ids = list(TicketFingerprintBand.objects.filter(created_at__lt=since).values_list('id', flat=True)[:10000])
+            if not ids:
+                break
+            pruned += TicketFingerprintBand.objects.filter(id__in=ids).delete()[0]
+        TicketFingerprint.objects.filter(ticket__created_at__lt=since).delete()
+
+        missing = Ticket.objects.filter(
+            created_at__gte=since, status__in=OPEN_STATUSES, fingerprint__isnull=True
+        ).only('id', 'topic', 'description', 'created_at').order_by('created_at')
+        indexed = 0
+        while True:
+            tickets = list(missing[:options['batch_size']])
+            if not tickets:
+                break
+            with transaction.atomic():
+                index_tickets(tickets)
+            indexed += len(tickets)
+
+        self.stdout.write(self.style.SUCCESS(f'Fingerprinted {indexed} tickets, pruned {pruned} index rows'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.Tickets.quotas import recount
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the attachment storage totals of every ticket and user from their attachments, '
+        'should they have drifted (for example after attachments were deleted outside the app).'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount()
+        self.stdout.write(self.style.SUCCESS('Recounted attachment storage'))
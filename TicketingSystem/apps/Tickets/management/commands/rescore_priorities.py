@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.Tickets.models import Ticket
+from apps.Tickets.triage import get_model, ticket_text
+
+
+class Command(BaseCommand):
+    help = 'Refresh suggested_priority on open and in-progress tickets with the current priority model.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Tickets scored and updated at a time.')
+        parser.add_argument('--all', action='store_true', help='Rescore every ticket, not just the open backlog.')
+
+    def handle(self, *args, **options):
+        model = get_model()
+        if model is None:
+            raise CommandError('There is no priority model; run train_priority_model first.')
+
+        tickets = Ticket.objects.all() if options['all'] else Ticket.objects.filter(status__in=['open', 'in_progress'])
+        tickets = tickets.only('id', 'topic', 'description', 'suggested_priority').order_by('pk')
+        started = time.perf_counter()
+        scored = changed = 0
+        last = None
+        while True:
+            chunk = list((tickets.filter(pk__gt=last) if last else tickets)[:options['chunk_size']])
+            if not chunk:
+                break
+            last = chunk[-1].pk
+            predictions = model.predict_many(ticket_text(ticket.topic, ticket.description) for ticket in chunk)
+            updated = []
+            for ticket, prediction in zip(chunk, predictions):
+                if ticket.suggested_priority != prediction:
+                    ticket.suggested_priority = prediction
+                    updated.append(ticket)
+            Ticket.objects.bulk_update(updated, ['suggested_priority'])
+            scored += len(chunk)
+            changed += len(updated)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {scored} tickets, {changed} suggestions changed ({time.perf_counter() - started:.1f}s)'
+        ))
@@ -0,0 +1,258 @@
+import random
+import time
+import uuid
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from apps.Tickets.bulk import insert_objects, supports_copy
+from apps.Tickets.models import Ticket, TicketMessage, TicketActivity
+from apps.Tickets.partitions import ensure_partitions
+from apps.Users.models import User, Order
+
+TOPICS = [
+    'Order has not arrived', 'Refund request', 'Payment failed', 'Wrong item delivered',
+    'Cannot log in', 'Invoice is missing', 'Package damaged', 'Change delivery address',
+    'Item out of stock', 'Cancel my order', 'Discount code not working', 'Account locked',
+]
+WORDS = (
+    'order delivery refund payment card account package item tracking number invoice '
+    'address broken late missing charged twice support please help urgent thanks week '
+    'store app website error message screen email phone courier warehouse return label'
+).split()
+ORDER_STATUSES = ['pending', 'confirmed', 'shipped', 'delivered', 'cancelled']
+ORDER_STATUS_WEIGHTS = [5, 10, 15, 60, 10]
+PRIORITIES = ['low', 'medium', 'high', 'critical']
+PRIORITY_WEIGHTS = [50, 30, 15, 5]
+
+
+def zipf_weights(count, exponent):
+    """
+    Cumulative weights where item i is picked with probability ~ 1 / (i + 1)^exponent.
+    """
+    total, cumulative = 0.0, []
+    for index in range(count):
+        total += 1 / (index + 1) ** exponent
+        cumulative.append(total)
+    return cumulative
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a large, deterministic synthetic data set of users, orders, tickets, '
+        'messages and activities with realistic skew.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, required=True, help='Number of tickets to create.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--customers', type=int, help='Number of customers (default: tickets / 4).')
+        parser.add_argument('--agents', type=int, help='Number of agents (default: tickets / 2000, at least 5).')
+        parser.add_argument('--days', type=int, default=365, help='Spread tickets over this many days.')
+        parser.add_argument(
+            '--end', help='Date (YYYY-MM-DD) the data ends at; defaults to today. Pin it for identical timestamps.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tickets written per transaction.')
+        parser.add_argument('--no-copy', action='store_true', help='Use batched INSERTs even on PostgreSQL.')
+        parser.add_argument(
+            '--password', default='Seed-Passw0rd!',
+            help='Password shared by all synthetic users; it is hashed once.'
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.use_copy = not options['no_copy'] and supports_copy()
+
+        ticket_count = options['tickets']
+        customer_count = options['customers'] or max(10, ticket_count // 4)
+        agent_count = options['agents'] or max(5, ticket_count // 2000)
+        self.end = datetime.combine(
+            datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else timezone.now().date(),
+            dt_time.min, tzinfo=dt_timezone.utc,
+        )
+        self.start = self.end - timedelta(days=options['days'])
+        # Every synthetic user shares one hash, so no per-user hashing cost
+        self.password_hash = make_password(options['password'])
+
+        ensure_partitions(TicketActivity._meta.db_table, since=self.start)
+
+        started = time.perf_counter()
+        try:
+            customers = self.create_users(customer_count, 'customer')
+            agents = self.create_users(agent_count, 'agent')
+            orders = self.create_orders(customers)
+        except IntegrityError:
+            raise CommandError(f'Data for seed {self.seed} already exists; use another --seed.')
+        self.stdout.write(
+            f'Created {len(customers)} customers, {len(agents)} agents and '
+            f'{sum(len(customer_orders) for customer_orders in orders)} orders'
+        )
+
+        # A few heavy customers open most tickets; some agents carry far more load
+        customer_weights = zipf_weights(len(customers), 1.1)
+        agent_weights = zipf_weights(len(agents), 0.8)
+
+        created = {'tickets': 0, 'messages': 0, 'activities': 0}
+        for batch_start in range(0, ticket_count, self.batch_size):
+            size = min(self.batch_size, ticket_count - batch_start)
+            counts = self.create_ticket_batch(size, customers, orders, agents, customer_weights, agent_weights)
+            for key, value in counts.items():
+                created[key] += value
+            self.stdout.write(
+                f"{created['tickets']}/{ticket_count} tickets, {created['messages']} messages, "
+                f"{created['activities']} activities ({time.perf_counter() - started:.1f}s)"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {created['tickets']} tickets in {time.perf_counter() - started:.1f}s "
+            f"using {'COPY' if self.use_copy else 'INSERT'}"
+        ))
+
+    def random_time(self, after=None, max_delta=None):
+        start = after or self.start
+        end = min(start + max_delta, self.end) if max_delta else self.end
+        span = max((end - start).total_seconds(), 1)
+        return start + timedelta(seconds=self.rng.random() * span)
+
+    def new_uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def insert(self, model, objs):
+        insert_objects(model, objs, batch_size=self.batch_size, use_copy=self.use_copy)
+
+    def create_users(self, count, user_type):
+        prefix = 'c' if user_type == 'customer' else 'a'
+        ids = []
+        for batch_start in range(0, count, self.batch_size):
+            users = []
+            for index in range(batch_start, min(batch_start + self.batch_size, count)):
+                joined = self.random_time()
+                username = f'seed{self.seed}{prefix}{index}'
+                users.append(User(
+                    id=self.new_uuid(),
+                    email=f'{username}@example.com',
+                    username=username,
+                    first_name=user_type.capitalize(),
+                    last_name=str(index),
+                    password=self.password_hash,
+                    user_type=user_type,
+                    is_staff=user_type == 'agent',
+                    date_joined=joined,
+                    created_at=joined,
+                    updated_at=joined,
+                ))
+            with transaction.atomic():
+                self.insert(User, users)
+            ids.extend(user.id for user in users)
+        return ids
+
+    def create_orders(self, customers):
+        """
+        Give every customer 0-5 orders. Returns the order ids per customer,
+        in the same order as customers.
+        """
+        orders_by_customer = []
+        batch = []
+        sequence = 0
+        for customer_id in customers:
+            customer_orders = []
+            for _ in range(self.rng.choice([0, 1, 1, 1, 2, 2, 3, 5])):
+                created = self.random_time()
+                order = Order(
+                    id=self.new_uuid(),
+                    user_id=customer_id,
+                    order_number=f'SEED-{self.seed}-{sequence:09d}',
+                    total_price=Decimal(self.rng.randint(500, 50000)) / 100,
+                    status=self.rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0],
+                    created_at=created,
+                    updated_at=created,
+                )
+                sequence += 1
+                batch.append(order)
+                customer_orders.append(order.id)
+            orders_by_customer.append(customer_orders)
+            if len(batch) >= self.batch_size:
+                with transaction.atomic():
+                    self.insert(Order, batch)
+                batch = []
+        with transaction.atomic():
+            self.insert(Order, batch)
+        return orders_by_customer
+
+    def sentence(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(words // 2, words))).capitalize() + '.'
+
+    def create_ticket_batch(self, size, customers, orders, agents, customer_weights, agent_weights):
+        rng = self.rng
+        tickets, messages, activities = [], [], []
+
+        for _ in range(size):
+            customer_index = rng.choices(range(len(customers)), cum_weights=customer_weights)[0]
+            customer_id = customers[customer_index]
+            customer_orders = orders[customer_index]
+            created = self.random_time()
+            age_days = (self.end - created).days
+            status = rng.choices(
+                ['open', 'in_progress', 'resolved', 'closed'],
+                [10, 10, 30, 50] if age_days > 14 else [45, 35, 15, 5],
+            )[0]
+            assigned_to = None
+            if status != 'open' or rng.random() < 0.3:
+                assigned_to = agents[rng.choices(range(len(agents)), cum_weights=agent_weights)[0]]
+
+            ticket = Ticket(
+                id=self.new_uuid(),
+                user_id=customer_id,
+                order_id=rng.choice(customer_orders) if customer_orders and rng.random() < 0.7 else None,
+                assigned_to_id=assigned_to,
+                topic=rng.choice(TOPICS),
+                description=self.sentence(80),
+                status=status,
+                priority=rng.choices(PRIORITIES, PRIORITY_WEIGHTS)[0],
+                created_at=created,
+            )
+            tickets.append(ticket)
+            activities.append(TicketActivity(
+                ticket_id=ticket.id, action='created', performed_by_id=customer_id,
+                details=f'Ticket created with topic: {ticket.topic}', timestamp=created,
+            ))
+
+            # Power-law thread length: most tickets are short, a few are very long
+            message_count = min(int(rng.paretovariate(1.3)) - 1, 2000)
+            last = created
+            for position in range(message_count):
+                from_staff = assigned_to is not None and position % 2 == 1
+                author = assigned_to if from_staff else customer_id
+                last = self.random_time(after=last, max_delta=timedelta(days=2))
+                messages.append(TicketMessage(
+                    ticket_id=ticket.id, user_id=author, message=self.sentence(40),
+                    is_staff_message=from_staff, created_at=last,
+                ))
+                activities.append(TicketActivity(
+                    ticket_id=ticket.id, action='message_added', performed_by_id=author,
+                    details=f'{"Staff" if from_staff else "User"} added a message', timestamp=last,
+                ))
+
+            if assigned_to:
+                activities.append(TicketActivity(
+                    ticket_id=ticket.id, action='assigned_to_changed', performed_by_id=assigned_to,
+                    details='Ticket assigned', timestamp=self.random_time(after=created, max_delta=timedelta(hours=8)),
+                ))
+            if status in ('resolved', 'closed'):
+                last = self.random_time(after=last, max_delta=timedelta(days=3))
+                ticket.resolved_at = last
+                activities.append(TicketActivity(
+                    ticket_id=ticket.id, action='status_changed', performed_by_id=assigned_to,
+                    details=f'Status changed from in_progress to {status}', timestamp=last,
+                ))
+            ticket.updated_at = last
+
+        with transaction.atomic():
+            self.insert(Ticket, tickets)
+            self.insert(TicketMessage, messages)
+            self.insert(TicketActivity, activities)
+        return {'tickets': len(tickets), 'messages': len(messages), 'activities': len(activities)}
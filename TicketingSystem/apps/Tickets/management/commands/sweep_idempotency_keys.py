@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.Tickets.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys, once or every --interval seconds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int,
+            help='Keep running and sweep every this many seconds.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = self.sweep(options['batch_size'])
+            if options['verbosity'] > 1 or not options['interval']:
+                self.stdout.write(f'Deleted {deleted} expired idempotency keys')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, batch_size):
+        """
+        Delete expired keys in short batches so the table is never locked
+        for long.
+        """
+        now = timezone.now()
+        total = 0
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return total
+            total += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
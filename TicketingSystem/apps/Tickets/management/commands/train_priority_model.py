@@ -0,0 +1,64 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.Tickets.models import Ticket
+from apps.Tickets.triage import FEATURES, PriorityModel, ticket_text
+
+
+class Command(BaseCommand):
+    help = (
+        'Train the priority triage model on resolved and closed tickets and the priority '
+        'they ended with. Every tenth ticket, up to --max-held-out, is held out to report accuracy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Model file (default: TICKET_PRIORITY_MODEL_PATH).')
+        parser.add_argument('--features', type=int, default=FEATURES, help='Hash buckets for n-gram features.')
+        parser.add_argument('--alpha', type=float, default=1.0, help='Additive smoothing.')
+        parser.add_argument('--min-samples', type=int, default=100, help='Refuse to train on fewer tickets.')
+        parser.add_argument('--limit', type=int, help='Train on at most this many of the newest tickets.')
+        parser.add_argument(
+            '--max-held-out', type=int, default=10000,
+            help='Hold out at most this many tickets for the accuracy report; later ones are trained on.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        tickets = Ticket.objects.filter(status__in=['resolved', 'closed']).order_by('-created_at').values_list(
+            'topic', 'description', 'priority'
+        )
+        if options['limit']:
+            tickets = tickets[:options['limit']]
+
+        held_out = []
+
+        def samples():
+            for position, (topic, description, priority) in enumerate(tickets.iterator(chunk_size=2000)):
+                sample = (ticket_text(topic, description), priority)
+                # Capped, so memory does not grow with the table
+                if position % 10 == 9 and len(held_out) < options['max_held_out']:
+                    held_out.append(sample)
+                else:
+                    yield sample
+
+        try:
+            model = PriorityModel.train(samples(), size=options['features'], alpha=options['alpha'])
+        except ValueError:
+            raise CommandError('There are no resolved or closed tickets to train on.')
+        if model.metadata['samples'] < options['min_samples']:
+            raise CommandError(
+                f"Only {model.metadata['samples']} training tickets; at least {options['min_samples']} are needed."
+            )
+
+        if held_out:
+            predictions = model.predict_many(text for text, _ in held_out)
+            correct = sum(prediction == priority for prediction, (_, priority) in zip(predictions, held_out))
+            model.metadata['accuracy'] = round(correct / len(held_out), 4)
+            self.stdout.write(f"Held-out accuracy: {model.metadata['accuracy']:.1%} on {len(held_out)} tickets")
+
+        output = options['output'] or settings.TICKET_PRIORITY_MODEL_PATH
+        model.save(output)
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained on {model.metadata['samples']} tickets in {time.perf_counter() - started:.1f}s; "
+            f"wrote {output}"
+        ))
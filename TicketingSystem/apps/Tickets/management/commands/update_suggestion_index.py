@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.Tickets.suggestions import rebuild_index, update_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Bring the reply suggestion index up to date with the tickets resolved or reopened '
+        'since the last run, or rebuild it from every resolved ticket.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Rebuild the index from scratch first.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tickets or events per transaction.')
+        parser.add_argument('--interval', type=float, help='Keep running and update every this many seconds.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['rebuild']:
+            def progress(indexed):
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{indexed} tickets indexed ({time.perf_counter() - started:.1f}s)')
+
+            indexed = rebuild_index(options['batch_size'], progress)
+            self.stdout.write(f'Indexed {indexed} resolved tickets')
+
+        while True:
+            read = update_index(options['batch_size'])
+            if read or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(f'Applied {read} status changes'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,140 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from apps.Tickets.partitions import add_months, create_partition, month_start
+
+MONTHS_AHEAD = 3
+
+
+def capture_index_definitions(cursor, table):
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = %s",
+        [table]
+    )
+    return [definition for name, definition in cursor.fetchall() if not name.endswith('_pkey')]
+
+
+def partition_activity_table(apps, schema_editor):
+    """
+    Rebuild the activity table as a table partitioned by month on timestamp.
+    PostgreSQL requires the partition key in the primary key, so the primary
+    key becomes (id, timestamp); ids still come from a single sequence.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    TicketActivity = apps.get_model('Tickets', 'TicketActivity')
+    Ticket = apps.get_model('Tickets', 'Ticket')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    table = TicketActivity._meta.db_table
+    legacy = f'{table}_legacy'
+    sequence = f'{table}_pk_seq'
+    qn = schema_editor.quote_name
+
+    with schema_editor.connection.cursor() as cursor:
+        index_definitions = capture_index_definitions(cursor, table)
+        cursor.execute(f"SELECT min(timestamp), coalesce(max(id), 0) FROM {qn(table)}")
+        oldest, max_id = cursor.fetchone()
+
+    schema_editor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+    schema_editor.execute(f"CREATE SEQUENCE {qn(sequence)}")
+    schema_editor.execute(
+        f"CREATE TABLE {qn(table)} ("
+        f"id bigint NOT NULL DEFAULT nextval('{qn(sequence)}'), "
+        f"action varchar(30) NOT NULL, "
+        f"details text NULL, "
+        f"timestamp timestamp with time zone NOT NULL, "
+        f"performed_by_id uuid NOT NULL REFERENCES {qn(User._meta.db_table)} (id) DEFERRABLE INITIALLY DEFERRED, "
+        f"ticket_id uuid NOT NULL REFERENCES {qn(Ticket._meta.db_table)} (id) DEFERRABLE INITIALLY DEFERRED, "
+        f"PRIMARY KEY (id, timestamp)"
+        f") PARTITION BY RANGE (timestamp)"
+    )
+    schema_editor.execute(f"ALTER SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id")
+    schema_editor.execute(f"SELECT setval('{qn(sequence)}', %s, %s)", params=[max(max_id, 1), max_id > 0])
+    schema_editor.execute(f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+
+    current = month_start(timezone.now())
+    start = month_start(oldest) if oldest else current
+    while start <= add_months(current, MONTHS_AHEAD):
+        create_partition(schema_editor, table, start)
+        start = add_months(start, 1)
+
+    columns = 'id, action, details, timestamp, performed_by_id, ticket_id'
+    schema_editor.execute(f"INSERT INTO {qn(table)} ({columns}) SELECT {columns} FROM {qn(legacy)}")
+    schema_editor.execute(f"DROP TABLE {qn(legacy)}")
+    for definition in index_definitions:
+        schema_editor.execute(definition)
+
+
+def unpartition_activity_table(apps, schema_editor):
+    """
+    Copy the partitioned activity table back into a plain table.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    TicketActivity = apps.get_model('Tickets', 'TicketActivity')
+    Ticket = apps.get_model('Tickets', 'Ticket')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    table = TicketActivity._meta.db_table
+    partitioned = f'{table}_partitioned'
+    qn = schema_editor.quote_name
+
+    with schema_editor.connection.cursor() as cursor:
+        index_definitions = capture_index_definitions(cursor, table)
+        cursor.execute(f"SELECT coalesce(max(id), 0) FROM {qn(table)}")
+        max_id = cursor.fetchone()[0]
+
+    schema_editor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(partitioned)}")
+    schema_editor.execute(
+        f"CREATE TABLE {qn(table)} ("
+        f"id bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY (START WITH {max_id + 1}), "
+        f"action varchar(30) NOT NULL, "
+        f"details text NULL, "
+        f"timestamp timestamp with time zone NOT NULL, "
+        f"performed_by_id uuid NOT NULL REFERENCES {qn(User._meta.db_table)} (id) DEFERRABLE INITIALLY DEFERRED, "
+        f"ticket_id uuid NOT NULL REFERENCES {qn(Ticket._meta.db_table)} (id) DEFERRABLE INITIALLY DEFERRED"
+        f")"
+    )
+    columns = 'id, action, details, timestamp, performed_by_id, ticket_id'
+    schema_editor.execute(f"INSERT INTO {qn(table)} ({columns}) SELECT {columns} FROM {qn(partitioned)}")
+    schema_editor.execute(f"DROP TABLE {qn(partitioned)} CASCADE")
+    for definition in index_definitions:
+        schema_editor.execute(definition.replace(' ON ONLY ', ' ON '))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('partition', models.CharField(max_length=100, unique=True)),
+                ('range_start', models.DateTimeField()),
+                ('range_end', models.DateTimeField()),
+                ('path', models.CharField(max_length=500)),
+                ('index_path', models.CharField(max_length=500)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Activity Archive',
+                'verbose_name_plural': 'Activity Archives',
+                'ordering': ['-range_start'],
+            },
+        ),
+        migrations.RunPython(partition_activity_table, unpartition_activity_table),
+        migrations.AddIndex(
+            model_name='ticketactivity',
+            index=models.Index(fields=['ticket', '-timestamp', '-id'], name='activity_ticket_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0002_activity_partitioning'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticketmessage',
+            index=models.Index(fields=['ticket', 'created_at', 'id'], name='message_ticket_created_idx'),
+        ),
+    ]
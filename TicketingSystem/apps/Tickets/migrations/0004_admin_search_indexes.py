@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:06
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0003_message_thread_index'),
+        ('Users', '0002_admin_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['-created_at', '-id'], name='ticket_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('topic'), name='gin_trgm_ops'), name='ticket_topic_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketactivity',
+            index=models.Index(fields=['-timestamp', '-id'], name='activity_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketactivity',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('details'), name='gin_trgm_ops'), name='activity_details_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketmessage',
+            index=models.Index(fields=['-created_at', '-id'], name='message_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketmessage',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('message'), name='gin_trgm_ops'), name='message_text_trgm_idx'),
+        ),
+    ]
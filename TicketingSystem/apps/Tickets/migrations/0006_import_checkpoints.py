@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0005_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True)),
+                ('line_count', models.BigIntegerField(default=0)),
+                ('byte_offset', models.BigIntegerField(default=0)),
+                ('ticket_count', models.BigIntegerField(default=0)),
+                ('message_count', models.BigIntegerField(default=0)),
+                ('attachment_count', models.BigIntegerField(default=0)),
+                ('error_count', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Import Checkpoint',
+                'verbose_name_plural': 'Import Checkpoints',
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0006_import_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestedMail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='Tickets.ticket')),
+            ],
+            options={
+                'verbose_name': 'Ingested Mail',
+                'verbose_name_plural': 'Ingested Mail',
+            },
+        ),
+    ]
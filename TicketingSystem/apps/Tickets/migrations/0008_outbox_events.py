@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:21
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0007_ingested_mail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumerOffset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer', models.CharField(max_length=100, unique=True)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Consumer Offset',
+                'verbose_name_plural': 'Consumer Offsets',
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('ticket_id', models.UUIDField(db_index=True)),
+                ('event_type', models.CharField(choices=[('created', 'Ticket Created'), ('status_changed', 'Status Changed'), ('priority_changed', 'Priority Changed'), ('message_added', 'Message Added'), ('attachment_added', 'Attachment Added'), ('assigned_to_changed', 'Assigned To Changed'), ('resolved', 'Ticket Resolved'), ('closed', 'Ticket Closed'), ('deleted', 'Ticket Deleted')], max_length=30)),
+                ('actor_id', models.UUIDField(blank=True, null=True)),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Outbox Event',
+                'verbose_name_plural': 'Outbox Events',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0009_webhooks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketFingerprint',
+            fields=[
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fingerprint', serialize=False, to='Tickets.ticket')),
+                ('signature', models.BinaryField()),
+            ],
+            options={
+                'verbose_name': 'Ticket Fingerprint',
+                'verbose_name_plural': 'Ticket Fingerprints',
+            },
+        ),
+        migrations.CreateModel(
+            name='TicketFingerprintBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprint_bands', to='Tickets.ticket')),
+            ],
+            options={
+                'verbose_name': 'Ticket Fingerprint Band',
+                'verbose_name_plural': 'Ticket Fingerprint Bands',
+                'indexes': [models.Index(fields=['bucket', 'created_at'], name='fingerprint_bucket_idx'), models.Index(fields=['created_at'], name='fingerprint_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0010_ticket_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='suggested_priority',
+            field=models.CharField(blank=True, choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('critical', 'Critical')], max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0011_ticket_suggested_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestionTerm',
+            fields=[
+                ('term', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('document_count', models.IntegerField(default=0)),
+                ('total_length', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Suggestion Term',
+                'verbose_name_plural': 'Suggestion Terms',
+            },
+        ),
+        migrations.CreateModel(
+            name='SuggestionPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.BigIntegerField()),
+                ('frequency', models.PositiveIntegerField()),
+                ('length', models.PositiveIntegerField()),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggestion_postings', to='Tickets.ticket')),
+            ],
+            options={
+                'verbose_name': 'Suggestion Posting',
+                'verbose_name_plural': 'Suggestion Postings',
+                'indexes': [models.Index(fields=['term'], name='suggestion_term_idx')],
+            },
+        ),
+    ]
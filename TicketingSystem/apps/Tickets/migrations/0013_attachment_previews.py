@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0012_suggestion_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketattachment',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='ticketattachment',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticketattachment',
+            name='line_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticketattachment',
+            name='preview_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('unsupported', 'Unsupported'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='ticketattachment',
+            name='preview_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='ticketattachment',
+            name='thumbnail',
+            field=models.FileField(blank=True, upload_to='ticket_attachments/'),
+        ),
+        migrations.AddField(
+            model_name='ticketattachment',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticketattachment',
+            index=models.Index(condition=models.Q(('preview_status', 'pending')), fields=['uploaded_at'], name='attachment_preview_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:49
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_attachment_bytes(apps, schema_editor):
+    """
+    Start the totals from the attachments already stored.
+    """
+    TicketAttachment = apps.get_model('Tickets', 'TicketAttachment')
+    models_and_fields = [
+        (apps.get_model('Tickets', 'Ticket'), 'ticket'),
+        (apps.get_model(settings.AUTH_USER_MODEL), 'uploaded_by'),
+    ]
+    for model, field in models_and_fields:
+        totals = TicketAttachment.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+            total=Sum('filesize')
+        ).values('total')
+        model.objects.filter(
+            pk__in=TicketAttachment.objects.values(field)
+        ).update(attachment_bytes=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0013_attachment_previews'),
+        ('Users', '0003_attachment_bytes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='attachment_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('attachment_bytes__gt', 0)), fields=['-attachment_bytes'], name='ticket_attachment_bytes_idx'),
+        ),
+        migrations.RunPython(count_attachment_bytes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0014_attachment_bytes'),
+        ('Users', '0003_attachment_bytes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketDeletionRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket_id', models.UUIDField(unique=True)),
+                ('topic', models.CharField(max_length=255)),
+                ('deleted_at', models.DateTimeField()),
+                ('purged_at', models.DateTimeField(blank=True, null=True)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('attachment_count', models.PositiveIntegerField(default=0)),
+                ('attachment_bytes', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Ticket Deletion Record',
+                'verbose_name_plural': 'Ticket Deletion Records',
+                'ordering': ['-deleted_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='ticket_deleted_idx'),
+        ),
+        migrations.AddField(
+            model_name='ticketdeletionrecord',
+            name='deleted_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='ticketdeletionrecord',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
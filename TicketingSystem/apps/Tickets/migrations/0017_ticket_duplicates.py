@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0016_idempotency_key_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketDuplicate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('duplicate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicated_by', to='Tickets.ticket')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_links', to='Tickets.ticket')),
+            ],
+            options={
+                'verbose_name': 'Ticket Duplicate',
+                'verbose_name_plural': 'Ticket Duplicates',
+                'ordering': ['-similarity'],
+                'constraints': [models.UniqueConstraint(fields=('ticket', 'duplicate'), name='unique_ticket_duplicate')],
+            },
+        ),
+    ]
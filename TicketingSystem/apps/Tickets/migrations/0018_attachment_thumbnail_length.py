@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Tickets', '0017_ticket_duplicates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticketattachment',
+            name='thumbnail',
+            field=models.FileField(blank=True, max_length=255, upload_to='ticket_attachments/'),
+        ),
+    ]
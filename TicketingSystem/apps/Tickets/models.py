@@ -1,10 +1,93 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models import Count, Prefetch, Q
+from django.db.models.functions import Upper
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator, MinValueValidator, URLValidator
 from apps.Users.models import Order
+from TicketingSystem.model_mixins import CounterFieldsMixin
+import secrets
 import uuid
 
 
-class Ticket(models.Model):
+def ticket_visibility(user, prefix=''):
+    """
+    Filter for the tickets user may see, with field names prefixed by prefix
+    (e.g. 'ticket__') for querying related rows. None means every ticket.
+
+    Customers see their own tickets. Staff see every ticket, except agents
+    when TICKET_AGENT_SCOPE is 'assigned': they see the tickets assigned to
+    them, the unassigned queue and their own tickets.
+    """
+    if not user.is_staff:
+        return Q(**{f'{prefix}user': user})
+    if user.user_type == 'agent' and not user.is_superuser and settings.TICKET_AGENT_SCOPE == 'assigned':
+        return (
+            Q(**{f'{prefix}assigned_to': user})
+            | Q(**{f'{prefix}assigned_to__isnull': True})
+            | Q(**{f'{prefix}user': user})
+        )
+    return None
+
+
+class TicketQuerySet(models.QuerySet):
+    """
+    Tickets filtered by who may see them and loaded in the shape each
+    endpoint serializes.
+    """
+
+    def visible_to(self, user):
+        condition = ticket_visibility(user)
+        return self if condition is None else self.filter(condition)
+
+    def for_list(self):
+        """
+        Everything TicketListSerializer reads.
+        """
+        return self.select_related('user', 'assigned_to').annotate(message_count=Count('messages'))
+
+    def for_detail(self):
+        """
+        Everything TicketDetailSerializer reads.
+        """
+        attachments = TicketAttachment.objects.select_related('uploaded_by')
+        return self.select_related('user', 'assigned_to', 'order').prefetch_related(
+            Prefetch(
+                'messages',
+                queryset=TicketMessage.objects.select_related('user').prefetch_related(
+                    Prefetch('attachments', queryset=attachments)
+                )
+            ),
+            Prefetch('attachments', queryset=attachments),
+            Prefetch('activities', queryset=TicketActivity.objects.select_related('performed_by')),
+        )
+
+
+class TicketMessageQuerySet(models.QuerySet):
+
+    def visible_to(self, user):
+        """
+        Messages on tickets user may see. Combine with select_related('ticket')
+        to fetch a message and its ticket, permission check included, in one
+        query.
+        """
+        messages = self.filter(ticket__deleted_at__isnull=True)
+        condition = ticket_visibility(user, prefix='ticket__')
+        return messages if condition is None else messages.filter(condition)
+
+
+class TicketManager(models.Manager.from_queryset(TicketQuerySet)):
+    """
+    Tickets that have not been deleted. Deleted tickets are only reachable
+    through Ticket.all_objects until apps.Tickets.purge removes them.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class Ticket(CounterFieldsMixin, models.Model):
     """
     A model for a ticket in the ticketing system.
     """
@@ -31,15 +114,34 @@ class Ticket(models.Model):
     description = models.TextField(max_length=10000)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
     priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='low')
+    # Set by the priority triage model (apps.Tickets.triage)
+    suggested_priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
+    # Combined size of the ticket's attachments (apps.Tickets.quotas)
+    attachment_bytes = models.BigIntegerField(default=0)
+    # Set when the ticket is deleted; purge_deleted_tickets removes it later
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = TicketManager()
+    all_objects = TicketQuerySet.as_manager()
+    counter_fields = ('attachment_bytes',)
 
     def __str__(self):
         return f"Ticket #{self.id} - {self.topic}"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='ticket_created_idx'),
+            GinIndex(OpClass(Upper('topic'), name='gin_trgm_ops'), name='ticket_topic_trgm_idx'),
+            models.Index(
+                fields=['-attachment_bytes'], condition=Q(attachment_bytes__gt=0),
+                name='ticket_attachment_bytes_idx'
+            ),
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='ticket_deleted_idx'),
+        ]
 
 
 class TicketMessage(models.Model):
@@ -53,6 +155,8 @@ class TicketMessage(models.Model):
     is_staff_message = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TicketMessageQuerySet.as_manager()
+
     def __str__(self):
         return f"Message #{self.id} - {self.user.username}"
 
@@ -60,13 +164,27 @@ class TicketMessage(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Ticket Message'
         verbose_name_plural = 'Ticket Messages'
+        indexes = [
+            models.Index(fields=['ticket', 'created_at', 'id'], name='message_ticket_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='message_created_idx'),
+            GinIndex(OpClass(Upper('message'), name='gin_trgm_ops'), name='message_text_trgm_idx'),
+        ]
 
 
 class TicketAttachment(models.Model):
     """
-    Attachment to a ticket message.
+    Attachment to a ticket message. Its preview (a thumbnail stored next to
+    the file for images, the first lines for text) is generated after upload
+    by generate_previews; see apps.Tickets.previews.
     """
 
+    PREVIEW_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('unsupported', 'Unsupported'),
+        ('failed', 'Failed'),
+    ]
+
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='attachments')
     message = models.ForeignKey(TicketMessage, on_delete=models.CASCADE, related_name='attachments')
     file = models.FileField(upload_to='ticket_attachments/')
@@ -74,6 +192,14 @@ class TicketAttachment(models.Model):
     filesize = models.IntegerField(null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploaded_attachments')
+    content_type = models.CharField(max_length=100, blank=True)
+    preview_status = models.CharField(max_length=20, choices=PREVIEW_STATUS_CHOICES, default='pending')
+    # Room for the file's name plus the .thumb.jpg suffix
+    thumbnail = models.FileField(upload_to='ticket_attachments/', max_length=255, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    preview_text = models.TextField(blank=True)
+    line_count = models.PositiveIntegerField(null=True, blank=True)
 
     def __str__(self):
         return f"Attachment #{self.id} - {self.filename}"
@@ -82,6 +208,13 @@ class TicketAttachment(models.Model):
         ordering = ['-uploaded_at']
         verbose_name = 'Ticket Attachment'
         verbose_name_plural = 'Ticket Attachments'
+        indexes = [
+            # The preview worker's queue; rows leave it once processed
+            models.Index(
+                fields=['uploaded_at'], condition=Q(preview_status='pending'),
+                name='attachment_preview_pending_idx'
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if self.file:
@@ -120,3 +253,349 @@ class TicketActivity(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Ticket Activity'
         verbose_name_plural = 'Ticket Activities'
+        indexes = [
+            models.Index(fields=['ticket', '-timestamp', '-id'], name='activity_ticket_ts_idx'),
+            models.Index(fields=['-timestamp', '-id'], name='activity_timestamp_idx'),
+            GinIndex(OpClass(Upper('details'), name='gin_trgm_ops'), name='activity_details_trgm_idx'),
+        ]
+
+
+class TicketFingerprint(models.Model):
+    """
+    MinHash signature of a ticket's topic and description, used to spot
+    near-duplicate tickets (see apps.Tickets.dedup).
+    """
+
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, primary_key=True, related_name='fingerprint')
+    signature = models.BinaryField()
+
+    def __str__(self):
+        return f"Fingerprint of ticket {self.ticket_id}"
+
+    class Meta:
+        verbose_name = 'Ticket Fingerprint'
+        verbose_name_plural = 'Ticket Fingerprints'
+
+
+class TicketFingerprintBand(models.Model):
+    """
+    One LSH band bucket of a ticket's fingerprint. Tickets sharing a bucket
+    are near-duplicate candidates. created_at copies the ticket's, so the
+    lookup and pruning of old rows stay on this table.
+    """
+
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='fingerprint_bands')
+    bucket = models.BigIntegerField()
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Bucket {self.bucket} of ticket {self.ticket_id}"
+
+    class Meta:
+        verbose_name = 'Ticket Fingerprint Band'
+        verbose_name_plural = 'Ticket Fingerprint Bands'
+        indexes = [
+            models.Index(fields=['bucket', 'created_at'], name='fingerprint_bucket_idx'),
+            models.Index(fields=['created_at'], name='fingerprint_created_idx'),
+        ]
+
+
+class TicketDuplicate(models.Model):
+    """
+    A likely duplicate found when a ticket was created, kept for staff
+    whatever the creator was allowed to see.
+    """
+
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='duplicate_links')
+    duplicate = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='duplicated_by')
+    similarity = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Ticket {self.ticket_id} may duplicate {self.duplicate_id}"
+
+    class Meta:
+        ordering = ['-similarity']
+        verbose_name = 'Ticket Duplicate'
+        verbose_name_plural = 'Ticket Duplicates'
+        constraints = [
+            models.UniqueConstraint(fields=['ticket', 'duplicate'], name='unique_ticket_duplicate'),
+        ]
+
+
+class SuggestionTerm(models.Model):
+    """
+    How many tickets in the reply suggestion index contain a term (see
+    apps.Tickets.suggestions). The row for term 0 holds the corpus totals:
+    the number of indexed tickets and their combined length in terms.
+    """
+
+    term = models.BigIntegerField(primary_key=True)
+    document_count = models.IntegerField(default=0)
+    total_length = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Term {self.term} in {self.document_count} tickets"
+
+    class Meta:
+        verbose_name = 'Suggestion Term'
+        verbose_name_plural = 'Suggestion Terms'
+
+
+class SuggestionPosting(models.Model):
+    """
+    A term of a resolved ticket in the reply suggestion index, with how often
+    it occurs and the length of the ticket's indexed text.
+    """
+
+    term = models.BigIntegerField()
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='suggestion_postings')
+    frequency = models.PositiveIntegerField()
+    length = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"Term {self.term} in ticket {self.ticket_id}"
+
+    class Meta:
+        verbose_name = 'Suggestion Posting'
+        verbose_name_plural = 'Suggestion Postings'
+        indexes = [
+            models.Index(fields=['term'], name='suggestion_term_idx'),
+        ]
+
+
+class ActivityArchive(models.Model):
+    """
+    A monthly TicketActivity partition that was exported to a compressed file
+    and removed from the database.
+    """
+
+    partition = models.CharField(max_length=100, unique=True)
+    range_start = models.DateTimeField()
+    range_end = models.DateTimeField()
+    path = models.CharField(max_length=500)
+    index_path = models.CharField(max_length=500)
+    row_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archive {self.partition} ({self.row_count} rows)"
+
+    class Meta:
+        ordering = ['-range_start']
+        verbose_name = 'Activity Archive'
+        verbose_name_plural = 'Activity Archives'
+
+
+class TicketDeletionRecord(models.Model):
+    """
+    What is left of a deleted ticket once it has been purged: who deleted
+    it and when, and what was removed with it. There is no foreign key to
+    the ticket, so records outlive it.
+    """
+
+    ticket_id = models.UUIDField(unique=True)
+    topic = models.CharField(max_length=255)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, related_name='+', null=True, blank=True
+    )
+    deleted_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, related_name='+', null=True, blank=True
+    )
+    deleted_at = models.DateTimeField()
+    purged_at = models.DateTimeField(null=True, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+    attachment_count = models.PositiveIntegerField(default=0)
+    attachment_bytes = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Deleted ticket {self.ticket_id} - {self.topic}"
+
+    class Meta:
+        ordering = ['-deleted_at']
+        verbose_name = 'Ticket Deletion Record'
+        verbose_name_plural = 'Ticket Deletion Records'
+
+
+class IdempotencyKey(models.Model):
+    """
+    An Idempotency-Key sent with a create request, and the response to replay
+    when the same request is sent again. A row without a status_code belongs
+    to a request that is still being processed, until locked_until.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    # End of the lease of the request processing the key (apps.Tickets.idempotency)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Idempotency key {self.key} ({self.user_id})"
+
+    class Meta:
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    """
+    How far the import of a legacy ticket stream has got. Advanced in the
+    same transaction as each imported batch, so a restarted import picks up
+    exactly where the last one stopped.
+    """
+
+    source = models.CharField(max_length=255, unique=True)
+    line_count = models.BigIntegerField(default=0)
+    byte_offset = models.BigIntegerField(default=0)
+    ticket_count = models.BigIntegerField(default=0)
+    message_count = models.BigIntegerField(default=0)
+    attachment_count = models.BigIntegerField(default=0)
+    error_count = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Import {self.source} ({self.ticket_count} tickets)"
+
+    class Meta:
+        ordering = ['-updated_at']
+        verbose_name = 'Import Checkpoint'
+        verbose_name_plural = 'Import Checkpoints'
+
+
+class IngestedMail(models.Model):
+    """
+    An email filed on a ticket by ingest_mail, by Message-ID. Used to skip
+    messages that were already ingested and to thread replies onto the
+    ticket of the email they answer.
+    """
+
+    message_id = models.CharField(max_length=255, unique=True)
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='emails')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Email {self.message_id} on ticket {self.ticket_id}"
+
+    class Meta:
+        verbose_name = 'Ingested Mail'
+        verbose_name_plural = 'Ingested Mail'
+
+
+class OutboxEvent(models.Model):
+    """
+    An append-only record of a ticket change, written in the same
+    transaction as the change. The id is the event's offset. There is no
+    foreign key to the ticket, so events outlive deleted tickets.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    ticket_id = models.UUIDField(db_index=True)
+    event_type = models.CharField(max_length=30, choices=TicketActivity.ACTION_CHOICES)
+    actor_id = models.UUIDField(null=True, blank=True)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Event #{self.id} - {self.event_type} on {self.ticket_id}"
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+
+
+class ConsumerOffset(models.Model):
+    """
+    The offset of the last outbox event a downstream consumer has processed.
+    """
+
+    consumer = models.CharField(max_length=100, unique=True)
+    offset = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.consumer} at {self.offset}"
+
+    class Meta:
+        verbose_name = 'Consumer Offset'
+        verbose_name_plural = 'Consumer Offsets'
+
+
+def generate_webhook_secret():
+    return secrets.token_hex(32)
+
+
+class WebhookSubscription(models.Model):
+    """
+    An endpoint that receives ticket events from the outbox. Requests carry
+    up to batch_size events and are signed with secret; at most
+    max_concurrency requests to the endpoint are in flight at once. An empty
+    event_types receives every event.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=100)
+    url = models.URLField(max_length=500, validators=[URLValidator(schemes=['http', 'https'])])
+    secret = models.CharField(max_length=128, default=generate_webhook_secret)
+    event_types = models.JSONField(default=list, blank=True)
+    batch_size = models.PositiveSmallIntegerField(
+        default=1, validators=[MinValueValidator(1), MaxValueValidator(1000)]
+    )
+    max_concurrency = models.PositiveSmallIntegerField(
+        default=4, validators=[MinValueValidator(1), MaxValueValidator(100)]
+    )
+    is_active = models.BooleanField(default=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, related_name='webhook_subscriptions',
+        null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def consumer(self):
+        """
+        The ConsumerOffset name this subscription reads the outbox as.
+        """
+        return f'webhook:{self.pk}'
+
+    def __str__(self):
+        return f"Webhook {self.name} ({self.url})"
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Webhook Subscription'
+        verbose_name_plural = 'Webhook Subscriptions'
+
+
+class WebhookDeadLetter(models.Model):
+    """
+    A webhook request that still failed after the last attempt, kept with
+    the payload that was sent.
+    """
+
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE, related_name='dead_letters')
+    first_offset = models.BigIntegerField()
+    last_offset = models.BigIntegerField()
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    attempts = models.PositiveSmallIntegerField()
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Dead letter {self.first_offset}-{self.last_offset} for {self.subscription_id}"
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Webhook Dead Letter'
+        verbose_name_plural = 'Webhook Dead Letters'
@@ -0,0 +1,76 @@
+import base64
+import binascii
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class InvalidCursor(Exception):
+    """
+    Raised when a cursor token cannot be decoded.
+    """
+
+
+def encode_cursor(timestamp, pk):
+    """
+    Encode a (timestamp, id) position into an opaque, URL-safe token.
+    """
+    raw = f'{timestamp.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a token produced by encode_cursor() back into (timestamp, id).
+    Returns None when no token was given.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        timestamp, pk = raw.split('|', 1)
+        timestamp = parse_datetime(timestamp)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(token)
+    if timestamp is None:
+        raise InvalidCursor(token)
+    return timestamp, pk
+
+
+def before_position(field, position):
+    """
+    Filter for rows strictly older than position on (field, id).
+    """
+    timestamp, pk = position
+    return Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'id__lt': pk})
+
+
+def after_position(field, position):
+    """
+    Filter for rows strictly newer than position on (field, id).
+    """
+    timestamp, pk = position
+    return Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': pk})
+
+
+def get_page_size(request, default, maximum, param='page_size'):
+    """
+    Read ?page_size= (or another param) from the request, clamped to
+    [1, maximum].
+    """
+    try:
+        page_size = int(request.query_params.get(param, default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(page_size, maximum))
+
+
+def build_page_url(request, param, token, clear=()):
+    """
+    Build an absolute URL for the current request with param set to token.
+    """
+    url = request.build_absolute_uri()
+    for key in clear:
+        url = remove_query_param(url, key)
+    return replace_query_param(url, param, token)
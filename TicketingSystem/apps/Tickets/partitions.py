@@ -0,0 +1,358 @@
+"""
+Monthly range partitioning of the TicketActivity table on PostgreSQL, plus
+export of old partitions to compressed archive files.
+
+Archive files are a series of gzip members, one per ticket, each holding that
+ticket's rows as newline-delimited JSON ordered newest first. A sidecar index
+holds a fixed-size (ticket id, offset, length) entry per member, sorted by
+ticket id, so a single ticket's history is found by binary search and read
+back without loading the index or decompressing the whole file.
+
+The list of archives is cached under a version kept in a marker file in
+TICKET_ACTIVITY_ARCHIVE_DIR, which every process reading the archives shares.
+Archiving a partition replaces the version, so no process keeps serving a
+list without it.
+"""
+import gzip
+import json
+import os
+import re
+import struct
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+ARCHIVE_CACHE_KEY = 'tickets:activity-archives'
+ARCHIVE_VERSION_FILE = '.version'
+# Ticket id, member offset and member length
+INDEX_ENTRY = struct.Struct('>16sQQ')
+ARCHIVE_COLUMNS = ['id', 'ticket_id', 'action', 'details', 'timestamp', 'performed_by_id']
+PARTITION_SUFFIX = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+def month_start(value):
+    """
+    Truncate a datetime to the first instant of its month in UTC.
+    """
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    """
+    Shift a month_start() value by a number of months.
+    """
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table, start):
+    return f'{table}_p{start:%Y%m}'
+
+
+def is_partitioned(connection, table):
+    """
+    Whether table is a natively partitioned PostgreSQL table.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace",
+            [table]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection, table):
+    """
+    Return [(name, range_start, range_end)] for the monthly partitions of table,
+    oldest first. The default partition is not included.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND p.relnamespace = current_schema()::regnamespace",
+            [table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+            partitions.append((name, start, add_months(start, 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def default_partition(table):
+    return f'{table}_default'
+
+
+def create_partition(schema_editor, table, start):
+    """
+    Create the monthly partition of table that starts at start, if missing.
+
+    PostgreSQL refuses to add a partition for a range that already has rows
+    in the default partition (left there when archive_activity has not run
+    for longer than months_ahead, or by a far-future timestamp), so those
+    rows are moved: the default partition is detached, the new partition
+    created and filled from it, and the default attached again, all in the
+    schema editor's transaction.
+    """
+    connection = schema_editor.connection
+    qn = schema_editor.quote_name
+    name = partition_name(table, start)
+    end = add_months(start, 1)
+    default = default_partition(table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT to_regclass(%s) IS NULL AND to_regclass(%s) IS NOT NULL",
+            [qn(name), qn(default)]
+        )
+        check_default = cursor.fetchone()[0]
+        misplaced = False
+        if check_default:
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {qn(default)} WHERE timestamp >= %s AND timestamp < %s)",
+                [start, end]
+            )
+            misplaced = cursor.fetchone()[0]
+
+    if not misplaced:
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(table)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            params=[start, end]
+        )
+        return name
+
+    # Deferred foreign key checks still pending on the table would block
+    # the DETACH
+    connection.check_constraints()
+    schema_editor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(default)}")
+    schema_editor.execute(
+        f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)",
+        params=[start, end]
+    )
+    schema_editor.execute(
+        f"INSERT INTO {qn(name)} SELECT * FROM {qn(default)} WHERE timestamp >= %s AND timestamp < %s",
+        params=[start, end]
+    )
+    schema_editor.execute(
+        f"DELETE FROM {qn(default)} WHERE timestamp >= %s AND timestamp < %s", params=[start, end]
+    )
+    schema_editor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(default)} DEFAULT")
+    return name
+
+
+def ensure_partitions(table, months_ahead=3, since=None, using='default'):
+    """
+    Make sure monthly partitions exist from the month of since (default: the
+    current month) up to months_ahead months in the future. Returns the
+    names that were created.
+    """
+    connection = connections[using]
+    if not is_partitioned(connection, table):
+        return []
+
+    existing = {name for name, _, _ in list_partitions(connection, table)}
+    current = month_start(timezone.now())
+    start = month_start(since) if since else current
+    created = []
+    with connection.schema_editor() as schema_editor:
+        while start <= add_months(current, months_ahead):
+            if partition_name(table, start) not in existing:
+                created.append(create_partition(schema_editor, table, start))
+            start = add_months(start, 1)
+    return created
+
+
+def write_archive(rows, path, index_path):
+    """
+    Write activity rows, as (id, ticket id, action, details, timestamp,
+    performed by id) tuples grouped by ticket and newest first within each,
+    to an archive file at path and its index at index_path. Returns the
+    number of rows written.
+    """
+    entries = []
+    row_count = 0
+
+    def flush(ticket_id, lines, handle):
+        offset = handle.tell()
+        handle.write(gzip.compress(''.join(lines).encode()))
+        entries.append((uuid.UUID(ticket_id).bytes, offset, handle.tell() - offset))
+
+    with open(path, 'wb') as handle:
+        current_ticket, lines = None, []
+        for pk, ticket_id, action, details, timestamp, performed_by_id in rows:
+            ticket_id = str(ticket_id)
+            if ticket_id != current_ticket and lines:
+                flush(current_ticket, lines, handle)
+                lines = []
+            current_ticket = ticket_id
+            lines.append(json.dumps({
+                'id': pk,
+                'action': action,
+                'details': details,
+                'timestamp': timestamp.isoformat(),
+                'performed_by_id': str(performed_by_id),
+            }) + '\n')
+            row_count += 1
+        if lines:
+            flush(current_ticket, lines, handle)
+
+    entries.sort()
+    with open(index_path, 'wb') as handle:
+        for entry in entries:
+            handle.write(INDEX_ENTRY.pack(*entry))
+    return row_count
+
+
+def export_partition(connection, partition, path, index_path):
+    """
+    Stream every row of partition into an archive file at path, writing its
+    index to index_path. Returns the number of rows written.
+    """
+    columns = ', '.join(connection.ops.quote_name(column) for column in ARCHIVE_COLUMNS)
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f"SELECT {columns} FROM {connection.ops.quote_name(partition)} "
+            f"ORDER BY ticket_id, timestamp DESC, id DESC"
+        )
+        return write_archive(cursor, path, index_path)
+
+
+def archive_partition(table, name, range_start, range_end, output_dir=None, using='default'):
+    """
+    Export a monthly partition to output_dir, then detach and drop it and
+    record the archive. The export runs before any lock on the parent table is
+    taken, so only the final detach blocks concurrent writers.
+    """
+    from .models import ActivityArchive
+
+    connection = connections[using]
+    output_dir = output_dir or settings.TICKET_ACTIVITY_ARCHIVE_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f'{name}.ndjson.gz')
+    index_path = os.path.join(output_dir, f'{name}.index')
+
+    row_count = export_partition(connection, name, path, index_path)
+
+    qn = connection.ops.quote_name
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+            cursor.execute(f"DROP TABLE {qn(name)}")
+        archive = ActivityArchive.objects.using(using).create(
+            partition=name,
+            range_start=range_start,
+            range_end=range_end,
+            path=path,
+            index_path=index_path,
+            row_count=row_count,
+        )
+    bump_archives_version()
+    return archive
+
+
+def version_path():
+    return os.path.join(settings.TICKET_ACTIVITY_ARCHIVE_DIR, ARCHIVE_VERSION_FILE)
+
+
+def archives_version():
+    try:
+        with open(version_path()) as handle:
+            return handle.read().strip()
+    except FileNotFoundError:
+        return ''
+
+
+def bump_archives_version():
+    """
+    Give the archive list a new version, so that every process reloads it.
+    """
+    path = version_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(temporary, 'w') as handle:
+        handle.write(uuid.uuid4().hex)
+    os.replace(temporary, path)
+
+
+def get_archives():
+    """
+    Return the archived ranges, newest first, cached across requests.
+    """
+    from .models import ActivityArchive
+
+    return cache.get_or_set(
+        f'{ARCHIVE_CACHE_KEY}:{archives_version()}',
+        lambda: list(ActivityArchive.objects.values('range_start', 'range_end', 'path', 'index_path')),
+        timeout=300,
+    )
+
+
+def find_member(index_path, ticket_id):
+    """
+    Binary search an archive index for a ticket. Returns the (offset, length)
+    of its member, or None if the archive has no rows of the ticket.
+    """
+    key = uuid.UUID(str(ticket_id)).bytes
+    with open(index_path, 'rb') as handle:
+        low, high = 0, os.fstat(handle.fileno()).st_size // INDEX_ENTRY.size
+        while low < high:
+            middle = (low + high) // 2
+            handle.seek(middle * INDEX_ENTRY.size)
+            entry, offset, length = INDEX_ENTRY.unpack(handle.read(INDEX_ENTRY.size))
+            if entry == key:
+                return offset, length
+            if entry < key:
+                low = middle + 1
+            else:
+                high = middle
+    return None
+
+
+def read_archived_rows(archive, ticket_id):
+    """
+    Read one ticket's rows from an archive file, newest first.
+    """
+    location = find_member(archive['index_path'], ticket_id)
+    if location is None:
+        return []
+
+    offset, length = location
+    with open(archive['path'], 'rb') as handle:
+        handle.seek(offset)
+        data = gzip.decompress(handle.read(length))
+
+    rows = []
+    for line in data.decode().splitlines():
+        row = json.loads(line)
+        row['timestamp'] = parse_datetime(row['timestamp'])
+        rows.append(row)
+    return rows
+
+
+def iter_archived_rows(ticket, before=None):
+    """
+    Yield archived activity rows of a ticket strictly older than the
+    (timestamp, id) position before, newest first.
+    """
+    for archive in get_archives():
+        if archive['range_end'] <= ticket.created_at:
+            break
+        if before is not None and archive['range_start'] > before[0]:
+            continue
+        for row in read_archived_rows(archive, ticket.pk):
+            if before is None or (row['timestamp'], row['id']) < before:
+                yield row
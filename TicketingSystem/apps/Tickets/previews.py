@@ -0,0 +1,185 @@
+"""
+Attachment previews.
+
+Ticket views show a small preview of each attachment instead of loading
+the original: images get a JPEG thumbnail at most
+TICKET_ATTACHMENT_THUMBNAIL_SIZE pixels on a side, stored next to the file
+as <file>.thumb.jpg, and their dimensions; text files, logs included, get
+their first TICKET_ATTACHMENT_PREVIEW_LINES lines and their line count.
+Other files are marked unsupported.
+
+Uploads are saved with preview_status 'pending'. generate_previews renders
+them on a process pool, where only storage is touched, and saves the
+results a batch at a time. Rendering thumbnails needs Pillow, which only the
+preview workers import.
+"""
+import io
+import mimetypes
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from .models import TicketAttachment
+
+THUMBNAIL_SUFFIX = '.thumb.jpg'
+# Formats Pillow can decode
+IMAGE_TYPES = frozenset(['image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp', 'image/tiff'])
+TEXT_TYPES = frozenset([
+    'application/json', 'application/xml', 'application/yaml', 'application/x-yaml',
+    'application/javascript', 'application/x-sh', 'application/sql',
+])
+# Bytes read to tell text from binary when the name gives no type
+SNIFF_BYTES = 8192
+PREVIEW_FIELDS = ['content_type', 'preview_status', 'thumbnail', 'width', 'height', 'preview_text', 'line_count']
+
+
+def guess_content_type(name, head):
+    """
+    The type of a file from its name, or for names without a known
+    extension (such as app.log.1), text/plain if its start has no NUL bytes.
+    """
+    content_type, _ = mimetypes.guess_type(name)
+    if content_type:
+        return content_type
+    return 'application/octet-stream' if b'\0' in head else 'text/plain'
+
+
+def is_text(content_type):
+    return content_type.startswith('text/') or content_type in TEXT_TYPES
+
+
+def text_preview(source):
+    """
+    The first lines of a text file, each cut to
+    TICKET_ATTACHMENT_PREVIEW_LINE_LENGTH characters, and its line count.
+    """
+    lines = settings.TICKET_ATTACHMENT_PREVIEW_LINES
+    width = settings.TICKET_ATTACHMENT_PREVIEW_LINE_LENGTH
+    # Enough bytes for the preview lines at full width in any UTF-8 text
+    head = source.read(lines * (width + 1) * 4)
+    preview = [line[:width] for line in head.decode('utf-8', errors='replace').splitlines()[:lines]]
+
+    line_count = head.count(b'\n')
+    last = head[-1:]
+    for chunk in iter(lambda: source.read(1 << 20), b''):
+        line_count += chunk.count(b'\n')
+        last = chunk[-1:]
+    if last and last != b'\n':
+        line_count += 1
+    return {'preview_text': '\n'.join(preview), 'line_count': line_count}
+
+
+def image_preview(name, source):
+    """
+    Write a JPEG thumbnail of an image next to it and return its name and
+    the image's dimensions.
+    """
+    from PIL import Image, ImageOps
+
+    size = settings.TICKET_ATTACHMENT_THUMBNAIL_SIZE
+    with Image.open(source) as image:
+        width, height = image.size
+        # JPEGs are decoded straight at a fraction of their size
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode != 'RGB':
+            # Transparent areas become white
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, 'white')
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=80, optimize=True)
+
+    thumbnail = f'{name}{THUMBNAIL_SUFFIX}'
+    if default_storage.exists(thumbnail):
+        default_storage.delete(thumbnail)
+    thumbnail = default_storage.save(
+        thumbnail, ContentFile(output.getvalue()), max_length=TicketAttachment._meta.get_field('thumbnail').max_length
+    )
+    return {'thumbnail': thumbnail, 'width': width, 'height': height}
+
+
+def build_preview(item):
+    """
+    Render the preview of one attachment, given as (id, file name), into the
+    fields to save on it. Returns (id, fields, error).
+    """
+    pk, name = item
+    fields = {
+        'content_type': '', 'preview_status': 'unsupported', 'thumbnail': '', 'width': None, 'height': None,
+        'preview_text': '', 'line_count': None,
+    }
+    try:
+        with default_storage.open(name, 'rb') as source:
+            fields['content_type'] = guess_content_type(name, source.read(SNIFF_BYTES))
+            source.seek(0)
+            if fields['content_type'] in IMAGE_TYPES:
+                fields.update(image_preview(name, source), preview_status='ready')
+            elif is_text(fields['content_type']):
+                fields.update(text_preview(source), preview_status='ready')
+    except Exception as exc:
+        fields['preview_status'] = 'failed'
+        return pk, fields, f'{type(exc).__name__}: {exc}'
+    return pk, fields, None
+
+
+def initialize_worker():
+    django.setup()
+
+
+class PreviewGenerator:
+    """
+    Render the previews of pending attachments on a process pool and save
+    them a batch at a time.
+    """
+
+    def __init__(self, batch_size=None, workers=None):
+        self.batch_size = batch_size or settings.TICKET_ATTACHMENT_PREVIEW_BATCH_SIZE
+        self.workers = settings.TICKET_ATTACHMENT_PREVIEW_WORKERS if workers is None else workers
+        self.pool = None
+        self.stats = Counter()
+        self.errors = []
+
+    def __enter__(self):
+        if self.workers:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn' if os.name == 'nt' else 'fork'),
+                initializer=initialize_worker,
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+
+    def render(self, items):
+        if self.pool is None:
+            return [build_preview(item) for item in items]
+        chunksize = max(1, len(items) // (self.workers * 4))
+        return list(self.pool.map(build_preview, items, chunksize=chunksize))
+
+    def run_once(self):
+        """
+        Process every pending attachment. Returns the number processed.
+        """
+        pending = TicketAttachment.objects.filter(preview_status='pending').order_by('uploaded_at')
+        processed = 0
+        while True:
+            items = list(pending.values_list('pk', 'file')[:self.batch_size])
+            if not items:
+                return processed
+            attachments = []
+            for pk, fields, error in self.render(items):
+                attachments.append(TicketAttachment(pk=pk, **fields))
+                self.stats[fields['preview_status']] += 1
+                if error and len(self.errors) < 100:
+                    self.errors.append({'attachment': pk, 'error': error})
+            TicketAttachment.objects.bulk_update(attachments, PREVIEW_FIELDS)
+            processed += len(items)
@@ -0,0 +1,114 @@
+"""
+Purging deleted tickets.
+
+Deleting a ticket only sets its deleted_at, which hides it from
+Ticket.objects and so from every endpoint, and writes a
+TicketDeletionRecord. purge_deleted_tickets then removes what hangs off
+each deleted ticket a batch at a time, every batch in its own short
+transaction, so no single statement cascades through a whole ticket
+history: attachments first, taken off their uploaders' storage totals and
+their files and thumbnails deleted once the batch commits; then the
+ticket is dropped from the reply suggestion index, taking it off the term
+counts; then the rows of every other table referencing the ticket,
+messages last; then the ticket itself. The deletion record is kept, with what was purged.
+
+Activity already archived to files (archive_activity) is left there.
+"""
+from collections import Counter
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.utils import timezone
+from .models import Ticket, TicketAttachment, TicketDeletionRecord, TicketMessage
+from .quotas import refund
+from .suggestions import reindex_tickets
+
+
+def child_relations():
+    """
+    Relations of the rows deleted with a ticket, other than attachments,
+    with messages last since attachments reference them too.
+    """
+    relations = [
+        relation for relation in Ticket._meta.related_objects
+        if relation.on_delete is models.CASCADE and relation.related_model is not TicketAttachment
+    ]
+    return sorted(relations, key=lambda relation: relation.related_model is TicketMessage)
+
+
+def purge_attachments(ticket_id, batch_size):
+    """
+    Delete a ticket's attachments and their files. Returns their number and
+    combined size.
+    """
+    count = size = 0
+    while True:
+        with transaction.atomic():
+            # Locked so that concurrent purges never refund them twice
+            batch = list(
+                TicketAttachment.objects.select_for_update().filter(ticket_id=ticket_id).order_by().values_list(
+                    'pk', 'file', 'thumbnail', 'filesize'
+                )[:batch_size]
+            )
+            if not batch:
+                return count, size
+            attachments = TicketAttachment.objects.filter(pk__in=[pk for pk, *_ in batch])
+            refund(attachments, tickets=False)
+            attachments.delete()
+        # Only once the rows are gone, so no attachment is left without its file
+        for _, name, thumbnail, _ in batch:
+            for path in (name, thumbnail):
+                if path:
+                    default_storage.delete(path)
+        count += len(batch)
+        size += sum(filesize or 0 for *_, filesize in batch)
+
+
+def purge_ticket(ticket_id, batch_size=None):
+    """
+    Remove a deleted ticket and everything on it, and fill in its deletion
+    record. Returns counts of the rows removed, by model label.
+    """
+    batch_size = batch_size or settings.TICKET_PURGE_BATCH_SIZE
+    counts = Counter()
+    counts[TicketAttachment._meta.label], size = purge_attachments(ticket_id, batch_size)
+    # Deleted tickets are not in Ticket.objects, so this only removes it
+    reindex_tickets([ticket_id])
+    for relation in child_relations():
+        model = relation.related_model
+        rows = model._base_manager.filter(**{relation.field.name: ticket_id}).order_by()
+        while True:
+            ids = list(rows.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                model._base_manager.filter(pk__in=ids).delete()
+            counts[model._meta.label] += len(ids)
+
+    with transaction.atomic():
+        Ticket.all_objects.filter(pk=ticket_id, deleted_at__isnull=False).delete()
+        TicketDeletionRecord.objects.filter(ticket_id=ticket_id).update(
+            purged_at=timezone.now(),
+            message_count=counts[TicketMessage._meta.label],
+            attachment_count=counts[TicketAttachment._meta.label],
+            attachment_bytes=size,
+        )
+    return counts
+
+
+def purge_deleted_tickets(batch_size=None, progress=None):
+    """
+    Purge every deleted ticket, oldest deletion first. Returns the number of
+    tickets purged.
+    """
+    purged = 0
+    deleted = Ticket.all_objects.filter(deleted_at__isnull=False).order_by('deleted_at').values_list('pk', flat=True)
+    while True:
+        ids = list(deleted[:100])
+        if not ids:
+            return purged
+        for ticket_id in ids:
+            purge_ticket(ticket_id, batch_size)
+            purged += 1
+            if progress:
+                progress(purged)
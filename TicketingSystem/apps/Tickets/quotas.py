@@ -0,0 +1,164 @@
+"""
+Attachment storage accounting and quotas.
+
+Ticket.attachment_bytes and User.attachment_bytes hold the combined size of
+a ticket's attachments and of the attachments a user uploaded. Every path
+that adds or deletes attachments calls charge() or refund() in the same
+transaction, so the totals are read directly and never summed from
+TicketAttachment. recount() rebuilds them should they ever drift.
+
+Uploads that would take the uploader past USER_ATTACHMENT_QUOTA_BYTES, or
+the ticket past TICKET_ATTACHMENT_QUOTA_BYTES, are refused with 413 by
+their Content-Length, before their body is read. (Django only parses
+multipart bodies of a declared length, so every upload has one.) Concurrent
+uploads are each checked against the totals before them, so a user can go
+over by at most the uploads they have in flight.
+"""
+from collections import Counter
+from functools import wraps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.template.defaultfilters import filesizeformat
+from rest_framework import status
+from rest_framework.response import Response
+from .idempotency import is_replay
+from .models import Ticket, TicketAttachment
+
+User = get_user_model()
+
+
+def add_bytes(model, deltas):
+    """
+    Add {pk: bytes} to the attachment_bytes of model rows, in one UPDATE.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if len(deltas) == 1:
+        [(pk, delta)] = deltas.items()
+        model.objects.filter(pk=pk).update(attachment_bytes=F('attachment_bytes') + delta)
+        return
+    change = Case(*[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()], output_field=BigIntegerField())
+    model.objects.filter(pk__in=deltas).update(attachment_bytes=F('attachment_bytes') + change)
+
+
+def charge(attachments):
+    """
+    Count newly stored attachments in their ticket's and uploader's totals.
+    """
+    tickets, users = Counter(), Counter()
+    for attachment in attachments:
+        tickets[attachment.ticket_id] += attachment.filesize or 0
+        users[attachment.uploaded_by_id] += attachment.filesize or 0
+    add_bytes(Ticket, tickets)
+    add_bytes(User, users)
+
+
+def refund(attachments, tickets=True):
+    """
+    Take a queryset of attachments that are about to be deleted off the
+    totals. Call it before the delete, including deletes that cascade from
+    tickets or messages; pass tickets=False when their tickets are being
+    deleted too, to leave those totals alone.
+    """
+    ticket_deltas, users = Counter(), Counter()
+    for ticket_id, user_id, total in attachments.order_by().values_list(
+        'ticket_id', 'uploaded_by_id'
+    ).annotate(total=Sum('filesize')):
+        ticket_deltas[ticket_id] -= total or 0
+        users[user_id] -= total or 0
+    if tickets:
+        add_bytes(Ticket, ticket_deltas)
+    add_bytes(User, users)
+
+
+def recount():
+    """
+    Recompute every ticket's and user's total from their attachments.
+    """
+    for model, field in ((Ticket, 'ticket'), (User, 'uploaded_by')):
+        totals = TicketAttachment.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+            total=Sum('filesize')
+        ).values('total')
+        model.objects.update(attachment_bytes=Coalesce(Subquery(totals), 0))
+
+
+class AttachmentRefundAdminMixin:
+    """
+    ModelAdmin deletes that take the attachments they delete, directly or
+    by cascade, off the totals. attachment_lookups name the TicketAttachment
+    relations to the admin's model.
+    """
+    attachment_lookups = ()
+
+    def deleted_attachments(self, queryset):
+        condition = Q()
+        for lookup in self.attachment_lookups:
+            condition |= Q(**{f'{lookup}__in': queryset})
+        return TicketAttachment.objects.filter(condition)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            refund(self.deleted_attachments([obj.pk]))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            refund(self.deleted_attachments(queryset.values('pk')))
+            super().delete_queryset(request, queryset)
+
+
+def remaining_quota(user, ticket_id):
+    """
+    Bytes user may still upload to the ticket, or None without a quota.
+    Raises Ticket.DoesNotExist for a ticket user may not see, so its usage
+    is never revealed.
+    """
+    remaining = []
+    if settings.USER_ATTACHMENT_QUOTA_BYTES:
+        remaining.append(settings.USER_ATTACHMENT_QUOTA_BYTES - user.attachment_bytes)
+    if settings.TICKET_ATTACHMENT_QUOTA_BYTES:
+        used = Ticket.objects.visible_to(user).filter(pk=ticket_id).values_list(
+            'attachment_bytes', flat=True
+        ).first()
+        if used is None:
+            raise Ticket.DoesNotExist
+        remaining.append(settings.TICKET_ATTACHMENT_QUOTA_BYTES - used)
+    return max(min(remaining), 0) if remaining else None
+
+
+def attachment_quota(view_method):
+    """
+    Refuse uploads to the ticket in the ticket_id URL argument that would go
+    over quota, before their body is read. Apply it outside @idempotent,
+    which reads the body. Repeats of a completed Idempotency-Key are let
+    through so they get the stored response.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if is_replay(request):
+            return view_method(self, request, *args, **kwargs)
+        try:
+            remaining = remaining_quota(request.user, kwargs['ticket_id'])
+        except Ticket.DoesNotExist:
+            return Response(
+                {"error": "Ticket not found or you don't have permission to access it"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        # The body also holds the multipart framing and other fields, so
+        # this errs on the side of refusing uploads right at the limit
+        if remaining is not None and length > remaining:
+            return Response(
+                {"error": f"Attachment storage quota exceeded; {filesizeformat(remaining)} remaining"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        return view_method(self, request, *args, **kwargs)
+
+    return wrapper
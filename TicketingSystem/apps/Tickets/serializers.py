@@ -1,7 +1,14 @@
+from urllib.parse import urlsplit
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Ticket, TicketMessage, TicketAttachment, TicketActivity
+from .dedup import flag_duplicates, index_tickets
+from .triage import suggest_priority
+from .models import (
+    Ticket, TicketMessage, TicketAttachment, TicketActivity, ImportCheckpoint, OutboxEvent, ConsumerOffset,
+    WebhookSubscription, WebhookDeadLetter,
+)
 from apps.Users.models import Order
+from TicketingSystem.instrumentation import TimedSerializerMixin
 
 User = get_user_model()
 
@@ -22,32 +29,46 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'order_number', 'status', 'created_at']
 
 
-class TicketAttachmentSerializer(serializers.ModelSerializer):
+class TicketAttachmentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     uploaded_by = UserSerializer(read_only=True)
     file_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = TicketAttachment
         fields = [
             'id', 'ticket', 'message', 'file', 'file_url',
-            'filename', 'filesize', 'uploaded_at', 'uploaded_by'
+            'filename', 'filesize', 'uploaded_at', 'uploaded_by',
+            'content_type', 'preview_status', 'thumbnail_url', 'width', 'height', 'preview_text', 'line_count'
+        ]
+        read_only_fields = [
+            'id', 'filename', 'filesize', 'uploaded_at', 'uploaded_by',
+            'content_type', 'preview_status', 'width', 'height', 'preview_text', 'line_count'
         ]
-        read_only_fields = ['id', 'filename', 'filesize', 'uploaded_at', 'uploaded_by']
+
+    def absolute_url(self, file):
+        if file:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(file.url)
+            return file.url
+        return None
 
     def get_file_url(self, obj):
         """
         Get the absolute URL for the file.
         """
-        if obj.file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.file.url)
-            return obj.file.url
-        return None
+        return self.absolute_url(obj.file)
+
+    def get_thumbnail_url(self, obj):
+        """
+        Get the absolute URL for the image thumbnail, once generated.
+        """
+        return self.absolute_url(obj.thumbnail)
 
 
-class TicketMessageSerializer(serializers.ModelSerializer):
+class TicketMessageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     user = UserSerializer(read_only=True)
     attachments = TicketAttachmentSerializer(many=True, read_only=True)
@@ -61,14 +82,22 @@ class TicketMessageSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'created_at', 'is_staff_message']
 
 
+class TicketMessagePageSerializer(serializers.Serializer):
+
+    previous = serializers.URLField(allow_null=True)
+    next = serializers.URLField(allow_null=True)
+    results = TicketMessageSerializer(many=True)
+
+
 class TicketMessageCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = TicketMessage
         fields = ['ticket', 'message']
+        read_only_fields = ['ticket']
 
 
-class TicketActivitySerializer(serializers.ModelSerializer):
+class TicketActivitySerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     performed_by = UserSerializer(read_only=True)
     action_display = serializers.CharField(source='get_action_display', read_only=True)
@@ -82,7 +111,13 @@ class TicketActivitySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'performed_by', 'timestamp']
 
 
-class TicketListSerializer(serializers.ModelSerializer):
+class TicketActivityPageSerializer(serializers.Serializer):
+
+    next = serializers.URLField(allow_null=True)
+    results = TicketActivitySerializer(many=True)
+
+
+class TicketListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     user = UserSerializer(read_only=True)
     assigned_to = UserSerializer(read_only=True)
@@ -94,19 +129,22 @@ class TicketListSerializer(serializers.ModelSerializer):
         model = Ticket
         fields = [
             'id', 'user', 'assigned_to', 'topic', 'status',
-            'status_display', 'priority', 'priority_display',
+            'status_display', 'priority', 'priority_display', 'suggested_priority',
             'created_at', 'updated_at', 'message_count'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
     def get_message_count(self, obj):
         """
-        Get the count of messages for this ticket.
+        Get the count of messages for this ticket, using the message_count
+        annotation when the queryset provides it.
         """
+        if hasattr(obj, 'message_count'):
+            return obj.message_count
         return obj.messages.count()
 
 
-class TicketDetailSerializer(serializers.ModelSerializer):
+class TicketDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     user = UserSerializer(read_only=True)
     assigned_to = UserSerializer(read_only=True)
@@ -121,11 +159,29 @@ class TicketDetailSerializer(serializers.ModelSerializer):
         model = Ticket
         fields = [
             'id', 'user', 'order', 'assigned_to', 'topic', 'description',
-            'status', 'status_display', 'priority', 'priority_display',
+            'status', 'status_display', 'priority', 'priority_display', 'suggested_priority',
             'created_at', 'updated_at', 'resolved_at',
             'messages', 'attachments', 'activities'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'suggested_priority', 'created_at', 'updated_at']
+
+
+class DuplicateCandidateSerializer(serializers.ModelSerializer):
+
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Ticket
+        fields = ['id', 'topic', 'status', 'created_at', 'similarity']
+        read_only_fields = fields
+
+
+class TicketCreatedSerializer(TicketDetailSerializer):
+
+    duplicate_candidates = DuplicateCandidateSerializer(many=True, read_only=True)
+
+    class Meta(TicketDetailSerializer.Meta):
+        fields = TicketDetailSerializer.Meta.fields + ['duplicate_candidates']
 
 
 class TicketCreateSerializer(serializers.ModelSerializer):
@@ -152,6 +208,20 @@ class TicketCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Topic cannot be empty.")
         return value
 
+    def create(self, validated_data):
+        """
+        Create the ticket with a suggested priority, fingerprint it and record
+        the recent open tickets it probably duplicates; those the creator may
+        see are set as ticket.duplicate_candidates.
+        """
+        validated_data['suggested_priority'] = suggest_priority(
+            validated_data['topic'], validated_data['description']
+        )
+        ticket = super().create(validated_data)
+        signature = index_tickets([ticket])[ticket.pk]
+        ticket.duplicate_candidates = flag_duplicates(ticket, ticket.user, signature)
+        return ticket
+
 
 class TicketUpdateSerializer(serializers.ModelSerializer):
 
@@ -174,3 +244,132 @@ class TicketUpdateSerializer(serializers.ModelSerializer):
                 )
         return value
 
+
+class ImportCheckpointSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ImportCheckpoint
+        fields = [
+            'source', 'line_count', 'byte_offset', 'ticket_count', 'message_count',
+            'attachment_count', 'error_count', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class TicketImportErrorSerializer(serializers.Serializer):
+
+    line = serializers.IntegerField()
+    error = serializers.CharField()
+
+
+class TicketImportResultSerializer(serializers.Serializer):
+
+    checkpoint = ImportCheckpointSerializer()
+    errors = TicketImportErrorSerializer(many=True)
+
+
+class OutboxEventSerializer(serializers.ModelSerializer):
+
+    offset = serializers.IntegerField(source='id', read_only=True)
+
+    class Meta:
+        model = OutboxEvent
+        fields = ['offset', 'ticket_id', 'event_type', 'actor_id', 'payload', 'created_at']
+        read_only_fields = fields
+
+
+class OutboxEventPageSerializer(serializers.Serializer):
+
+    next_offset = serializers.IntegerField()
+    next = serializers.URLField(allow_null=True)
+    events = OutboxEventSerializer(many=True)
+
+
+class ConsumerOffsetSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ConsumerOffset
+        fields = ['consumer', 'offset', 'updated_at']
+        read_only_fields = ['consumer', 'updated_at']
+
+
+class WebhookSubscriptionSerializer(serializers.ModelSerializer):
+
+    event_types = serializers.ListField(
+        child=serializers.ChoiceField(choices=TicketActivity.ACTION_CHOICES), required=False,
+        help_text='Event types to deliver; empty for every event.'
+    )
+
+    class Meta:
+        model = WebhookSubscription
+        fields = [
+            'id', 'name', 'url', 'secret', 'event_types', 'batch_size', 'max_concurrency', 'is_active',
+            'created_by', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'secret', 'created_by', 'created_at', 'updated_at']
+
+    def validate_url(self, value):
+        if urlsplit(value).scheme not in ('http', 'https'):
+            raise serializers.ValidationError('Webhook URLs must use http or https.')
+        return value
+
+
+class WebhookDeadLetterSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = WebhookDeadLetter
+        fields = [
+            'id', 'first_offset', 'last_offset', 'attempts', 'status_code', 'error', 'payload', 'created_at'
+        ]
+        read_only_fields = fields
+
+
+class WebhookDeadLetterPageSerializer(serializers.Serializer):
+
+    next = serializers.URLField(allow_null=True)
+    dead_letters = WebhookDeadLetterSerializer(many=True)
+
+
+class SuggestedReplySerializer(serializers.ModelSerializer):
+
+    user = UserSerializer(read_only=True)
+
+    class Meta:
+        model = TicketMessage
+        fields = ['id', 'user', 'message', 'created_at']
+        read_only_fields = fields
+
+
+class TicketSuggestionSerializer(serializers.ModelSerializer):
+
+    score = serializers.FloatField(read_only=True)
+    replies = SuggestedReplySerializer(source='suggested_replies', many=True, read_only=True)
+
+    class Meta:
+        model = Ticket
+        fields = ['id', 'topic', 'status', 'resolved_at', 'score', 'replies']
+        read_only_fields = fields
+
+
+class AttachmentStorageTicketSerializer(serializers.ModelSerializer):
+
+    user = UserSerializer(read_only=True)
+
+    class Meta:
+        model = Ticket
+        fields = ['id', 'topic', 'status', 'user', 'attachment_bytes']
+        read_only_fields = fields
+
+
+class AttachmentStorageUserSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'email', 'user_type', 'attachment_bytes']
+        read_only_fields = fields
+
+
+class AttachmentStorageReportSerializer(serializers.Serializer):
+
+    tickets = AttachmentStorageTicketSerializer(many=True)
+    users = AttachmentStorageUserSerializer(many=True)
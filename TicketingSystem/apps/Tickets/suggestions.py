@@ -0,0 +1,223 @@
+"""
+Suggested replies from resolved tickets.
+
+An inverted index over resolved tickets, their topic and the replies staff
+wrote on them, ranked with BM25. SuggestionPosting holds one row per
+(term, ticket) and SuggestionTerm the number of tickets containing each
+term, so a query reads the postings of its own terms only, never the whole
+corpus. Terms are stored as 64-bit hashes.
+
+The index follows the outbox as the 'suggestions' consumer: a ticket is
+indexed when its status changes to resolved and dropped when it is reopened
+(update_index, run by update_suggestion_index). Tickets that never went
+through a status change, such as imported ones, are picked up by
+rebuild_index. Purging a deleted ticket drops it from the index, term
+counts included.
+
+Queries read the postings of their rarest terms first and stop adding terms
+once TICKET_SUGGESTION_MAX_POSTINGS postings would be read. The terms left
+out are the most common ones, which contribute least to a BM25 score.
+"""
+import hashlib
+import math
+import re
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Prefetch
+from .events import commit_offset, get_offset, read_events
+from .models import OutboxEvent, SuggestionPosting, SuggestionTerm, Ticket, TicketMessage
+
+CONSUMER = 'suggestions'
+# Statuses of tickets whose replies may be suggested
+RESOLVED_STATUSES = ('resolved', 'closed')
+# SuggestionTerm row holding the corpus totals
+CORPUS = 0
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+WORD = re.compile(r'\w{2,}')
+STOPWORDS = frozenset('''
+    a an and are as at be but by can do for from has have hi hello how i if in is it me my no not of on or our
+    please so that the their there this to was we were what when where which will with you your thanks thank
+'''.split())
+
+
+def term_hash(word):
+    return int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'little', signed=True) or 1
+
+
+def terms(text):
+    """
+    The hashed terms of text, in order, without stopwords.
+    """
+    return [term_hash(word) for word in WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def update_terms(deltas, documents, length):
+    """
+    Apply per-term document count changes, and the change in the number of
+    indexed tickets and their total length, to SuggestionTerm.
+    """
+    new_terms = [term for term, delta in deltas.items() if delta > 0]
+    SuggestionTerm.objects.bulk_create(
+        [SuggestionTerm(term=term) for term in [CORPUS, *new_terms]], ignore_conflicts=True
+    )
+    by_delta = defaultdict(list)
+    for term, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(term)
+    for delta, changed in by_delta.items():
+        SuggestionTerm.objects.filter(term__in=changed).update(document_count=F('document_count') + delta)
+    SuggestionTerm.objects.filter(term=CORPUS).update(
+        document_count=F('document_count') + documents, total_length=F('total_length') + length
+    )
+
+
+def reindex_tickets(ticket_ids):
+    """
+    Drop the given tickets from the index and add back those that are
+    resolved, with their current topic and staff replies.
+    """
+    ticket_ids = list(ticket_ids)
+    deltas = Counter()
+    documents = length = 0
+    with transaction.atomic():
+        removed = {}
+        for term, ticket_id, document_length in SuggestionPosting.objects.filter(
+            ticket_id__in=ticket_ids
+        ).values_list('term', 'ticket_id', 'length'):
+            deltas[term] -= 1
+            removed[ticket_id] = document_length
+        if removed:
+            SuggestionPosting.objects.filter(ticket_id__in=removed).delete()
+        documents -= len(removed)
+        length -= sum(removed.values())
+
+        texts = dict(Ticket.objects.filter(pk__in=ticket_ids, status__in=RESOLVED_STATUSES).values_list('id', 'topic'))
+        replies = TicketMessage.objects.filter(ticket_id__in=texts, is_staff_message=True).order_by('created_at')
+        for ticket_id, message in replies.values_list('ticket_id', 'message'):
+            texts[ticket_id] += f'\n{message}'
+
+        postings = []
+        for ticket_id, text in texts.items():
+            counts = Counter(terms(text))
+            if not counts:
+                continue
+            document_length = sum(counts.values())
+            postings.extend(
+                SuggestionPosting(term=term, ticket_id=ticket_id, frequency=frequency, length=document_length)
+                for term, frequency in counts.items()
+            )
+            deltas.update(counts.keys())
+            documents += 1
+            length += document_length
+        SuggestionPosting.objects.bulk_create(postings, batch_size=5000)
+        update_terms(deltas, documents, length)
+    return len(texts)
+
+
+def update_index(limit=1000):
+    """
+    Apply the status changes recorded in the outbox since the last update.
+    Returns the number of events read.
+    """
+    read = 0
+    while True:
+        events = read_events(get_offset(CONSUMER), limit, ['status_changed'])
+        if not events:
+            return read
+        changed = set()
+        for event in events:
+            old, new = event.payload.get('status') or (None, None)
+            # Only entering or leaving the resolved statuses changes the index
+            if (old in RESOLVED_STATUSES) != (new in RESOLVED_STATUSES):
+                changed.add(event.ticket_id)
+        with transaction.atomic():
+            reindex_tickets(changed)
+            commit_offset(CONSUMER, events[-1].id)
+        read += len(events)
+
+
+def rebuild_index(batch_size=1000, progress=None):
+    """
+    Rebuild the index from every resolved ticket. Returns the number of
+    tickets indexed.
+    """
+    offset = OutboxEvent.objects.aggregate(offset=Max('id'))['offset'] or 0
+    with transaction.atomic():
+        SuggestionPosting.objects.all().delete()
+        SuggestionTerm.objects.all().delete()
+    tickets = Ticket.objects.filter(status__in=RESOLVED_STATUSES).order_by('pk').values_list('pk', flat=True)
+    indexed = 0
+    last = None
+    while True:
+        ids = list((tickets.filter(pk__gt=last) if last else tickets)[:batch_size])
+        if not ids:
+            break
+        last = ids[-1]
+        indexed += reindex_tickets(ids)
+        if progress:
+            progress(indexed)
+    # Status changes already covered by the rebuild need not be replayed
+    commit_offset(CONSUMER, offset)
+    return indexed
+
+
+def search(text, limit, exclude=None):
+    """
+    The limit indexed tickets that best match text, as [(ticket id, score)],
+    best first.
+    """
+    query = Counter(terms(text))
+    stats = {
+        term: (document_count, total_length)
+        for term, document_count, total_length in SuggestionTerm.objects.filter(
+            term__in=[CORPUS, *query]
+        ).values_list('term', 'document_count', 'total_length')
+    }
+    corpus_size, corpus_length = stats.pop(CORPUS, (0, 0))
+    if not corpus_size or not stats:
+        return []
+    average_length = corpus_length / corpus_size
+
+    # Rarest terms first, until the posting budget is spent
+    weights = {}
+    budget = settings.TICKET_SUGGESTION_MAX_POSTINGS
+    for term, (document_count, _) in sorted(stats.items(), key=lambda item: item[1][0]):
+        if document_count <= 0:
+            continue
+        if weights and document_count > budget:
+            break
+        budget -= document_count
+        idf = math.log(1 + (corpus_size - document_count + 0.5) / (document_count + 0.5))
+        weights[term] = idf * query[term]
+
+    scores = Counter()
+    postings = SuggestionPosting.objects.filter(term__in=weights).values_list('term', 'ticket_id', 'frequency', 'length')
+    for term, ticket_id, frequency, length in postings:
+        scores[ticket_id] += weights[term] * frequency * (K1 + 1) / (
+            frequency + K1 * (1 - B + B * length / average_length)
+        )
+    scores.pop(exclude, None)
+    return scores.most_common(limit)
+
+
+def suggest(ticket, user, limit):
+    """
+    Resolved tickets similar to ticket that user may see, best first, each
+    with its score and latest staff replies prefetched as suggested_replies.
+    """
+    # Ask for spares in case some matches are hidden from user
+    matches = dict(search(f'{ticket.topic}\n{ticket.description}', limit * 2, exclude=ticket.pk))
+    if not matches:
+        return []
+    replies = TicketMessage.objects.filter(is_staff_message=True).select_related('user').order_by('-created_at')
+    tickets = Ticket.objects.visible_to(user).filter(pk__in=matches).prefetch_related(
+        Prefetch('messages', queryset=replies, to_attr='suggested_replies')
+    )
+    suggestions = sorted(tickets, key=lambda match: matches[match.pk], reverse=True)[:limit]
+    for suggestion in suggestions:
+        suggestion.score = matches[suggestion.pk]
+        suggestion.suggested_replies = suggestion.suggested_replies[:settings.TICKET_SUGGESTION_REPLIES]
+    return suggestions
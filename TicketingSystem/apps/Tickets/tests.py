@@ -1,3 +1,1901 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import mailbox
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from unittest import skipUnless
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from datetime import datetime, timedelta, timezone as dt_timezone
+from email.message import EmailMessage
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, OperationalError, connection, connections, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from TicketingSystem import db_routers
+from TicketingSystem.admin_mixins import EstimatedCountPaginator
+from TicketingSystem.db_routers import use_replica
+from TicketingSystem.query_budget import missing_budgets
+from TicketingSystem.testing import QueryBudgetTestCase
+from apps.Users.models import User, Order
+from . import urls
+from .events import commit_offset, emit_events, read_events
+from .importer import TicketImporter
+from .mail import reply_token
+from .partitions import (
+    add_months, bump_archives_version, ensure_partitions, get_archives, month_start, write_archive,
+)
+from .quotas import recount
+from .suggestions import CORPUS, rebuild_index, reindex_tickets
+from .webhooks import WebhookDispatcher, sign
+from .models import (
+    Ticket, TicketMessage, TicketAttachment, TicketActivity, IdempotencyKey, ImportCheckpoint,
+    OutboxEvent, ConsumerOffset, WebhookSubscription, WebhookDeadLetter, TicketFingerprint, TicketFingerprintBand,
+    SuggestionTerm, SuggestionPosting, TicketDeletionRecord, ActivityArchive, TicketDuplicate,
+)
+from .views import (
+    TicketListView,
+    TicketDetailView,
+    TicketMessageListView,
+    TicketAttachmentUploadView,
+    TicketActivityListView,
+    TicketSuggestionListView,
+    AttachmentStorageReportView,
+    MyTicketsView,
+    AssignedTicketsView,
+    TicketImportView,
+    OutboxEventListView,
+    ConsumerOffsetView,
+    WebhookSubscriptionListView,
+    WebhookSubscriptionDetailView,
+    WebhookDeadLetterListView,
+)
 
-# Create your tests here.
+try:
+    from PIL import Image
+except ImportError:  # Only the preview workers need Pillow
+    Image = None
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TicketQueryBudgetTests(QueryBudgetTestCase):
+    """
+    Every ticket endpoint must run a bounded number of queries however many
+    tickets, messages, attachments and activities there are.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password('Passw0rd!2024')
+        cls.customer = User.objects.create(
+            email='customer@example.com', username='customer', password=password
+        )
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', password=password,
+            user_type='agent', is_staff=True
+        )
+        cls.other_customers = User.objects.bulk_create([
+            User(email=f'other{index}@example.com', username=f'other{index}', password=password)
+            for index in range(5)
+        ])
+        cls.order = Order.objects.create(user=cls.customer, order_number='ORD-1', total_price=10)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def authenticate(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def create_ticket(self, **kwargs):
+        kwargs.setdefault('user', self.customer)
+        return Ticket.objects.create(
+            order=self.order, assigned_to=self.agent, topic='Order has not arrived',
+            description='Still waiting for my order.', **kwargs
+        )
+
+    def fill_ticket(self, ticket, count):
+        """
+        Give ticket count more messages (every other one from staff, every
+        third with an attachment) and count more activities.
+        """
+        messages = TicketMessage.objects.bulk_create([
+            TicketMessage(
+                ticket=ticket, user=self.agent if index % 2 else ticket.user,
+                message='Any update?', is_staff_message=bool(index % 2)
+            )
+            for index in range(count)
+        ])
+        TicketAttachment.objects.bulk_create([
+            TicketAttachment(
+                ticket=ticket, message=message, file='ticket_attachments/log.txt',
+                filename='log.txt', filesize=3, uploaded_by=message.user
+            )
+            for message in messages[::3]
+        ])
+        TicketActivity.objects.bulk_create([
+            TicketActivity(ticket=ticket, action='message_added', performed_by=self.agent, details='Message added')
+            for _ in range(count)
+        ])
+
+    def growing_tickets(self, **kwargs):
+        """
+        setup() callback that keeps size tickets, owned by a mix of users and
+        each with a couple of messages, in the database.
+        """
+        created = []
+
+        def grow(size):
+            while len(created) < size:
+                owner = self.customer if len(created) % 2 else self.other_customers[len(created) % 5]
+                ticket = self.create_ticket(user=owner)
+                self.fill_ticket(ticket, 2)
+                created.append(ticket)
+            return kwargs
+
+        return grow
+
+    def growing_ticket(self, path_name, **kwargs):
+        """
+        setup() callback that grows the history of a single ticket to size
+        messages and activities.
+        """
+        ticket = self.create_ticket()
+        filled = [0]
+
+        def grow(size):
+            self.fill_ticket(ticket, size - filled[0])
+            filled[0] = size
+            return {'path': reverse(f'tickets:{path_name}', args=[ticket.pk]), **kwargs}
+
+        grow.ticket = ticket
+        return grow
+
+    def test_every_endpoint_has_a_budget(self):
+        self.assertEqual(missing_budgets(urls.urlpatterns), [])
+
+    def test_list_tickets(self):
+        self.authenticate(self.agent)
+        self.assertQueryBudget(TicketListView, 'get', self.growing_tickets(path=reverse('tickets:ticket-list')))
+        self.authenticate(self.customer)
+        self.assertQueryBudget(TicketListView, 'get', self.growing_tickets(path=reverse('tickets:ticket-list')))
+
+    def test_create_ticket(self):
+        self.authenticate(self.customer)
+        grow = self.growing_tickets(
+            path=reverse('tickets:ticket-list'), format='json',
+            data={'order': str(self.order.pk), 'topic': 'Refund', 'description': 'Please refund me.'}
+        )
+        # A likely duplicate exists from the start, so every size records one
+        self.client.post(
+            reverse('tickets:ticket-list'), {'topic': 'Refund', 'description': 'Please refund me.'}, format='json'
+        )
+        self.assertQueryBudget(
+            TicketListView, 'post', lambda size: {**grow(size), 'HTTP_IDEMPOTENCY_KEY': f'create-{size}'}
+        )
+
+    def test_my_tickets(self):
+        self.authenticate(self.customer)
+        self.assertQueryBudget(MyTicketsView, 'get', self.growing_tickets(path=reverse('tickets:my-tickets')))
+
+    def test_assigned_tickets(self):
+        self.authenticate(self.agent)
+        self.assertQueryBudget(
+            AssignedTicketsView, 'get', self.growing_tickets(path=reverse('tickets:assigned-tickets'))
+        )
+
+    def test_ticket_detail(self):
+        self.authenticate(self.customer)
+        self.assertQueryBudget(TicketDetailView, 'get', self.growing_ticket('ticket-detail'))
+
+    def test_update_ticket(self):
+        self.authenticate(self.agent)
+        grow = self.growing_ticket('ticket-detail', format='json')
+        priorities = iter(['high', 'low'] * len(self.sizes))
+
+        def setup(size):
+            # Change something on every call so activities are always written
+            return {**grow(size), 'data': {'priority': next(priorities), 'status': 'in_progress'}}
+
+        self.assertQueryBudget(TicketDetailView, 'put', setup)
+
+    def test_delete_ticket(self):
+        self.authenticate(self.agent)
+
+        def setup(size):
+            ticket = self.create_ticket()
+            self.fill_ticket(ticket, size)
+            return {'path': reverse('tickets:ticket-detail', args=[ticket.pk])}
+
+        self.assertQueryBudget(TicketDetailView, 'delete', setup)
+
+    def test_list_messages(self):
+        self.authenticate(self.customer)
+        self.assertQueryBudget(
+            TicketMessageListView, 'get', self.growing_ticket('ticket-messages', data={'page_size': 5})
+        )
+
+    def test_list_messages_around(self):
+        self.authenticate(self.customer)
+        grow = self.growing_ticket('ticket-messages')
+
+        def setup(size):
+            request = grow(size)
+            anchor = grow.ticket.messages.order_by('id')[size // 2]
+            return {**request, 'data': {'page_size': 5, 'around': anchor.pk}}
+
+        self.assertQueryBudget(TicketMessageListView, 'get', setup)
+
+    def test_add_message(self):
+        self.authenticate(self.customer)
+        grow = self.growing_ticket('ticket-messages', format='json', data={'message': 'Hello again'})
+        self.assertQueryBudget(
+            TicketMessageListView, 'post', lambda size: {**grow(size), 'HTTP_IDEMPOTENCY_KEY': f'message-{size}'}
+        )
+
+    def test_upload_attachment(self):
+        self.authenticate(self.customer)
+        grow = self.growing_ticket('ticket-attachments')
+
+        def setup(size):
+            request = grow(size)
+            message = grow.ticket.messages.first()
+            return {
+                **request, 'format': 'multipart', 'HTTP_IDEMPOTENCY_KEY': f'upload-{size}',
+                'data': {'message_id': message.pk, 'file': SimpleUploadedFile('log.txt', b'log')},
+            }
+
+        self.assertQueryBudget(TicketAttachmentUploadView, 'post', setup)
+
+    def test_list_activities(self):
+        self.authenticate(self.customer)
+        self.assertQueryBudget(
+            TicketActivityListView, 'get', self.growing_ticket('ticket-activities', data={'page_size': 5})
+        )
+
+    def admin_user(self):
+        return User.objects.create(email='admin@example.com', username='admin', user_type='admin', is_staff=True)
+
+    def test_suggestions(self):
+        self.authenticate(self.agent)
+        ticket = self.create_ticket()
+        grow = self.growing_tickets(path=reverse('tickets:ticket-suggestions', args=[ticket.pk]))
+
+        def setup(size):
+            request = grow(size)
+            Ticket.objects.exclude(pk=ticket.pk).update(status='resolved')
+            rebuild_index()
+            return request
+
+        self.assertQueryBudget(TicketSuggestionListView, 'get', setup)
+
+    def test_attachment_storage_report(self):
+        self.authenticate(self.admin_user())
+        grow = self.growing_tickets(path=reverse('tickets:attachment-storage'), data={'limit': 5})
+
+        def setup(size):
+            request = grow(size)
+            recount()
+            return request
+
+        self.assertQueryBudget(AttachmentStorageReportView, 'get', setup)
+
+    def test_list_events(self):
+        self.authenticate(self.admin_user())
+        grow = self.growing_tickets(path=reverse('tickets:outbox-events'), data={'page_size': 5})
+
+        def setup(size):
+            request = grow(size)
+            emit_events([
+                OutboxEvent(ticket_id=uuid.uuid4(), event_type='created', created_at=timezone.now())
+                for _ in range(size)
+            ])
+            return request
+
+        self.assertQueryBudget(OutboxEventListView, 'get', setup)
+
+    def test_consumer_offset(self):
+        self.authenticate(self.admin_user())
+
+        def setup(size):
+            ConsumerOffset.objects.bulk_create([
+                ConsumerOffset(consumer=f'consumer-{size}-{index}', offset=index) for index in range(size)
+            ])
+            return {'path': reverse('tickets:consumer-offset', args=['search']), 'format': 'json', 'data': {'offset': size}}
+
+        self.assertQueryBudget(ConsumerOffsetView, 'put', setup)
+        self.assertQueryBudget(
+            ConsumerOffsetView, 'get', lambda size: {'path': reverse('tickets:consumer-offset', args=['search'])}
+        )
+
+    def growing_webhooks(self):
+        """
+        setup() helper that keeps size webhook subscriptions, each with size
+        dead letters, and returns the newest.
+        """
+        def grow(size):
+            subscriptions = WebhookSubscription.objects.bulk_create([
+                WebhookSubscription(name=f'hook-{size}-{index}', url='http://crm.example.com/hook')
+                for index in range(size)
+            ])
+            WebhookDeadLetter.objects.bulk_create([
+                WebhookDeadLetter(
+                    subscription=subscription, first_offset=index, last_offset=index, payload={}, attempts=1
+                )
+                for subscription in subscriptions for index in range(size)
+            ])
+            return subscriptions[-1]
+
+        return grow
+
+    def test_webhooks(self):
+        self.authenticate(self.admin_user())
+        grow = self.growing_webhooks()
+        self.assertQueryBudget(WebhookSubscriptionListView, 'get', lambda size: (
+            grow(size) and {'path': reverse('tickets:webhook-list')}
+        ))
+        self.assertQueryBudget(WebhookSubscriptionListView, 'post', lambda size: {
+            'path': reverse('tickets:webhook-list'), 'format': 'json',
+            'data': {'name': f'crm-{size}', 'url': 'https://crm.example.com/hook', 'event_types': ['created']},
+        })
+
+    def test_webhook_detail(self):
+        self.authenticate(self.admin_user())
+        grow = self.growing_webhooks()
+
+        def setup(size, **kwargs):
+            return {'path': reverse('tickets:webhook-detail', args=[grow(size).pk]), **kwargs}
+
+        self.assertQueryBudget(WebhookSubscriptionDetailView, 'get', setup)
+        self.assertQueryBudget(WebhookSubscriptionDetailView, 'put', lambda size: setup(
+            size, format='json', data={'batch_size': 50}
+        ))
+        self.assertQueryBudget(WebhookSubscriptionDetailView, 'delete', setup)
+        self.assertQueryBudget(WebhookDeadLetterListView, 'get', lambda size: {
+            'path': reverse('tickets:webhook-dead-letters', args=[grow(size).pk]), 'data': {'page_size': 5}
+        })
+
+    def test_import_tickets(self):
+        self.authenticate(self.admin_user())
+        lines = b'\n'.join(json.dumps({
+            'external_id': f'HD-{index}', 'user': self.other_customers[index % 5].email,
+            'assigned_to': self.agent.email, 'topic': 'Refund', 'description': 'Please refund me.',
+            'messages': [{
+                'user': self.agent.email, 'message': 'Refunded.',
+                'attachments': [{'path': f'legacy/{index}/receipt.pdf', 'filesize': 10}],
+            }],
+        }).encode() for index in range(5))
+        grow = self.growing_tickets(content_type='application/x-ndjson', data=lines)
+
+        def setup(size):
+            return {**grow(size), 'path': reverse('tickets:ticket-import') + f'?source=export-{size}'}
+
+        self.assertQueryBudget(TicketImportView, 'post', setup)
+
+
+@override_settings(
+    THROTTLE_REDIS_URL=None,
+    TICKET_THROTTLE_RATES={'customer': {'ticket_create': '2/hour'}, 'agent': {}},
+    TICKET_THROTTLE_IP_RATES={'ticket_create': '3/hour'},
+)
+class TicketThrottleTests(APITestCase):
+    """
+    Ticket creation is limited per user and per IP.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password('Passw0rd!2024')
+        cls.customer = User.objects.create(email='customer@example.com', username='customer', password=password)
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', password=password, user_type='agent', is_staff=True
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def create_ticket(self, user, **extra):
+        self.client.force_authenticate(user)
+        return self.client.post(
+            reverse('tickets:ticket-list'), {'topic': 'Refund', 'description': 'Please refund me.'}, format='json',
+            **extra
+        )
+
+    def test_user_limit(self):
+        self.assertEqual(self.create_ticket(self.customer).status_code, 201)
+        self.assertEqual(self.create_ticket(self.customer).status_code, 201)
+        response = self.create_ticket(self.customer)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # Reads are never throttled
+        self.assertEqual(self.client.get(reverse('tickets:ticket-list')).status_code, 200)
+
+    def test_ip_limit(self):
+        self.assertEqual(self.create_ticket(self.agent).status_code, 201)
+        self.assertEqual(self.create_ticket(self.agent).status_code, 201)
+        self.assertEqual(self.create_ticket(self.customer).status_code, 201)
+        self.assertEqual(self.create_ticket(self.agent).status_code, 429)
+
+    def test_ip_limit_ignores_forwarded_for(self):
+        # Without trusted proxies, rotating X-Forwarded-For does not give new buckets
+        for number in range(3):
+            self.assertEqual(self.create_ticket(self.agent, HTTP_X_FORWARDED_FOR=f'203.0.113.{number}').status_code, 201)
+        self.assertEqual(self.create_ticket(self.agent, HTTP_X_FORWARDED_FOR='203.0.113.9').status_code, 429)
+
+    @override_settings(TICKET_THROTTLE_RATES={'customer': {'ticket_create': ''}}, TICKET_THROTTLE_IP_RATES={})
+    def test_empty_rate_is_unlimited(self):
+        for _ in range(4):
+            self.assertEqual(self.create_ticket(self.customer).status_code, 201)
+
+
+@skipUnless('replica_1' in settings.DATABASES, 'Set POSTGRES_REPLICAS to test replica routing')
+class ReplicaRoutingTests(APITestCase):
+    """
+    Safe API requests read from a healthy replica, except for clients that
+    wrote within REPLICA_STICKY_SECONDS; writes always use the primary.
+    """
+    # Without the replica the class is skipped, but its databases are still checked
+    databases = {'default', 'replica_1'} & set(settings.DATABASES)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        cls.ticket = Ticket.objects.create(user=cls.customer, topic='Refund', description='Please refund me.')
+
+    def setUp(self):
+        db_routers._lag_checked_at.clear()
+        db_routers._replica_healthy.clear()
+        self.client.force_authenticate(self.customer)
+
+    def queries(self, method, path, data=None):
+        """
+        Make a request and return the number of queries it ran on the
+        primary and on the replica. (The replica mirrors the test database
+        over its own connection, outside the test transaction, so only the
+        connection used is checked, not what it returned.)
+        """
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica_1']) as replica:
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertLess(response.status_code, 400)
+        return len(primary), len(replica)
+
+    def test_router(self):
+        with use_replica('replica_1'):
+            self.assertEqual(Ticket.objects.all().db, 'replica_1')
+            self.assertEqual(db_routers.ReplicaRouter().db_for_write(Ticket), 'default')
+        self.assertEqual(Ticket.objects.all().db, 'default')
+
+    def test_reads_use_replica(self):
+        primary, replica = self.queries('get', reverse('tickets:ticket-list'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_reads_after_write_use_primary(self):
+        primary, replica = self.queries(
+            'post', reverse('tickets:ticket-messages', args=[self.ticket.pk]), {'message': 'Any news?'}
+        )
+        self.assertEqual(replica, 0)
+        self.assertIn(settings.REPLICA_STICKY_COOKIE_NAME, self.client.cookies)
+        primary, replica = self.queries('get', reverse('tickets:ticket-list'))
+        self.assertEqual(replica, 0)
+
+        # Once the window has passed, reads go back to the replica
+        self.client.cookies[settings.REPLICA_STICKY_COOKIE_NAME] = str(int(time.time()) - 1)
+        primary, replica = self.queries('get', reverse('tickets:ticket-list'))
+        self.assertEqual(primary, 0)
+
+    @override_settings(REPLICA_MAX_LAG_SECONDS=5)
+    def test_lagging_replica_falls_back_to_primary(self):
+        with patch.object(db_routers, 'measure_replica_lag', return_value=30.0):
+            primary, replica = self.queries('get', reverse('tickets:ticket-list'))
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with patch.object(db_routers, 'measure_replica_lag', side_effect=OperationalError('connection refused')):
+            primary, replica = self.queries('get', reverse('tickets:ticket-list'))
+        self.assertEqual(replica, 0)
+
+
+class RequestTimingTests(APITestCase):
+    """
+    Sampled requests report their SQL and serializer time in a Server-Timing
+    header; slow ones are logged with their repeated queries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        for number in range(20):
+            Ticket.objects.create(user=cls.customer, topic=f'Ticket {number}', description='Details.')
+
+    def list_tickets(self):
+        self.client.force_authenticate(self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('tickets:ticket-list'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1, SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_sampled_request(self):
+        with self.assertLogs('TicketingSystem.requests', 'INFO') as requests, \
+                self.assertLogs('TicketingSystem.slow_requests', 'WARNING') as logs:
+            response, query_count = self.list_tickets()
+
+        timings = dict(
+            re.match(r'(\w+);dur=([\d.]+)', metric).groups() for metric in response['Server-Timing'].split(', ')
+        )
+        self.assertEqual(list(timings), ['db', 'serialize', 'total'])
+        self.assertIn(f'desc="{query_count} queries"', response['Server-Timing'])
+        self.assertLessEqual(float(timings['db']) + float(timings['serialize']), float(timings['total']))
+
+        self.assertEqual(json.loads(requests.records[0].getMessage())['query_count'], query_count)
+        [record] = logs.records
+        entry = json.loads(record.getMessage())
+        self.assertEqual((entry['method'], entry['path'], entry['status']), ('GET', '/api/v1/tickets/', 200))
+        self.assertEqual(entry['query_count'], query_count)
+        self.assertGreater(entry['serializer_ms'], 0)
+        self.assertIsInstance(entry['repeated_queries'], list)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0, SLOW_REQUEST_THRESHOLD_MS=60000)
+    def test_unsampled_request(self):
+        with self.assertNoLogs('TicketingSystem.slow_requests'):
+            response, _ = self.list_tickets()
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+$')
+
+
+class IdempotencyKeyTests(APITestCase):
+    """
+    Repeating a create request with the same Idempotency-Key replays the
+    first response instead of creating a duplicate.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(
+            email='customer@example.com', username='customer', password=make_password('Passw0rd!2024')
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.customer)
+
+    def create_ticket(self, key, topic='Refund'):
+        return self.client.post(
+            reverse('tickets:ticket-list'), {'topic': topic, 'description': 'Please refund me.'},
+            format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_repeat_is_replayed(self):
+        first = self.create_ticket('key-1')
+        repeat = self.create_ticket('key-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(repeat.status_code, 201)
+        self.assertEqual(repeat['Idempotent-Replayed'], 'true')
+        self.assertEqual(repeat.data['id'], str(first.data['id']))
+        self.assertEqual(Ticket.objects.count(), 1)
+        self.assertEqual(TicketActivity.objects.count(), 1)
+
+    def test_key_reused_for_other_request(self):
+        self.create_ticket('key-1')
+        self.assertEqual(self.create_ticket('key-1', topic='Something else').status_code, 422)
+
+    def test_request_in_progress(self):
+        IdempotencyKey.objects.create(
+            user=self.customer, key='key-1', request_hash='pending', locked_until=timezone.now() + timedelta(minutes=1),
+            expires_at=timezone.now() + timedelta(minutes=1)
+        )
+        response = self.create_ticket('key-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Ticket.objects.count(), 0)
+
+    def test_abandoned_claim_is_taken_over(self):
+        # The worker holding the key died before its work committed
+        self.create_ticket('key-1')
+        Ticket.objects.all().delete()
+        IdempotencyKey.objects.update(
+            status_code=None, response_body=None, locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(self.create_ticket('key-1', topic='Something else').status_code, 422)
+
+        response = self.create_ticket('key-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(self.create_ticket('key-1')['Idempotent-Replayed'], 'true')
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_expired_key_is_reused(self):
+        self.create_ticket('key-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertNotIn('Idempotent-Replayed', self.create_ticket('key-1'))
+        self.assertEqual(Ticket.objects.count(), 2)
+
+
+class TicketVisibilityTests(APITestCase):
+    """
+    Customers reach only their own tickets; agents reach every ticket, or
+    with TICKET_AGENT_SCOPE='assigned' only theirs and the unassigned queue.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password('Passw0rd!2024')
+        cls.customer = User.objects.create(email='customer@example.com', username='customer', password=password)
+        cls.other = User.objects.create(email='other@example.com', username='other', password=password)
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', password=password, user_type='agent', is_staff=True
+        )
+        cls.colleague = User.objects.create(
+            email='colleague@example.com', username='colleague', password=password, user_type='agent', is_staff=True
+        )
+        cls.admin = User.objects.create(
+            email='admin@example.com', username='admin', password=password, user_type='admin', is_staff=True
+        )
+        cls.unassigned = Ticket.objects.create(user=cls.customer, topic='Refund', description='Please refund me.')
+        cls.mine = Ticket.objects.create(
+            user=cls.customer, assigned_to=cls.agent, topic='Delivery', description='Where is it?'
+        )
+        cls.theirs = Ticket.objects.create(
+            user=cls.other, assigned_to=cls.colleague, topic='Invoice', description='Wrong address.'
+        )
+        cls.message = TicketMessage.objects.create(ticket=cls.theirs, user=cls.other, message='Any update?')
+
+    def visible(self, user):
+        return set(Ticket.objects.visible_to(user).values_list('pk', flat=True))
+
+    def test_customer_sees_own_tickets(self):
+        self.assertEqual(self.visible(self.customer), {self.unassigned.pk, self.mine.pk})
+        self.assertEqual(self.visible(self.other), {self.theirs.pk})
+
+    def test_staff_see_everything_by_default(self):
+        everything = {self.unassigned.pk, self.mine.pk, self.theirs.pk}
+        self.assertEqual(self.visible(self.agent), everything)
+        self.assertEqual(self.visible(self.admin), everything)
+
+    @override_settings(TICKET_AGENT_SCOPE='assigned')
+    def test_agent_assigned_scope(self):
+        self.assertEqual(self.visible(self.agent), {self.unassigned.pk, self.mine.pk})
+        self.assertEqual(self.visible(self.admin), {self.unassigned.pk, self.mine.pk, self.theirs.pk})
+        self.assertFalse(TicketMessage.objects.visible_to(self.agent).exists())
+
+        self.client.force_authenticate(self.agent)
+        response = self.client.get(reverse('tickets:ticket-detail', kwargs={'pk': self.theirs.pk}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_upload_to_hidden_ticket(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(
+            reverse('tickets:ticket-attachments', kwargs={'ticket_id': self.theirs.pk}),
+            {'message_id': self.message.pk, 'file': SimpleUploadedFile('log.txt', b'log')}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('Ticket not found', response.data['error'])
+
+    def test_upload_to_missing_message(self):
+        self.client.force_authenticate(self.other)
+        for message_id in (self.message.pk + 1, 'not-a-number'):
+            response = self.client.post(
+                reverse('tickets:ticket-attachments', kwargs={'ticket_id': self.theirs.pk}),
+                {'message_id': message_id, 'file': SimpleUploadedFile('log.txt', b'log')}, format='multipart'
+            )
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.data['error'], 'Message not found')
+
+
+class TicketAdminTests(APITestCase):
+    """
+    The ticket changelist counts small results exactly, trusts the planner
+    for large ones and routes each search term to an indexable lookup.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(
+            email='admin@example.com', username='admin', user_type='admin', is_staff=True, is_superuser=True
+        )
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        cls.other = User.objects.create(email='other@example.com', username='other')
+        cls.refund = Ticket.objects.create(user=cls.customer, topic='Refund please', description='Refund.')
+        cls.late = Ticket.objects.create(user=cls.other, topic='Order is late', description='Late.')
+        # Mentions the other ticket's id and the customer's email in its topic
+        cls.mention = Ticket.objects.create(
+            user=cls.other, topic=f'See {cls.refund.pk} from {cls.customer.email}', description='Duplicate.',
+            status='closed'
+        )
+
+    def changelist(self, **params):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:Tickets_ticket_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def search(self, term):
+        return set(self.changelist(q=term).result_list)
+
+    def test_exact_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.changelist().result_count, 3)
+        self.assertTrue(any('COUNT(' in query['sql'] for query in queries))
+        self.assertEqual(self.changelist(status__exact='open').result_count, 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'planner estimates need PostgreSQL')
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=1)
+    def test_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(Ticket._meta.db_table)}')
+        # Not in the statistics yet, so not in the estimate
+        Ticket.objects.create(user=self.customer, topic='Broken', description='Broken.')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.changelist().result_count, 3)
+        self.assertTrue(any(query['sql'].startswith('EXPLAIN') for query in queries))
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        # Without a filter the table statistics are enough
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(EstimatedCountPaginator(Ticket.all_objects.order_by('pk'), 10).count, 3)
+        self.assertIn('pg_class', queries[0]['sql'])
+        with self.settings(ADMIN_EXACT_COUNT_LIMIT=100):
+            self.assertEqual(self.changelist().result_count, 4)
+
+    def test_uuid_search(self):
+        # Exact id match: the ticket whose topic contains the id is not found
+        self.assertEqual(self.search(str(self.refund.pk)), {self.refund})
+        self.assertEqual(self.search(str(uuid.uuid4())), set())
+
+    def test_email_search(self):
+        self.assertEqual(self.search('CUSTOMER@example.com'), {self.refund})
+        # Whole addresses only
+        self.assertEqual(self.search('ustomer@example.com'), set())
+
+    def test_text_search(self):
+        self.assertEqual(self.search('REFUND'), {self.refund})
+        self.assertEqual(self.search('order'), {self.late})
+        self.assertEqual(self.search('"is late" order'), {self.late})
+        self.assertEqual(self.search('customer@example'), {self.mention})
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Activity is only partitioned on PostgreSQL')
+class ActivityPartitionTests(APITestCase):
+    """
+    Monthly activity partitions can still be added once rows for their month
+    have landed in the default partition.
+    """
+
+    def test_rows_move_out_of_default_partition(self):
+        customer = User.objects.create(email='customer@example.com', username='customer')
+        ticket = Ticket.objects.create(user=customer, topic='Checkout fails', description='It fails.')
+        month = add_months(month_start(timezone.now()), 12)
+        activity = TicketActivity.objects.create(ticket=ticket, action='status_changed', performed_by=customer)
+        # A year ahead, past the partitions that exist: it lands in the default
+        TicketActivity.objects.filter(pk=activity.pk).update(timestamp=month + timedelta(days=3))
+        table = TicketActivity._meta.db_table
+        partition, default = [
+            connection.ops.quote_name(f'{table}_{suffix}') for suffix in (f'p{month:%Y%m}', 'default')
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {default}')
+            self.assertEqual(cursor.fetchall(), [(activity.pk,)])
+
+        created = ensure_partitions(table, months_ahead=12, since=month)
+        self.assertEqual(created, [f'{table}_p{month:%Y%m}'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {partition}')
+            self.assertEqual(cursor.fetchall(), [(activity.pk,)])
+            cursor.execute(f'SELECT count(*) FROM {default}')
+            self.assertEqual(cursor.fetchone(), (0,))
+        # The default partition is attached again and takes stray rows
+        TicketActivity.objects.filter(pk=activity.pk).update(timestamp=add_months(month, 12))
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {default}')
+            self.assertEqual(cursor.fetchall(), [(activity.pk,)])
+
+
+class ActivityArchiveTests(APITestCase):
+    """
+    Activity pages continue from the rows in the database into archived
+    history, read back through the archive index.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        cls.ticket = Ticket.objects.create(user=cls.customer, topic='Checkout fails', description='It fails.')
+        cls.other = Ticket.objects.create(user=cls.customer, topic='Refund missing', description='No refund.')
+        Ticket.objects.filter(pk__in=[cls.ticket.pk, cls.other.pk]).update(
+            created_at=add_months(month_start(timezone.now()), -3)
+        )
+        cls.ticket.refresh_from_db()
+        cls.live = [
+            TicketActivity.objects.create(ticket=cls.ticket, action='message_added', performed_by=cls.customer)
+            for _ in range(3)
+        ]
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(TICKET_ACTIVITY_ARCHIVE_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = directory
+
+    def archive(self, months_ago, rows):
+        """
+        Write an archive of the month months_ago holding rows, given as
+        (id, ticket, day), the way archive_activity does.
+        """
+        start = add_months(month_start(timezone.now()), -months_ago)
+        name = f'activity_p{start:%Y%m}'
+        path, index_path = [os.path.join(self.directory, f'{name}{suffix}') for suffix in ('.ndjson.gz', '.index')]
+        rows = sorted(
+            [(pk, ticket.pk, 'status_changed', f'Change {pk}', start + timedelta(days=day), self.customer.pk)
+             for pk, ticket, day in rows],
+            key=lambda row: (str(row[1]), row[4], row[0]), reverse=True
+        )
+        row_count = write_archive(rows, path, index_path)
+        bump_archives_version()
+        return ActivityArchive.objects.create(
+            partition=name, range_start=start, range_end=add_months(start, 1), path=path, index_path=index_path,
+            row_count=row_count,
+        )
+
+    def pages(self):
+        self.client.force_authenticate(self.customer)
+        url = reverse('tickets:ticket-activities', args=[self.ticket.pk])
+        data = {'page_size': 2}
+        pages = []
+        while url:
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            pages.append([activity['id'] for activity in response.data['results']])
+            url, data = response.data['next'], None
+        return pages
+
+    def test_pages_continue_into_archives(self):
+        live = [activity.pk for activity in reversed(self.live)]
+        self.assertEqual(self.pages(), [live[:2], live[2:]])
+
+        # Only the ticket's own rows, newest first, across both archives
+        self.archive(1, [(-1, self.ticket, 3), (-2, self.ticket, 1), (-3, self.other, 2)])
+        self.archive(2, [(-4, self.ticket, 5), (-5, self.other, 5)])
+        self.assertEqual(self.pages(), [live[:2], [live[2], -1], [-2, -4]])
+
+    def test_archiving_invalidates_cached_list(self):
+        self.assertEqual(get_archives(), [])
+        self.archive(1, [(-1, self.ticket, 1)])
+        self.assertEqual([archive['path'] for archive in get_archives()], [ActivityArchive.objects.get().path])
+
+
+class TicketImportTests(APITestCase):
+    """
+    Legacy NDJSON exports import in batches and resume from their checkpoint.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password('Passw0rd!2024')
+        cls.customer = User.objects.create(email='customer@example.com', username='customer', password=password)
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', password=password, user_type='agent', is_staff=True
+        )
+        cls.order = Order.objects.create(user=cls.customer, order_number='ORD-1', total_price=10)
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def record(self, index, **overrides):
+        return {
+            'external_id': f'HD-{index}', 'user': self.customer.email, 'order': 'ORD-1',
+            'assigned_to': self.agent.email, 'topic': f'Legacy ticket {index}', 'description': 'Imported.',
+            'status': 'closed', 'created_at': '2021-03-04T10:00:00Z',
+            'messages': [
+                {'user': self.customer.email, 'message': 'Help', 'created_at': '2021-03-04T10:05:00Z'},
+                {
+                    'user': self.agent.email, 'message': 'Done', 'created_at': '2021-03-05T09:00:00Z',
+                    'attachments': [{'path': f'legacy/{index}/receipt.pdf', 'filesize': 10}],
+                },
+            ],
+            **overrides,
+        }
+
+    def write(self, records, mode='w'):
+        with open(self.path, mode) as handle:
+            for record in records:
+                handle.write((record if isinstance(record, str) else json.dumps(record)) + '\n')
+
+    def import_tickets(self, **options):
+        call_command('import_tickets', self.path, batch_size=4, stdout=io.StringIO(), stderr=io.StringIO(), **options)
+        return ImportCheckpoint.objects.get(source=os.path.abspath(self.path))
+
+    def test_import(self):
+        self.write([self.record(1), 'not json', self.record(2, user='nobody@example.com'), self.record(3)])
+        checkpoint = self.import_tickets()
+
+        self.assertEqual((checkpoint.line_count, checkpoint.ticket_count, checkpoint.error_count), (4, 2, 2))
+        ticket = Ticket.objects.get(topic='Legacy ticket 1')
+        self.assertEqual(ticket.order, self.order)
+        self.assertEqual(ticket.created_at.isoformat(), '2021-03-04T10:00:00+00:00')
+        self.assertEqual(ticket.updated_at.isoformat(), '2021-03-05T09:00:00+00:00')
+        messages = list(ticket.messages.order_by('created_at'))
+        self.assertEqual([message.is_staff_message for message in messages], [False, True])
+        attachment = messages[1].attachments.get()
+        self.assertEqual((attachment.filename, attachment.uploaded_by), ('receipt.pdf', self.agent))
+        self.assertEqual(ticket.activities.get().details, 'Imported from legacy ticket HD-1')
+
+    def test_skipped_lines_are_batched(self):
+        self.write(['', 'not json', '[1]'] * 3 + [self.record(1)])
+        with patch.object(TicketImporter, 'flush', autospec=True, side_effect=TicketImporter.flush) as flush:
+            checkpoint = self.import_tickets()
+
+        self.assertEqual([len(call.args[1]) for call in flush.call_args_list], [4, 4, 2])
+        self.assertEqual((checkpoint.line_count, checkpoint.ticket_count, checkpoint.error_count), (10, 1, 6))
+
+    def test_open_tickets_are_indexed(self):
+        self.write([self.record(1, status='open', created_at=timezone.now().isoformat()), self.record(2)])
+        self.import_tickets()
+
+        self.assertEqual(
+            list(TicketFingerprint.objects.values_list('ticket__topic', flat=True)), ['Legacy ticket 1']
+        )
+
+    def test_import_without_copy(self):
+        self.write([self.record(1)])
+        self.import_tickets(no_copy=True)
+
+        ticket = Ticket.objects.get()
+        self.assertEqual(ticket.created_at.isoformat(), '2021-03-04T10:00:00+00:00')
+        message = ticket.messages.order_by('created_at').first()
+        self.assertEqual(message.created_at.isoformat(), '2021-03-04T10:05:00+00:00')
+        self.assertTrue(TicketMessage._meta.get_field('created_at').auto_now_add)
+        self.assertTrue(Ticket._meta.get_field('updated_at').auto_now)
+
+    def test_resume(self):
+        self.write([self.record(1), self.record(2)])
+        self.import_tickets()
+        self.write([self.record(3)], mode='a')
+        checkpoint = self.import_tickets()
+
+        self.assertEqual((checkpoint.line_count, checkpoint.ticket_count), (3, 3))
+        self.assertEqual(Ticket.objects.count(), 3)
+        self.assertEqual(TicketMessage.objects.count(), 6)
+
+    def test_create_users(self):
+        self.write([self.record(1, user='legacy@example.com', order=None)])
+        self.import_tickets(create_users=True)
+
+        requester = User.objects.get(email='legacy@example.com')
+        self.assertFalse(requester.has_usable_password())
+        self.assertEqual(Ticket.objects.get().user, requester)
+
+    def test_endpoint_is_admin_only(self):
+        self.client.force_authenticate(self.agent)
+        response = self.client.post(
+            reverse('tickets:ticket-import') + '?source=export', data=json.dumps(self.record(1)).encode(),
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Ticket.objects.exists())
+
+
+class SeedBulkTests(APITestCase):
+    """
+    seed_bulk writes the requested rows, and the same seed and --end give
+    the same data through COPY and through batched INSERTs.
+    """
+
+    def seed(self, **options):
+        call_command(
+            'seed_bulk', tickets=30, seed=7, customers=6, agents=2, days=60, end='2024-06-01', batch_size=8,
+            stdout=io.StringIO(), **options
+        )
+        return {
+            'users': list(User.objects.order_by('id').values_list('id', 'email', 'user_type', 'date_joined')),
+            'orders': list(Order.objects.order_by('id').values_list('id', 'user_id', 'order_number', 'total_price')),
+            'tickets': list(Ticket.objects.order_by('id').values_list(
+                'id', 'user_id', 'order_id', 'assigned_to_id', 'topic', 'status', 'priority', 'created_at',
+                'updated_at', 'resolved_at'
+            )),
+            'messages': sorted(TicketMessage.objects.values_list('ticket_id', 'user_id', 'message', 'created_at')),
+            'activities': sorted(TicketActivity.objects.values_list('ticket_id', 'action', 'details', 'timestamp')),
+        }
+
+    def test_seed(self):
+        with transaction.atomic():
+            first = self.seed()
+            transaction.set_rollback(True)
+        self.assertFalse(Ticket.objects.exists())
+        second = self.seed(no_copy=True)
+
+        self.assertEqual(first, second)
+        self.assertEqual([row[2] for row in first['users']].count('agent'), 2)
+        self.assertEqual(len(first['users']), 8)
+        self.assertEqual(len(first['tickets']), 30)
+        self.assertTrue(first['messages'])
+        assigned = sum(1 for ticket in first['tickets'] if ticket[3])
+        resolved = sum(1 for ticket in first['tickets'] if ticket[5] in ('resolved', 'closed'))
+        self.assertEqual(len(first['activities']), 30 + len(first['messages']) + assigned + resolved)
+        end = datetime(2024, 6, 1, tzinfo=dt_timezone.utc)
+        self.assertTrue(all(end - timedelta(days=60) <= ticket[7] <= end for ticket in first['tickets']))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class MailIngestTests(APITestCase):
+    """
+    Email from a maildir or mbox becomes tickets, and replies are filed on
+    the ticket they answer.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password('Passw0rd!2024')
+        cls.customer = User.objects.create(email='Customer@example.com', username='customer', password=password)
+        cls.other = User.objects.create(email='other@example.com', username='other', password=password)
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', password=password, user_type='agent', is_staff=True
+        )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.maildir = mailbox.Maildir(os.path.join(self.directory, 'Maildir'))
+
+    def mail(self, sender, subject, body, message_id, **headers):
+        message = EmailMessage()
+        message['From'] = sender
+        message['To'] = 'support@example.com'
+        message['Subject'] = subject
+        message['Message-ID'] = message_id
+        for name, value in headers.items():
+            message[name.replace('_', '-')] = value
+        message.set_content(body)
+        return message
+
+    def ingest(self, path=None, **options):
+        call_command(
+            'ingest_mail', path or os.path.join(self.directory, 'Maildir'), workers=options.pop('workers', 0),
+            stdout=io.StringIO(), stderr=io.StringIO(), **options
+        )
+
+    def test_new_ticket_and_replies(self):
+        opening = self.mail('Jane <customer@example.com>', 'Parcel missing', 'It never arrived.', '<m1@example.com>')
+        opening.add_attachment(b'%PDF', maintype='application', subtype='pdf', filename='receipt.pdf')
+        self.maildir.add(opening)
+        self.maildir.add(self.mail(
+            'agent@example.com', 'Re: Parcel missing', 'Looking into it.\n\nOn Monday Jane wrote:\n> It never arrived.',
+            '<m2@example.com>', In_Reply_To='<m1@example.com>'
+        ))
+        self.maildir.add(self.mail('noreply@example.com', 'Out of office', 'Away.', '<m3@example.com>', Auto_Submitted='auto-replied'))
+        self.ingest(workers=2)
+
+        ticket = Ticket.objects.get()
+        self.assertEqual((ticket.user, ticket.topic, ticket.description), (self.customer, 'Parcel missing', 'It never arrived.'))
+        messages = list(ticket.messages.order_by('id'))
+        self.assertEqual(messages[0].attachments.get().filename, 'receipt.pdf')
+        self.assertEqual((messages[1].user, messages[1].message), (self.agent, 'Looking into it.'))
+        self.assertTrue(messages[1].is_staff_message)
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'Maildir', 'new')), [])
+        self.assertTrue(TicketFingerprint.objects.filter(ticket=ticket).exists())
+
+        # Delivered again: recorded Message-IDs are not filed twice
+        self.maildir.add(self.mail('customer@example.com', 'Parcel missing', 'It never arrived.', '<m1@example.com>'))
+        self.maildir.add(self.mail(
+            'customer@example.com', f'Re: {reply_token(ticket)} Parcel missing', 'Thanks!', '<m4@example.com>'
+        ))
+        self.ingest()
+        self.assertEqual(Ticket.objects.count(), 1)
+        self.assertEqual(ticket.messages.count(), 3)
+
+    def test_failed_batch_removes_attachments(self):
+        message = self.mail('customer@example.com', 'Broken', 'See attached.', '<m1@example.com>')
+        message.add_attachment(b'%PDF', maintype='application', subtype='pdf', filename='rolled-back.pdf')
+        self.maildir.add(message)
+        with patch('apps.Tickets.mail.emit_events', side_effect=DatabaseError('lost connection')):
+            with self.assertRaises(DatabaseError):
+                self.ingest()
+
+        self.assertFalse(TicketAttachment.objects.exists())
+        stored = [name for _, _, names in os.walk(MEDIA_ROOT) for name in names]
+        self.assertFalse([name for name in stored if name.startswith('rolled-back')])
+
+    def test_token_needs_owner_or_staff(self):
+        ticket = Ticket.objects.create(user=self.customer, topic='Refund', description='Please refund me.')
+        self.maildir.add(self.mail('other@example.com', f'Re: {reply_token(ticket)}', 'Me too', '<m1@example.com>'))
+        self.maildir.add(self.mail('stranger@example.com', 'Hello', 'New here', '<m2@example.com>'))
+        self.ingest()
+
+        self.assertFalse(ticket.messages.exists())
+        self.assertEqual(Ticket.objects.filter(user=self.other).get().topic, f'Re: {reply_token(ticket)}')
+        self.assertFalse(User.objects.get(email='stranger@example.com').has_usable_password())
+
+    def test_mbox_resumes(self):
+        path = os.path.join(self.directory, 'support.mbox')
+        mbox = mailbox.mbox(path)
+        mbox.add(self.mail('customer@example.com', 'First', 'One', '<m1@example.com>'))
+        mbox.add(self.mail('other@example.com', 'Second', 'Two', '<m2@example.com>'))
+        mbox.flush()
+        self.ingest(path)
+
+        mbox.add(self.mail('customer@example.com', 'Third', 'Three', '<m3@example.com>'))
+        mbox.flush()
+        self.ingest(path)
+
+        self.assertEqual(sorted(Ticket.objects.values_list('topic', flat=True)), ['First', 'Second', 'Third'])
+        checkpoint = ImportCheckpoint.objects.get(source=f'mbox:{os.path.abspath(path)}')
+        self.assertEqual((checkpoint.line_count, checkpoint.ticket_count), (3, 3))
+
+
+class OutboxTests(APITestCase):
+    """
+    Every recorded ticket change is appended to the outbox in offset order
+    and consumers resume from their committed offset.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password('Passw0rd!2024')
+        cls.customer = User.objects.create(email='customer@example.com', username='customer', password=password)
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', password=password, user_type='agent', is_staff=True
+        )
+
+    def test_ticket_lifecycle_events(self):
+        self.client.force_authenticate(self.customer)
+        ticket_id = self.client.post(
+            reverse('tickets:ticket-list'), {'topic': 'Refund', 'description': 'Please refund me.'}, format='json'
+        ).data['id']
+        self.client.post(reverse('tickets:ticket-messages', args=[ticket_id]), {'message': 'Any news?'}, format='json')
+        self.client.force_authenticate(self.agent)
+        self.client.put(
+            reverse('tickets:ticket-detail', args=[ticket_id]),
+            {'status': 'resolved', 'priority': 'high', 'assigned_to': str(self.agent.pk)}, format='json'
+        )
+        self.client.delete(reverse('tickets:ticket-detail', args=[ticket_id]))
+
+        events = read_events()
+        self.assertEqual([event.event_type for event in events], [
+            'created', 'message_added', 'status_changed', 'resolved', 'priority_changed',
+            'assigned_to_changed', 'deleted',
+        ])
+        self.assertEqual([event.id for event in events], sorted(event.id for event in events))
+        self.assertEqual({str(event.ticket_id) for event in events}, {str(ticket_id)})
+        self.assertEqual(events[2].payload['status'], ['open', 'resolved'])
+        self.assertEqual(events[-1].actor_id, self.agent.pk)
+        # The activity log only keeps what still has a ticket, once purged
+        self.assertTrue(TicketActivity.objects.exists())
+        call_command('purge_deleted_tickets', stdout=io.StringIO())
+        self.assertFalse(TicketActivity.objects.exists())
+
+    def test_consumer_reads_from_offset(self):
+        self.client.force_authenticate(User.objects.create(
+            email='admin@example.com', username='admin', user_type='admin', is_staff=True
+        ))
+        for index in range(3):
+            emit_events([OutboxEvent(ticket_id=uuid.uuid4(), event_type='created', created_at=timezone.now())])
+
+        first = self.client.get(reverse('tickets:outbox-events'), {'page_size': 2, 'consumer': 'search'}).data
+        self.assertEqual(len(first['events']), 2)
+        self.assertIsNotNone(first['next'])
+        response = self.client.put(
+            reverse('tickets:consumer-offset', args=['search']), {'offset': first['next_offset']}, format='json'
+        )
+        self.assertEqual(response.data['offset'], first['next_offset'])
+
+        rest = self.client.get(reverse('tickets:outbox-events'), {'consumer': 'search'}).data
+        self.assertEqual(len(rest['events']), 1)
+        self.assertIsNone(rest['next'])
+        # Committed offsets never move backwards
+        self.assertEqual(commit_offset('search', 1).offset, first['next_offset'])
+
+    def test_prune(self):
+        old = timezone.now() - timedelta(days=30)
+        emit_events([OutboxEvent(ticket_id=uuid.uuid4(), event_type='created', created_at=old) for _ in range(3)])
+        emit_events([OutboxEvent(ticket_id=uuid.uuid4(), event_type='created', created_at=timezone.now())])
+        first = OutboxEvent.objects.first()
+        commit_offset('search', first.id)
+
+        call_command('prune_outbox', stdout=io.StringIO())
+        self.assertEqual(OutboxEvent.objects.count(), 3)
+        commit_offset('search', first.id + 3)
+        call_command('prune_outbox', stdout=io.StringIO())
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+
+class DuplicateTicketTests(APITestCase):
+    """
+    Creating a ticket reports the recent open tickets it probably
+    duplicates, among those the user may see.
+    """
+    outage = (
+        'Checkout fails with error 502',
+        'When I try to pay for my order the checkout page shows error 502 and the payment never goes through.',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        cls.other_customer = User.objects.create(email='other@example.com', username='other')
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', user_type='agent', is_staff=True
+        )
+
+    def create_ticket(self, user, topic, description):
+        self.client.force_authenticate(user)
+        response = self.client.post(
+            reverse('tickets:ticket-list'), {'topic': topic, 'description': description}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_duplicates_are_reported(self):
+        first = self.create_ticket(self.customer, *self.outage)
+        self.assertEqual(first['duplicate_candidates'], [])
+        second = self.create_ticket(
+            self.customer, 'Checkout fails with error 502!',
+            'When I try to pay for my order the checkout page shows error 502 and my payment never goes through.'
+        )
+        [candidate] = second['duplicate_candidates']
+        self.assertEqual(candidate['id'], first['id'])
+        self.assertGreaterEqual(candidate['similarity'], 0.5)
+
+        unrelated = self.create_ticket(self.customer, 'Change my address', 'Please ship to my new flat instead.')
+        self.assertEqual(unrelated['duplicate_candidates'], [])
+
+        # Customers are only told about their own tickets, but staff get the
+        # links recorded either way; staff see all of them
+        other = self.create_ticket(self.other_customer, *self.outage)
+        self.assertEqual(other['duplicate_candidates'], [])
+        self.assertEqual(
+            set(TicketDuplicate.objects.filter(ticket_id=other['id']).values_list('duplicate_id', flat=True)),
+            {uuid.UUID(first['id']), uuid.UUID(second['id'])}
+        )
+        candidates = self.create_ticket(self.agent, *self.outage)['duplicate_candidates']
+        self.assertEqual(len(candidates), 3)
+        self.assertEqual(candidates[0]['similarity'], 1.0)
+
+    def test_only_recent_open_tickets(self):
+        closed = self.create_ticket(self.customer, *self.outage)
+        Ticket.objects.filter(pk=closed['id']).update(status='closed')
+        old = self.create_ticket(self.customer, *self.outage)
+        TicketFingerprintBand.objects.filter(ticket_id=old['id']).update(created_at=timezone.now() - timedelta(days=30))
+        Ticket.objects.filter(pk=old['id']).update(created_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(self.create_ticket(self.customer, *self.outage)['duplicate_candidates'], [])
+
+    def test_rebuild_index(self):
+        imported = Ticket.objects.create(user=self.customer, topic=self.outage[0], description=self.outage[1])
+        old = self.create_ticket(self.customer, 'Change my address', 'Please ship to my new flat instead.')
+        Ticket.objects.filter(pk=old['id']).update(created_at=timezone.now() - timedelta(days=30))
+        TicketFingerprintBand.objects.filter(ticket_id=old['id']).update(created_at=timezone.now() - timedelta(days=30))
+
+        call_command('rebuild_duplicate_index', stdout=io.StringIO())
+        self.assertFalse(TicketFingerprintBand.objects.filter(ticket_id=old['id']).exists())
+        self.assertFalse(TicketFingerprint.objects.filter(ticket_id=old['id']).exists())
+        [candidate] = self.create_ticket(self.customer, *self.outage)['duplicate_candidates']
+        self.assertEqual(candidate['id'], str(imported.pk))
+
+
+class PriorityTriageTests(APITestCase):
+    """
+    A model trained on closed tickets suggests a priority for new tickets and
+    rescores the open backlog.
+    """
+    examples = {
+        'critical': ('Site is down', 'Checkout returns error 502 for every customer, nobody can pay.'),
+        'high': ('Payment charged twice', 'My card was charged twice for the same order, please refund.'),
+        'medium': ('Parcel is late', 'My parcel tracking has not updated for a week, where is it?'),
+        'low': ('Change newsletter settings', 'How do I change how often I get the newsletter?'),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        Ticket.objects.bulk_create([
+            Ticket(user=cls.customer, topic=topic, description=description, priority=priority, status='closed')
+            for priority, (topic, description) in cls.examples.items()
+            for _ in range(10)
+        ])
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(TICKET_PRIORITY_MODEL_PATH=os.path.join(directory, 'priority.model'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_authenticate(self.customer)
+
+    def create_ticket(self, topic, description):
+        return self.client.post(
+            reverse('tickets:ticket-list'), {'topic': topic, 'description': description}, format='json'
+        ).data
+
+    def test_suggestion_at_create(self):
+        self.assertIsNone(self.create_ticket('Site is down', 'Error 502 at checkout.')['suggested_priority'])
+
+        output = io.StringIO()
+        call_command('train_priority_model', min_samples=10, features=1 << 12, stdout=output)
+        self.assertIn('Held-out accuracy: 100.0%', output.getvalue())
+        created = self.create_ticket('The site is down', 'I get error 502 at checkout and nobody can pay.')
+        self.assertEqual(created['suggested_priority'], 'critical')
+        # Customers cannot set it themselves
+        self.assertEqual(created['priority'], 'low')
+
+    def test_rescore_backlog(self):
+        with self.assertRaises(CommandError):
+            call_command('rescore_priorities', stdout=io.StringIO())
+        backlog = Ticket.objects.bulk_create([
+            Ticket(user=self.customer, topic='Refund please', description='I was charged twice for my order.'),
+            Ticket(user=self.customer, topic='Newsletter', description='How often do I get the newsletter?'),
+        ])
+        call_command('train_priority_model', min_samples=10, features=1 << 12, stdout=io.StringIO())
+        call_command('rescore_priorities', chunk_size=1, stdout=io.StringIO())
+        self.assertEqual(
+            [Ticket.objects.get(pk=ticket.pk).suggested_priority for ticket in backlog], ['high', 'low']
+        )
+        self.assertFalse(Ticket.objects.filter(status='closed', suggested_priority__isnull=False).exists())
+
+    def test_too_few_samples(self):
+        with self.assertRaises(CommandError):
+            call_command('train_priority_model', stdout=io.StringIO())
+        self.assertFalse(os.path.exists(settings.TICKET_PRIORITY_MODEL_PATH))
+
+    def test_held_out_is_capped(self):
+        output = io.StringIO()
+        call_command('train_priority_model', min_samples=10, features=1 << 12, max_held_out=2, stdout=output)
+        self.assertIn('on 2 tickets', output.getvalue())
+        self.assertIn('Trained on 38 tickets', output.getvalue())
+
+    def test_corrupt_model(self):
+        call_command('train_priority_model', min_samples=10, features=1 << 12, stdout=io.StringIO())
+        with open(settings.TICKET_PRIORITY_MODEL_PATH, 'r+b') as model:
+            model.truncate(100)
+
+        with self.assertLogs('apps.Tickets.triage', 'ERROR'):
+            created = self.create_ticket('Site is down', 'Error 502 at checkout.')
+        self.assertIsNone(created['suggested_priority'])
+        # Logged once per file, not on every ticket
+        with self.assertNoLogs('apps.Tickets.triage'):
+            self.assertIsNone(self.create_ticket('Site is down', 'Error 502 at checkout.')['suggested_priority'])
+
+
+class SuggestionTests(APITestCase):
+    """
+    Staff get replies from similar resolved tickets, from an index that
+    follows tickets as they are resolved and reopened.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', user_type='agent', is_staff=True
+        )
+
+    def resolve(self, topic, description, reply):
+        ticket = Ticket.objects.create(user=self.customer, topic=topic, description=description)
+        self.client.force_authenticate(self.agent)
+        self.client.post(reverse('tickets:ticket-messages', args=[ticket.pk]), {'message': reply}, format='json')
+        self.client.put(reverse('tickets:ticket-detail', args=[ticket.pk]), {'status': 'resolved'}, format='json')
+        return ticket
+
+    def suggestions(self, ticket):
+        self.client.force_authenticate(self.agent)
+        return self.client.get(reverse('tickets:ticket-suggestions', args=[ticket.pk])).data
+
+    def test_suggested_replies(self):
+        refund = self.resolve(
+            'Refund for damaged parcel', 'The parcel arrived damaged.',
+            'We have issued a refund for the damaged parcel; it reaches your card within five days.'
+        )
+        self.resolve(
+            'Reset password', 'I cannot log in to my account.',
+            'Use the forgotten password link on the login page to reset your password.'
+        )
+        call_command('update_suggestion_index', stdout=io.StringIO())
+
+        question = Ticket.objects.create(
+            user=self.customer, topic='Damaged parcel', description='My parcel is damaged, can I get a refund?'
+        )
+        [first, *rest] = self.suggestions(question)
+        self.assertEqual(first['id'], str(refund.pk))
+        self.assertIn('issued a refund', first['replies'][0]['message'])
+        self.assertTrue(all(suggestion['score'] < first['score'] for suggestion in rest))
+
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(reverse('tickets:ticket-suggestions', args=[question.pk]))
+        self.assertEqual(response.status_code, 403)
+
+        # Reopened tickets leave the index
+        self.client.force_authenticate(self.agent)
+        self.client.put(reverse('tickets:ticket-detail', args=[refund.pk]), {'status': 'open'}, format='json')
+        call_command('update_suggestion_index', stdout=io.StringIO())
+        self.assertNotIn(str(refund.pk), [suggestion['id'] for suggestion in self.suggestions(question)])
+
+    def test_rebuild(self):
+        imported = Ticket.objects.create(
+            user=self.customer, topic='Invoice missing VAT number', description='Please add our VAT number.',
+            status='closed'
+        )
+        TicketMessage.objects.create(
+            ticket=imported, user=self.agent, message='The corrected invoice is attached.', is_staff_message=True
+        )
+        question = Ticket.objects.create(user=self.customer, topic='VAT number on invoice', description='Missing.')
+        self.assertEqual(self.suggestions(question), [])
+
+        call_command('update_suggestion_index', rebuild=True, stdout=io.StringIO())
+        [suggestion] = self.suggestions(question)
+        self.assertEqual(suggestion['id'], str(imported.pk))
+        self.assertEqual(SuggestionTerm.objects.get(term=0).document_count, 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, TICKET_ATTACHMENT_PREVIEW_LINES=3)
+class AttachmentPreviewTests(APITestCase):
+    """
+    Uploaded attachments get a thumbnail or a text preview from
+    generate_previews, served with the attachment.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        cls.ticket = Ticket.objects.create(user=cls.customer, topic='Checkout fails', description='See the log.')
+        cls.message = TicketMessage.objects.create(ticket=cls.ticket, user=cls.customer, message='Attached.')
+
+    def upload(self, name, content):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(
+            reverse('tickets:ticket-attachments', args=[self.ticket.pk]),
+            {'message_id': self.message.pk, 'file': SimpleUploadedFile(name, content)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['preview_status'], response.data['thumbnail_url']), ('pending', None))
+        return TicketAttachment.objects.get(pk=response.data['id'])
+
+    def generate(self, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('generate_previews', stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_text_preview(self):
+        log = self.upload('checkout.log', b''.join(b'line %d\n' % number for number in range(1, 11)) + b'tail')
+        notes = self.upload('notes.txt', ('caf\u00e9 ' * 100 + '\nsecond').encode())
+        binary = self.upload('dump.bin', bytes(range(256)))
+        output, errors = self.generate(workers=0)
+        self.assertIn('Processed 3 attachments: 2 previews, 1 unsupported, 0 failed', output)
+        self.assertEqual(errors, '')
+
+        log.refresh_from_db()
+        self.assertEqual(
+            (log.preview_status, log.content_type, log.preview_text, log.line_count),
+            ('ready', 'text/plain', 'line 1\nline 2\nline 3', 11)
+        )
+        notes.refresh_from_db()
+        self.assertEqual(notes.preview_text, 'caf\u00e9 ' * 40 + '\nsecond')
+        binary.refresh_from_db()
+        self.assertEqual((binary.preview_status, binary.content_type), ('unsupported', 'application/octet-stream'))
+
+        # Processed attachments are not rendered again
+        self.assertIn('Processed 0 attachments', self.generate(workers=0)[0])
+
+        response = self.client.get(reverse('tickets:ticket-detail', args=[self.ticket.pk]))
+        [attachment] = [item for item in response.data['attachments'] if item['id'] == log.pk]
+        self.assertEqual((attachment['preview_text'], attachment['line_count']), (log.preview_text, 11))
+
+    def test_missing_file(self):
+        attachment = self.upload('gone.txt', b'gone')
+        os.remove(attachment.file.path)
+        output, errors = self.generate(workers=1)
+        self.assertIn('1 failed', output)
+        self.assertIn(f'Attachment {attachment.pk}: FileNotFoundError', errors)
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.preview_status, 'failed')
+
+    @skipUnless(Image, 'Pillow is not installed')
+    def test_thumbnail(self):
+        image = io.BytesIO()
+        Image.new('RGBA', (1200, 600), (255, 0, 0, 128)).save(image, 'PNG')
+        attachment = self.upload('screenshot.png', image.getvalue())
+        self.generate(workers=0)
+
+        attachment.refresh_from_db()
+        self.assertEqual(
+            (attachment.preview_status, attachment.content_type, attachment.width, attachment.height),
+            ('ready', 'image/png', 1200, 600)
+        )
+        self.assertEqual(attachment.thumbnail.name, f'{attachment.file.name}.thumb.jpg')
+        with Image.open(attachment.thumbnail.path) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('JPEG', (320, 160)))
+
+    @skipUnless(Image, 'Pillow is not installed')
+    def test_thumbnail_of_long_name(self):
+        image = io.BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(image, 'PNG')
+        attachment = self.upload(f"{'screenshot-' * 7}.png", image.getvalue())
+        self.assertGreater(len(attachment.file.name), 90)
+        self.generate(workers=0)
+
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.thumbnail.name, f'{attachment.file.name}.thumb.jpg')
+        self.assertTrue(default_storage.exists(attachment.thumbnail.name))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, USER_ATTACHMENT_QUOTA_BYTES=2000, TICKET_ATTACHMENT_QUOTA_BYTES=1500)
+class AttachmentQuotaTests(APITestCase):
+    """
+    Attachment storage is totalled per ticket and per user as attachments
+    come and go, and uploads over quota are refused.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', user_type='agent', is_staff=True
+        )
+        cls.admin = User.objects.create(email='admin@example.com', username='admin', user_type='admin', is_staff=True)
+
+    def setUp(self):
+        self.first, self.second = [
+            Ticket.objects.create(user=self.customer, topic=topic, description='See attached.')
+            for topic in ('Checkout fails', 'Refund missing')
+        ]
+
+    def upload(self, user, ticket, size):
+        user.refresh_from_db()
+        self.client.force_authenticate(user)
+        message = TicketMessage.objects.create(ticket=ticket, user=user, message='Attached.')
+        return self.client.post(
+            reverse('tickets:ticket-attachments', args=[ticket.pk]),
+            {'message_id': message.pk, 'file': SimpleUploadedFile('trace.log', b'x' * size)}, format='multipart'
+        )
+
+    def totals(self):
+        return (
+            *Ticket.objects.filter(pk__in=[self.first.pk, self.second.pk]).order_by('topic').values_list(
+                'attachment_bytes', flat=True
+            ),
+            *User.objects.filter(pk__in=[self.customer.pk, self.agent.pk]).order_by('username').values_list(
+                'attachment_bytes', flat=True
+            ),
+        )
+
+    def test_totals(self):
+        self.assertEqual(self.upload(self.customer, self.first, 300).status_code, 201)
+        self.assertEqual(self.upload(self.customer, self.second, 200).status_code, 201)
+        self.assertEqual(self.upload(self.agent, self.first, 100).status_code, 201)
+        # Checkout fails, Refund missing; agent, customer
+        self.assertEqual(self.totals(), (400, 200, 100, 500))
+
+        # A ticket update does not write back the total it loaded
+        ticket = Ticket.objects.get(pk=self.second.pk)
+        self.upload(self.customer, self.second, 50)
+        ticket.priority = 'high'
+        ticket.save()
+        self.assertEqual(self.totals(), (400, 250, 100, 550))
+
+        self.client.force_authenticate(self.agent)
+        self.client.delete(reverse('tickets:ticket-detail', args=[self.first.pk]))
+        # The uploaders' totals keep the deleted ticket's attachments until they are purged
+        self.assertEqual(self.totals(), (250, 100, 550))
+        call_command('purge_deleted_tickets', stdout=io.StringIO())
+        self.assertEqual(self.totals(), (250, 0, 250))
+
+        TicketAttachment.objects.update(filesize=1)
+        recount()
+        self.assertEqual(self.totals(), (2, 0, 2))
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('tickets:attachment-storage'))
+        self.assertEqual([ticket['id'] for ticket in response.data['tickets']], [str(self.second.pk)])
+        self.assertEqual([(user['email'], user['attachment_bytes']) for user in response.data['users']], [
+            ('customer@example.com', 2)
+        ])
+        self.client.force_authenticate(self.agent)
+        self.assertEqual(self.client.get(reverse('tickets:attachment-storage')).status_code, 403)
+
+    def test_quota(self):
+        self.assertEqual(self.upload(self.customer, self.first, 1000).status_code, 201)
+        # The ticket has 500 bytes left
+        response = self.upload(self.customer, self.first, 600)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('remaining', response.data['error'])
+        # The user has 1000 bytes left, less the multipart framing
+        self.assertEqual(self.upload(self.customer, self.second, 1100).status_code, 413)
+        self.assertEqual(self.upload(self.customer, self.second, 600).status_code, 201)
+        self.assertEqual(TicketAttachment.objects.count(), 2)
+        self.assertEqual(self.totals(), (1000, 600, 0, 1600))
+
+    def test_replay_skips_quota(self):
+        self.client.force_authenticate(self.customer)
+        message = TicketMessage.objects.create(ticket=self.first, user=self.customer, message='Attached.')
+
+        def upload():
+            return self.client.post(
+                reverse('tickets:ticket-attachments', args=[self.first.pk]),
+                {'message_id': message.pk, 'file': SimpleUploadedFile('trace.log', b'x' * 1000)},
+                format='multipart', HTTP_IDEMPOTENCY_KEY='upload-1'
+            )
+
+        created = upload()
+        self.assertEqual(created.status_code, 201)
+        # Now over the ticket's remaining 500 bytes, but already stored
+        replayed = upload()
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed.data['id'], created.data['id'])
+
+    def test_quota_of_hidden_ticket(self):
+        other = User.objects.create(email='other@example.com', username='other')
+        self.client.force_authenticate(other)
+        response = self.client.post(
+            reverse('tickets:ticket-attachments', args=[self.first.pk]),
+            {'message_id': 1, 'file': SimpleUploadedFile('trace.log', b'x' * 1800)}, format='multipart'
+        )
+        # Not 413, which would tell a stranger how much the ticket holds
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TicketDeletionTests(APITestCase):
+    """
+    Deleted tickets disappear at once and are purged with everything on
+    them by purge_deleted_tickets.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', user_type='agent', is_staff=True
+        )
+
+    def setUp(self):
+        self.ticket, self.other = [
+            Ticket.objects.create(user=self.customer, topic=topic, description='See attached.')
+            for topic in ('Checkout fails', 'Refund missing')
+        ]
+        self.client.force_authenticate(self.customer)
+        self.paths = []
+        for ticket in (self.ticket, self.other):
+            message = TicketMessage.objects.create(ticket=ticket, user=self.customer, message='Attached.')
+            response = self.client.post(
+                reverse('tickets:ticket-attachments', args=[ticket.pk]),
+                {'message_id': message.pk, 'file': SimpleUploadedFile('trace.log', b'x' * 100)}, format='multipart'
+            )
+            self.paths.append(TicketAttachment.objects.get(pk=response.data['id']).file.name)
+
+    def test_delete_hides_ticket(self):
+        self.client.force_authenticate(self.agent)
+        response = self.client.delete(reverse('tickets:ticket-detail', args=[self.ticket.pk]))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(
+            [ticket['id'] for ticket in self.client.get(reverse('tickets:ticket-list')).data],
+            [str(self.other.pk)]
+        )
+        for path in (
+            reverse('tickets:ticket-detail', args=[self.ticket.pk]),
+            reverse('tickets:ticket-messages', args=[self.ticket.pk]),
+        ):
+            self.assertEqual(self.client.get(path).status_code, 404)
+        self.assertEqual(self.client.delete(reverse('tickets:ticket-detail', args=[self.ticket.pk])).status_code, 404)
+
+        # Nothing is removed until the purge
+        self.assertTrue(Ticket.all_objects.filter(pk=self.ticket.pk, deleted_at__isnull=False).exists())
+        self.assertEqual(TicketAttachment.objects.count(), 2)
+        record = TicketDeletionRecord.objects.get()
+        self.assertEqual(
+            (record.ticket_id, record.owner, record.deleted_by, record.purged_at),
+            (self.ticket.pk, self.customer, self.agent, None)
+        )
+
+    def test_purge(self):
+        for ticket in (self.ticket, self.other):
+            TicketMessage.objects.create(ticket=ticket, user=self.agent, message='Fixed.', is_staff_message=True)
+        Ticket.objects.update(status='resolved')
+        reindex_tickets([self.ticket.pk, self.other.pk])
+        TicketDuplicate.objects.create(ticket=self.other, duplicate=self.ticket, similarity=0.9)
+        self.client.force_authenticate(self.agent)
+        self.client.delete(reverse('tickets:ticket-detail', args=[self.ticket.pk]))
+        out = io.StringIO()
+        call_command('purge_deleted_tickets', batch_size=1, stdout=out)
+        self.assertIn('Purged 1 deleted tickets', out.getvalue())
+
+        self.assertFalse(Ticket.all_objects.filter(pk=self.ticket.pk).exists())
+        self.assertEqual(set(TicketMessage.objects.values_list('ticket_id', flat=True)), {self.other.pk})
+        self.assertEqual(set(TicketAttachment.objects.values_list('ticket_id', flat=True)), {self.other.pk})
+        self.assertFalse(TicketActivity.objects.filter(ticket_id=self.ticket.pk).exists())
+        self.assertFalse(TicketDuplicate.objects.exists())
+        self.assertEqual(
+            [os.path.exists(os.path.join(MEDIA_ROOT, path)) for path in self.paths], [False, True]
+        )
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.attachment_bytes, 100)
+
+        record = TicketDeletionRecord.objects.get()
+        self.assertIsNotNone(record.purged_at)
+        self.assertEqual((record.message_count, record.attachment_count, record.attachment_bytes), (2, 1, 100))
+        # Taken off the suggestion index and its term counts
+        self.assertEqual(set(SuggestionPosting.objects.values_list('ticket_id', flat=True)), {self.other.pk})
+        self.assertEqual(SuggestionTerm.objects.get(term=CORPUS).document_count, 1)
+        # The deletion stays in the outbox
+        self.assertEqual(read_events()[-1].event_type, 'deleted')
+
+
+class StandInReceiver:
+    """
+    A local HTTP server on a background event loop standing in for a webhook
+    endpoint. Answers each request with the next status in statuses (200
+    once they run out) after delay seconds, and records what it received.
+    """
+
+    def __init__(self, statuses=(), delay=0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.requests = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, '127.0.0.1', 0))
+        self.url = f'http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/hooks/tickets'
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while await reader.readline():
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b''):
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers['content-length']))
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                await asyncio.sleep(self.delay)
+                self.in_flight -= 1
+                self.requests.append((headers, json.loads(body), body))
+                status_code = self.statuses.pop(0) if self.statuses else 200
+                writer.write(f'HTTP/1.1 {status_code} Stand-in\r\nContent-Length: 2\r\n\r\nok'.encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+class WebhookTests(APITestCase):
+    """
+    Outbox events are delivered to webhook subscriptions in signed batches,
+    retried with backoff and dead-lettered when they keep failing.
+    """
+
+    def setUp(self):
+        self.receiver = StandInReceiver()
+        self.addCleanup(self.receiver.stop)
+
+    def emit(self, count, event_type='created', **kwargs):
+        return emit_events([
+            OutboxEvent(ticket_id=uuid.uuid4(), event_type=event_type, created_at=timezone.now(), **kwargs)
+            for _ in range(count)
+        ])
+
+    def deliver(self, **kwargs):
+        async def run():
+            async with WebhookDispatcher(backoff_base=0.001, **kwargs) as dispatcher:
+                return await dispatcher.run_once()
+
+        return async_to_sync(run)()
+
+    def test_signed_batches(self):
+        emit_events([OutboxEvent(
+            ticket_id=uuid.uuid4(), event_type='created', created_at=timezone.now() - timedelta(days=1)
+        )])
+        subscription = WebhookSubscription.objects.create(
+            name='crm', url=self.receiver.url, event_types=['created'], batch_size=2, max_concurrency=2
+        )
+        self.receiver.delay = 0.01
+        events = self.emit(5) + self.emit(1, event_type='closed')
+
+        stats = self.deliver()
+        self.assertEqual((stats['requests'], stats['events'], stats['dead_letters']), (3, 5, 0))
+        self.assertLessEqual(self.receiver.max_in_flight, 2)
+        self.assertLessEqual(self.receiver.connections, 2)
+        offsets = sorted(event['offset'] for _, payload, _ in self.receiver.requests for event in payload['events'])
+        self.assertEqual(offsets, [event.id for event in events[:5]])
+
+        headers, payload, body = self.receiver.requests[0]
+        self.assertEqual(payload['subscription'], str(subscription.pk))
+        self.assertEqual(
+            headers['x-webhook-signature'], sign(subscription.secret, headers['x-webhook-timestamp'], body)
+        )
+        self.assertEqual(
+            headers['x-webhook-id'],
+            f"{subscription.pk}:{payload['events'][0]['offset']}-{payload['events'][-1]['offset']}"
+        )
+        self.assertEqual(ConsumerOffset.objects.get(consumer=subscription.consumer).offset, events[4].id)
+
+        self.assertEqual(self.deliver()['requests'], 0)
+
+    def test_retries_and_dead_letters(self):
+        subscription = WebhookSubscription.objects.create(name='chat', url=self.receiver.url, batch_size=10)
+        self.receiver.statuses = [503, 200]
+        self.emit(2)
+        stats = self.deliver(max_attempts=3)
+        self.assertEqual((stats['requests'], stats['failures'], stats['dead_letters']), (1, 1, 0))
+
+        self.receiver.statuses = [500, 500, 500]
+        failed = self.emit(1)
+        with self.assertLogs('apps.Tickets.webhooks', 'WARNING'):
+            stats = self.deliver(max_attempts=3)
+        self.assertEqual((stats['requests'], stats['failures'], stats['dead_letters']), (0, 3, 1))
+        dead_letter = subscription.dead_letters.get()
+        self.assertEqual((dead_letter.attempts, dead_letter.status_code), (3, 500))
+        self.assertEqual(dead_letter.payload['events'][0]['offset'], failed[0].id)
+
+        # Rejected outright, and the endpoint being down, are not retried past the limit
+        self.receiver.statuses = [400]
+        self.emit(1)
+        with self.assertLogs('apps.Tickets.webhooks', 'WARNING'):
+            self.assertEqual(self.deliver(max_attempts=3)['failures'], 1)
+        self.receiver.stop()
+        self.emit(1)
+        with self.assertLogs('apps.Tickets.webhooks', 'WARNING'):
+            self.assertEqual(self.deliver(max_attempts=2)['dead_letters'], 1)
+        self.assertEqual(subscription.dead_letters.count(), 3)
+        self.assertEqual(
+            ConsumerOffset.objects.get(consumer=subscription.consumer).offset, OutboxEvent.objects.last().id
+        )
+
+    def test_registration(self):
+        customer = User.objects.create(email='customer@example.com', username='customer')
+        self.client.force_authenticate(customer)
+        response = self.client.post(reverse('tickets:webhook-list'), {'name': 'crm', 'url': self.receiver.url})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_authenticate(User.objects.create(
+            email='admin@example.com', username='admin', user_type='admin', is_staff=True
+        ))
+        response = self.client.post(
+            reverse('tickets:webhook-list'), {'name': 'crm', 'url': 'ftp://crm.example.com/'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            reverse('tickets:webhook-list'), {'name': 'crm', 'url': self.receiver.url, 'event_types': ['resolved']},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['secret']), 64)
+
+        self.emit(1)
+        self.deliver()
+        subscription = WebhookSubscription.objects.get(pk=response.data['id'])
+        self.assertTrue(ConsumerOffset.objects.filter(consumer=subscription.consumer).exists())
+        response = self.client.delete(reverse('tickets:webhook-detail', args=[subscription.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ConsumerOffset.objects.exists())
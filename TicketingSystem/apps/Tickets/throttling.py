@@ -0,0 +1,167 @@
+"""
+Token-bucket throttling for the endpoints that create tickets, messages and
+attachments.
+
+Every request draws one token from a bucket for the user and one for the
+client IP. Buckets refill continuously at the configured rate, up to a
+capacity of one period's worth of requests. With THROTTLE_REDIS_URL set,
+both buckets are checked and updated by a single Lua script, so one round
+trip decides the request atomically for every web worker. Without Redis the
+buckets live in the default cache and are only consistent within a process.
+"""
+import logging
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS: bucket keys. ARGV: tokens per request, then capacity and refill rate
+# (tokens per second) for every key. Tokens are only taken when every bucket
+# has enough; otherwise returns the seconds until they all will.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+    levels[i] = tokens
+end
+if wait > 0 then
+    return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return {1, '0'}
+"""
+
+_script = None
+_script_lock = threading.Lock()
+_cache_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """
+    Turn a DRF style rate such as '20/hour' into (capacity, tokens per
+    second). None or an empty rate means unlimited.
+    """
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+def get_script():
+    global _script
+    if _script is None:
+        with _script_lock:
+            if _script is None:
+                import redis
+
+                client = redis.Redis.from_url(
+                    settings.THROTTLE_REDIS_URL, socket_timeout=settings.THROTTLE_REDIS_TIMEOUT
+                )
+                _script = client.register_script(TOKEN_BUCKET_SCRIPT)
+    return _script
+
+
+def take_tokens_redis(buckets, cost=1):
+    keys = [key for key, _, _ in buckets]
+    args = [cost]
+    for _, capacity, rate in buckets:
+        args.extend([capacity, rate])
+    allowed, wait = get_script()(keys=keys, args=args)
+    return bool(allowed), float(wait)
+
+
+def take_tokens_cache(buckets, cost=1):
+    """
+    The token bucket algorithm over the default cache. The lock makes it
+    atomic within this process only.
+    """
+    now = timezone.now().timestamp()
+    with _cache_lock:
+        stored = cache.get_many([key for key, _, _ in buckets])
+        levels, wait = {}, 0.0
+        for key, capacity, rate in buckets:
+            tokens, updated = stored.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / rate)
+            levels[key] = tokens
+        if wait > 0:
+            return False, wait
+        for key, capacity, rate in buckets:
+            cache.set(key, (levels[key] - cost, now), timeout=int(capacity / rate) + 1)
+    return True, 0.0
+
+
+def take_tokens(buckets, cost=1):
+    """
+    Take cost tokens from every bucket in [(key, capacity, rate)] if all of
+    them have enough. Returns (allowed, seconds to wait).
+    """
+    if settings.THROTTLE_REDIS_URL:
+        try:
+            return take_tokens_redis(buckets, cost)
+        except Exception:
+            # Rate limiting must not take the API down with it
+            logger.warning('Throttle check failed; allowing the request', exc_info=True)
+            return True, 0.0
+    return take_tokens_cache(buckets, cost)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Per-user and per-IP token buckets for the view's throttle_scope, with
+    limits per user_type from TICKET_THROTTLE_RATES and IP limits from
+    TICKET_THROTTLE_IP_RATES. Safe methods are never throttled.
+    """
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_buckets(self, request, view):
+        scope = view.throttle_scope
+        buckets = []
+        user = request.user
+        if user.is_authenticated:
+            user_rate = parse_rate(settings.TICKET_THROTTLE_RATES.get(user.user_type, {}).get(scope))
+            if user_rate:
+                buckets.append((f'throttle:{scope}:user:{user.pk}', *user_rate))
+        ip_rate = parse_rate(settings.TICKET_THROTTLE_IP_RATES.get(scope))
+        if ip_rate:
+            buckets.append((f'throttle:{scope}:ip:{self.get_ident(request)}', *ip_rate))
+        return buckets
+
+    def allow_request(self, request, view):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return True
+        buckets = self.get_buckets(request, view)
+        if not buckets:
+            return True
+        allowed, wait = take_tokens(buckets)
+        if not allowed:
+            self.retry_after = wait
+        return allowed
+
+    def wait(self):
+        return self.retry_after
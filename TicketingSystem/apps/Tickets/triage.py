@@ -0,0 +1,174 @@
+"""
+Priority triage.
+
+A multinomial naive Bayes classifier over hashed word unigrams and bigrams
+of a ticket's topic and description, trained by train_priority_model on
+resolved and closed tickets and the priority they ended with. New tickets
+get its prediction as suggested_priority; rescore_priorities refreshes the
+suggestions on the open backlog.
+
+The model is a file (TICKET_PRIORITY_MODEL_PATH): a JSON header line, the
+class log-priors as float64 and a features x classes table of log-likelihoods
+as float32. Each process loads it on first use and again whenever the file
+changes. Without a model file, or with one that cannot be read, no
+priority is suggested.
+"""
+import json
+import logging
+import math
+import os
+import re
+import zlib
+from array import array
+from collections import Counter
+from django.conf import settings
+from django.utils import timezone
+from .models import Ticket
+
+MODEL_VERSION = 1
+# Hash buckets features are folded into
+FEATURES = 1 << 18
+CLASSES = [value for value, _ in Ticket.PRIORITY_CHOICES]
+WORD = re.compile(r'\w+')
+# Only the start of long descriptions is read, as for duplicate detection
+DESCRIPTION_LIMIT = 2000
+
+logger = logging.getLogger(__name__)
+
+
+def ticket_text(topic, description):
+    return f'{topic}\n{description[:DESCRIPTION_LIMIT]}'
+
+
+def features(text, size=FEATURES):
+    """
+    Counts of the hashed word unigrams and bigrams of text.
+    """
+    words = WORD.findall(text.lower())
+    tokens = words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+    return Counter(zlib.crc32(token.encode()) % size for token in tokens)
+
+
+class PriorityModel:
+    """
+    Naive Bayes weights: priors[c] is log P(c) and weights[f * len(classes) + c]
+    is log P(feature f | c).
+    """
+
+    def __init__(self, classes, priors, weights, size, metadata=None):
+        self.classes = classes
+        self.priors = priors
+        self.weights = weights
+        self.size = size
+        self.metadata = metadata or {}
+
+    @classmethod
+    def train(cls, samples, size=FEATURES, alpha=1.0):
+        """
+        Fit a model to (text, priority) pairs, with add-alpha smoothing.
+        """
+        width = len(CLASSES)
+        index = {value: position for position, value in enumerate(CLASSES)}
+        counts = array('d', [0.0]) * (size * width)
+        documents = [0] * width
+        totals = [0.0] * width
+        for text, priority in samples:
+            label = index[priority]
+            documents[label] += 1
+            for feature, count in features(text, size).items():
+                counts[feature * width + label] += count
+                totals[label] += count
+
+        total_documents = sum(documents)
+        if not total_documents:
+            raise ValueError('No training samples')
+        # Unseen classes keep a tiny prior instead of log(0)
+        priors = array('d', (math.log((count or 0.5) / total_documents) for count in documents))
+        denominators = [math.log(totals[label] + alpha * size) for label in range(width)]
+        weights = array('f', (
+            math.log(count + alpha) - denominators[position % width] for position, count in enumerate(counts)
+        ))
+        return cls(list(CLASSES), priors, weights, size, {
+            'samples': total_documents,
+            'class_counts': dict(zip(CLASSES, documents)),
+            'trained_at': timezone.now().isoformat(),
+        })
+
+    def scores(self, text):
+        """
+        Unnormalized log-probability of each class for text.
+        """
+        width = len(self.classes)
+        weights = self.weights
+        scores = list(self.priors)
+        for feature, count in features(text, self.size).items():
+            offset = feature * width
+            for label in range(width):
+                scores[label] += count * weights[offset + label]
+        return scores
+
+    def predict(self, text):
+        scores = self.scores(text)
+        return self.classes[max(range(len(scores)), key=scores.__getitem__)]
+
+    def predict_many(self, texts):
+        return [self.predict(text) for text in texts]
+
+    def save(self, path):
+        """
+        Write the model to path atomically, so running processes never load
+        a half-written file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        header = {'version': MODEL_VERSION, 'classes': self.classes, 'size': self.size, **self.metadata}
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as output:
+            output.write(json.dumps(header).encode() + b'\n')
+            output.write(self.priors.tobytes())
+            output.write(self.weights.tobytes())
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as source:
+            header = json.loads(source.readline())
+            if header.pop('version') != MODEL_VERSION:
+                raise ValueError(f'{path} is not a version {MODEL_VERSION} priority model')
+            classes, size = header.pop('classes'), header.pop('size')
+            priors, weights = array('d'), array('f')
+            priors.frombytes(source.read(len(classes) * priors.itemsize))
+            weights.frombytes(source.read(size * len(classes) * weights.itemsize))
+        if len(weights) != size * len(classes):
+            raise ValueError(f'{path} is truncated')
+        return cls(classes, priors, weights, size, header)
+
+
+_loaded = {'key': None, 'model': None}
+
+
+def get_model():
+    """
+    The current priority model, or None if none has been trained or the
+    file cannot be loaded. A bad file is logged once, not on every ticket.
+    """
+    path = settings.TICKET_PRIORITY_MODEL_PATH
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if _loaded['key'] != key:
+        try:
+            model = PriorityModel.load(path)
+        except Exception:
+            # Truncated, corrupt or another version: ticket creation goes on
+            # without suggestions until a good model is written
+            logger.exception('Cannot load the priority model %s', path)
+            model = None
+        _loaded['model'], _loaded['key'] = model, key
+    return _loaded['model']
+
+
+def suggest_priority(topic, description):
+    model = get_model()
+    return model.predict(ticket_text(topic, description)) if model else None
@@ -5,8 +5,16 @@ from .views import (
     TicketMessageListView,
     TicketAttachmentUploadView,
     TicketActivityListView,
+    TicketSuggestionListView,
+    AttachmentStorageReportView,
     MyTicketsView,
     AssignedTicketsView,
+    TicketImportView,
+    OutboxEventListView,
+    ConsumerOffsetView,
+    WebhookSubscriptionListView,
+    WebhookSubscriptionDetailView,
+    WebhookDeadLetterListView,
 )
 
 app_name = 'tickets'
@@ -14,6 +22,7 @@ app_name = 'tickets'
 urlpatterns = [
     # Ticket endpoints
     path('tickets/', TicketListView.as_view(), name='ticket-list'),
+    path('tickets/import/', TicketImportView.as_view(), name='ticket-import'),
     path('tickets/<uuid:pk>/', TicketDetailView.as_view(), name='ticket-detail'),
     
     # Ticket message endpoints
@@ -22,11 +31,26 @@ urlpatterns = [
     # Ticket attachment endpoints
     path('tickets/<uuid:ticket_id>/attachments/', TicketAttachmentUploadView.as_view(), name='ticket-attachments'),
     
+    # Attachment storage used per ticket and per user
+    path('attachments/storage/', AttachmentStorageReportView.as_view(), name='attachment-storage'),
+    
     # Ticket activity endpoints
     path('tickets/<uuid:ticket_id>/activities/', TicketActivityListView.as_view(), name='ticket-activities'),
+
+    # Suggested replies from similar resolved tickets
+    path('tickets/<uuid:ticket_id>/suggestions/', TicketSuggestionListView.as_view(), name='ticket-suggestions'),
     
     # User-specific ticket endpoints
     path('my-tickets/', MyTicketsView.as_view(), name='my-tickets'),
     path('assigned-tickets/', AssignedTicketsView.as_view(), name='assigned-tickets'),
+
+    # Ticket event outbox
+    path('events/', OutboxEventListView.as_view(), name='outbox-events'),
+    path('events/consumers/<str:consumer>/', ConsumerOffsetView.as_view(), name='consumer-offset'),
+
+    # Webhook subscriptions
+    path('webhooks/', WebhookSubscriptionListView.as_view(), name='webhook-list'),
+    path('webhooks/<uuid:pk>/', WebhookSubscriptionDetailView.as_view(), name='webhook-detail'),
+    path('webhooks/<uuid:pk>/dead-letters/', WebhookDeadLetterListView.as_view(), name='webhook-dead-letters'),
 ]
 
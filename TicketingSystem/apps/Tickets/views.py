@@ -3,18 +3,85 @@ from rest_framework.response import Response
 from rest_framework import status, permissions
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
 from django.utils import timezone
-from .models import Ticket, TicketMessage, TicketAttachment, TicketActivity
+from itertools import islice
+from uuid import UUID
+from TicketingSystem.query_budget import QueryBudget
+from apps.Users.permissions import IsAdmin
+from .events import (
+    commit_offset,
+    emit_events,
+    event_for_activity,
+    get_offset,
+    read_events,
+    record_activities,
+    record_activity,
+)
+from .idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
+from .importer import CheckpointConflict, TicketImporter
+from .models import (
+    Ticket, TicketMessage, TicketAttachment, TicketActivity, TicketDeletionRecord, ConsumerOffset, WebhookSubscription,
+    WebhookDeadLetter,
+)
+from .pagination import (
+    InvalidCursor,
+    after_position,
+    before_position,
+    build_page_url,
+    decode_cursor,
+    encode_cursor,
+    get_page_size,
+)
+from .partitions import iter_archived_rows
+from .quotas import attachment_quota, charge
+from .throttling import TokenBucketThrottle
 from .serializers import (
     TicketListSerializer,
     TicketDetailSerializer,
     TicketCreateSerializer,
+    TicketCreatedSerializer,
     TicketUpdateSerializer,
     TicketMessageSerializer,
+    TicketMessagePageSerializer,
     TicketMessageCreateSerializer,
     TicketAttachmentSerializer,
     TicketActivitySerializer,
+    TicketActivityPageSerializer,
+    TicketImportResultSerializer,
+    OutboxEventPageSerializer,
+    ConsumerOffsetSerializer,
+    WebhookSubscriptionSerializer,
+    WebhookDeadLetterPageSerializer,
+    TicketSuggestionSerializer,
+    AttachmentStorageReportSerializer,
 )
+from .suggestions import suggest
+from .webhooks import delete_subscriptions
+
+User = get_user_model()
+
+
+def get_visible_message(user, ticket_id, message_id, fields=None):
+    """
+    Fetch a message on a ticket user may see, with the ticket joined into the
+    same query. Raises Ticket.DoesNotExist when the ticket is missing or not
+    visible and TicketMessage.DoesNotExist when it has no such message.
+    """
+    messages = TicketMessage.objects.visible_to(user).select_related('ticket')
+    if fields:
+        messages = messages.only(*fields, 'ticket')
+    try:
+        return messages.get(pk=message_id, ticket_id=ticket_id)
+    except (TicketMessage.DoesNotExist, ValueError, ValidationError):
+        # Only a failed lookup pays for telling the two cases apart
+        if not Ticket.objects.visible_to(user).filter(pk=ticket_id).exists():
+            raise Ticket.DoesNotExist
+        raise TicketMessage.DoesNotExist
 
 
 class TicketListView(APIView):
@@ -22,6 +89,9 @@ class TicketListView(APIView):
     List all tickets or create a new ticket.
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': QueryBudget(2), 'post': QueryBudget(16)}
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'ticket_create'
 
     @extend_schema(
         operation_id='list_tickets',
@@ -48,12 +118,8 @@ class TicketListView(APIView):
         }
     )
     def get(self, request):
-        # Get base queryset
-        if request.user.is_staff:
-            tickets = Ticket.objects.all()
-        else:
-            tickets = Ticket.objects.filter(user=request.user)
-        
+        tickets = Ticket.objects.visible_to(request.user).for_list()
+
         # Apply filters
         status_filter = request.query_params.get('status', None)
         if status_filter:
@@ -69,28 +135,37 @@ class TicketListView(APIView):
     @extend_schema(
         operation_id='create_ticket',
         summary='Create New Ticket',
-        description='Create a new support ticket.',
+        description=(
+            'Create a new support ticket. `duplicate_candidates` lists recent open tickets the '
+            'user can see that look like the same issue, most similar first.'
+        ),
         request=TicketCreateSerializer,
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
         responses={
-            201: TicketDetailSerializer,
+            201: TicketCreatedSerializer,
             400: {'description': 'Bad request'},
+            409: {'description': 'A request with the same Idempotency-Key is in progress'},
+            422: {'description': 'Idempotency-Key was used for a different request'},
+            429: {'description': 'Too many requests; see Retry-After'},
         }
     )
+    @idempotent
     def post(self, request):
         serializer = TicketCreateSerializer(data=request.data)
         if serializer.is_valid():
-            ticket = serializer.save(user=request.user)
-            
-            # Create activity log for ticket creation
-            TicketActivity.objects.create(
-                ticket=ticket,
-                action='created',
-                performed_by=request.user,
-                details=f'Ticket created with topic: {ticket.topic}'
-            )
-            
-            detail_serializer = TicketDetailSerializer(ticket)
-            return Response(detail_serializer.data, status=status.HTTP_201_CREATED)
+            with transaction.atomic():
+                ticket = serializer.save(user=request.user)
+
+                # Create activity log for ticket creation
+                record_activity(
+                    ticket, 'created', request.user, f'Ticket created with topic: {ticket.topic}',
+                    topic=ticket.topic, status=ticket.status, priority=ticket.priority,
+                    user=ticket.user_id, order=ticket.order_id, assigned_to=ticket.assigned_to_id
+                )
+
+            created = Ticket.objects.for_detail().get(pk=ticket.pk)
+            created.duplicate_candidates = ticket.duplicate_candidates
+            return Response(TicketCreatedSerializer(created).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -99,6 +174,9 @@ class TicketDetailView(APIView):
     Retrieve, update or delete a ticket.
     """
     permission_classes = [permissions.IsAuthenticated]
+    # delete only marks the ticket; the cascade through messages, activity,
+    # fingerprints and suggestion postings runs in purge_deleted_tickets
+    query_budget = {'get': QueryBudget(6), 'put': QueryBudget(11), 'delete': QueryBudget(6)}
 
     @extend_schema(
         operation_id='get_ticket',
@@ -111,10 +189,7 @@ class TicketDetailView(APIView):
     )
     def get(self, request, pk):
         try:
-            if request.user.is_staff:
-                ticket = Ticket.objects.get(pk=pk)
-            else:
-                ticket = Ticket.objects.get(pk=pk, user=request.user)
+            ticket = Ticket.objects.visible_to(request.user).for_detail().get(pk=pk)
             serializer = TicketDetailSerializer(ticket)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Ticket.DoesNotExist:
@@ -136,11 +211,8 @@ class TicketDetailView(APIView):
     )
     def put(self, request, pk):
         try:
-            if request.user.is_staff:
-                ticket = Ticket.objects.get(pk=pk)
-            else:
-                ticket = Ticket.objects.get(pk=pk, user=request.user)
-            
+            ticket = Ticket.objects.visible_to(request.user).select_related('assigned_to').get(pk=pk)
+
             # Store old values for activity log
             old_status = ticket.status
             old_priority = ticket.priority
@@ -148,46 +220,42 @@ class TicketDetailView(APIView):
             
             serializer = TicketUpdateSerializer(ticket, data=request.data, partial=True)
             if serializer.is_valid():
-                updated_ticket = serializer.save()
-                
-                # Create activity logs for changes
-                if old_status != updated_ticket.status:
-                    TicketActivity.objects.create(
-                        ticket=updated_ticket,
-                        action='status_changed',
-                        performed_by=request.user,
-                        details=f'Status changed from {old_status} to {updated_ticket.status}'
-                    )
-                    
-                    # Mark resolved time if status changed to resolved
-                    if updated_ticket.status == 'resolved' and not updated_ticket.resolved_at:
-                        updated_ticket.resolved_at = timezone.now()
-                        updated_ticket.save()
-                        TicketActivity.objects.create(
-                            ticket=updated_ticket,
-                            action='resolved',
-                            performed_by=request.user,
-                            details='Ticket marked as resolved'
-                        )
-                
-                if old_priority != updated_ticket.priority:
-                    TicketActivity.objects.create(
-                        ticket=updated_ticket,
-                        action='priority_changed',
-                        performed_by=request.user,
-                        details=f'Priority changed from {old_priority} to {updated_ticket.priority}'
-                    )
-                
-                if old_assigned_to != updated_ticket.assigned_to:
-                    assigned_to_name = updated_ticket.assigned_to.username if updated_ticket.assigned_to else 'Unassigned'
-                    TicketActivity.objects.create(
-                        ticket=updated_ticket,
-                        action='assigned_to_changed',
-                        performed_by=request.user,
-                        details=f'Ticket assigned to {assigned_to_name}'
-                    )
-                
-                detail_serializer = TicketDetailSerializer(updated_ticket)
+                with transaction.atomic():
+                    updated_ticket = serializer.save()
+
+                    # Activity log entries for the changes
+                    changes = []
+                    if old_status != updated_ticket.status:
+                        changes.append((
+                            'status_changed', f'Status changed from {old_status} to {updated_ticket.status}',
+                            {'status': [old_status, updated_ticket.status]}
+                        ))
+
+                        # Mark resolved time if status changed to resolved
+                        if updated_ticket.status == 'resolved' and not updated_ticket.resolved_at:
+                            updated_ticket.resolved_at = timezone.now()
+                            updated_ticket.save()
+                            changes.append(('resolved', 'Ticket marked as resolved', {}))
+
+                    if old_priority != updated_ticket.priority:
+                        changes.append((
+                            'priority_changed', f'Priority changed from {old_priority} to {updated_ticket.priority}',
+                            {'priority': [old_priority, updated_ticket.priority]}
+                        ))
+
+                    if old_assigned_to != updated_ticket.assigned_to:
+                        assigned_to_name = updated_ticket.assigned_to.username if updated_ticket.assigned_to else 'Unassigned'
+                        changes.append((
+                            'assigned_to_changed', f'Ticket assigned to {assigned_to_name}',
+                            {'assigned_to': [
+                                old_assigned_to.pk if old_assigned_to else None, updated_ticket.assigned_to_id
+                            ]}
+                        ))
+
+                    if changes:
+                        record_activities(updated_ticket, request.user, changes)
+
+                detail_serializer = TicketDetailSerializer(Ticket.objects.for_detail().get(pk=updated_ticket.pk))
                 return Response(detail_serializer.data, status=status.HTTP_200_OK)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Ticket.DoesNotExist:
@@ -199,7 +267,10 @@ class TicketDetailView(APIView):
     @extend_schema(
         operation_id='delete_ticket',
         summary='Delete Ticket',
-        description='Delete a ticket (staff only).',
+        description=(
+            'Delete a ticket (staff only). The ticket disappears at once; it and everything on it are '
+            'removed in the background by purge_deleted_tickets.'
+        ),
         responses={
             200: {'description': 'Ticket deleted successfully'},
             403: {'description': 'Permission denied'},
@@ -214,17 +285,26 @@ class TicketDetailView(APIView):
             )
         
         try:
-            ticket = Ticket.objects.get(pk=pk)
-            
-            # Create activity log before deletion
-            TicketActivity.objects.create(
-                ticket=ticket,
+            ticket = Ticket.objects.visible_to(request.user).get(pk=pk)
+
+            # The activity row would be purged along with the ticket, so the
+            # deletion is recorded in the outbox and a TicketDeletionRecord
+            now = timezone.now()
+            activity = TicketActivity(
+                ticket_id=ticket.pk,
                 action='deleted',
                 performed_by=request.user,
-                details=f'Ticket deleted: {ticket.topic}'
+                details=f'Ticket deleted: {ticket.topic}',
+                timestamp=now
             )
-            
-            ticket.delete()
+            with transaction.atomic():
+                ticket.deleted_at = now
+                ticket.save(update_fields=['deleted_at'])
+                TicketDeletionRecord.objects.create(
+                    ticket_id=ticket.pk, topic=ticket.topic, owner_id=ticket.user_id, deleted_by=request.user,
+                    deleted_at=now
+                )
+                emit_events([event_for_activity(activity, topic=ticket.topic)])
             return Response(
                 {"message": "Ticket deleted successfully"},
                 status=status.HTTP_200_OK
@@ -241,65 +321,160 @@ class TicketMessageListView(APIView):
     List all messages for a ticket or add a new message.
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': QueryBudget(6, paginated=True), 'post': QueryBudget(9)}
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'message_create'
 
     @extend_schema(
         operation_id='list_ticket_messages',
         summary='List Ticket Messages',
-        description='Get all messages for a specific ticket.',
+        description=(
+            'Get a page of messages for a specific ticket in chronological order. '
+            'Without parameters the newest page is returned. Use `before`/`after` '
+            'with the cursors from `previous`/`next` to move through the thread, '
+            'or `around` with a message id to open the thread at that message.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='before',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Cursor; return the messages immediately older than it',
+                required=False
+            ),
+            OpenApiParameter(
+                name='after',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Cursor; return the messages immediately newer than it',
+                required=False
+            ),
+            OpenApiParameter(
+                name='around',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Message id; return a page centered on that message',
+                required=False
+            ),
+            OpenApiParameter(
+                name='page_size',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Number of messages per page',
+                required=False
+            ),
+        ],
         responses={
-            200: TicketMessageSerializer(many=True),
-            404: {'description': 'Ticket not found'},
+            200: TicketMessagePageSerializer,
+            400: {'description': 'Invalid cursor'},
+            404: {'description': 'Ticket or anchor message not found'},
         }
     )
     def get(self, request, ticket_id):
         try:
-            if request.user.is_staff:
-                ticket = Ticket.objects.get(pk=ticket_id)
+            before = decode_cursor(request.query_params.get('before'))
+            after = decode_cursor(request.query_params.get('after'))
+        except InvalidCursor:
+            return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+        around = request.query_params.get('around')
+        try:
+            if around:
+                # The anchor and the permission check come back in one query
+                anchor = get_visible_message(request.user, ticket_id, around, fields=['created_at'])
+                ticket = anchor.ticket
             else:
-                ticket = Ticket.objects.get(pk=ticket_id, user=request.user)
-            
-            messages = ticket.messages.all().order_by('created_at')
-            serializer = TicketMessageSerializer(messages, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+                ticket = Ticket.objects.visible_to(request.user).get(pk=ticket_id)
         except Ticket.DoesNotExist:
             return Response(
                 {"error": "Ticket not found or you don't have permission to access it"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        except TicketMessage.DoesNotExist:
+            return Response({"error": "Message not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        page_size = get_page_size(
+            request, settings.TICKET_MESSAGE_PAGE_SIZE, settings.TICKET_MESSAGE_MAX_PAGE_SIZE
+        )
+        messages = ticket.messages.select_related('user')
+        older = messages.order_by('-created_at', '-id')
+        newer = messages.order_by('created_at', 'id')
+
+        if around:
+            position = (anchor.created_at, anchor.id)
+            older_count = page_size // 2
+            head = list(older.filter(before_position('created_at', position))[:older_count + 1])
+            tail = list(newer.filter(after_position('created_at', position) | Q(pk=anchor.id))[:page_size - older_count + 1])
+            has_older, has_newer = len(head) > older_count, len(tail) > page_size - older_count
+            page = head[:older_count][::-1] + tail[:page_size - older_count]
+        elif after:
+            page = list(newer.filter(after_position('created_at', after))[:page_size + 1])
+            has_older, has_newer = True, len(page) > page_size
+            page = page[:page_size]
+        else:
+            if before:
+                older = older.filter(before_position('created_at', before))
+            page = list(older[:page_size + 1])
+            has_older, has_newer = len(page) > page_size, before is not None
+            page = page[:page_size][::-1]
+
+        # One attachment query for the page, even when it was read in two halves
+        prefetch_related_objects(
+            page, Prefetch('attachments', queryset=TicketAttachment.objects.select_related('uploaded_by'))
+        )
+
+        previous_url = next_url = None
+        if page and has_older:
+            previous_url = build_page_url(
+                request, 'before', encode_cursor(page[0].created_at, page[0].id), clear=('after', 'around')
+            )
+        if page and has_newer:
+            next_url = build_page_url(
+                request, 'after', encode_cursor(page[-1].created_at, page[-1].id), clear=('before', 'around')
+            )
+
+        serializer = TicketMessageSerializer(page, many=True)
+        return Response(
+            {'previous': previous_url, 'next': next_url, 'results': serializer.data},
+            status=status.HTTP_200_OK
+        )
 
     @extend_schema(
         operation_id='create_ticket_message',
         summary='Add Message to Ticket',
         description='Add a new message to a ticket.',
         request=TicketMessageCreateSerializer,
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
         responses={
             201: TicketMessageSerializer,
             400: {'description': 'Bad request'},
             404: {'description': 'Ticket not found'},
+            409: {'description': 'A request with the same Idempotency-Key is in progress'},
+            422: {'description': 'Idempotency-Key was used for a different request'},
+            429: {'description': 'Too many requests; see Retry-After'},
         }
     )
+    @idempotent
     def post(self, request, ticket_id):
         try:
-            if request.user.is_staff:
-                ticket = Ticket.objects.get(pk=ticket_id)
-            else:
-                ticket = Ticket.objects.get(pk=ticket_id, user=request.user)
-            
-            serializer = TicketMessageCreateSerializer(data={'ticket': ticket.id, 'message': request.data.get('message')})
+            ticket = Ticket.objects.visible_to(request.user).get(pk=ticket_id)
+
+            serializer = TicketMessageCreateSerializer(data={'message': request.data.get('message')})
             if serializer.is_valid():
-                message = serializer.save(
-                    user=request.user,
-                    is_staff_message=request.user.is_staff
-                )
-                
-                # Create activity log
-                TicketActivity.objects.create(
-                    ticket=ticket,
-                    action='message_added',
-                    performed_by=request.user,
-                    details=f'{"Staff" if request.user.is_staff else "User"} added a message'
-                )
-                
+                with transaction.atomic():
+                    message = serializer.save(
+                        ticket=ticket,
+                        user=request.user,
+                        is_staff_message=request.user.is_staff
+                    )
+
+                    # Create activity log
+                    record_activity(
+                        ticket, 'message_added', request.user,
+                        f'{"Staff" if request.user.is_staff else "User"} added a message',
+                        message_id=message.pk
+                    )
+
                 detail_serializer = TicketMessageSerializer(message)
                 return Response(detail_serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -315,6 +490,9 @@ class TicketAttachmentUploadView(APIView):
     Upload an attachment to a ticket message.
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'post': QueryBudget(12)}
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'attachment_upload'
 
     @extend_schema(
         operation_id='upload_ticket_attachment',
@@ -329,51 +507,48 @@ class TicketAttachmentUploadView(APIView):
                 }
             }
         },
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
         responses={
             201: TicketAttachmentSerializer,
             400: {'description': 'Bad request'},
             404: {'description': 'Message not found'},
+            409: {'description': 'A request with the same Idempotency-Key is in progress'},
+            413: {'description': 'Attachment storage quota of the user or ticket exceeded'},
+            422: {'description': 'Idempotency-Key was used for a different request'},
+            429: {'description': 'Too many requests; see Retry-After'},
         }
     )
+    @attachment_quota
+    @idempotent
     def post(self, request, ticket_id):
+        message_id = request.data.get('message_id')
+        file = request.FILES.get('file')
+
+        if not message_id or not file:
+            return Response(
+                {"error": "Both message_id and file are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         try:
-            if request.user.is_staff:
-                ticket = Ticket.objects.get(pk=ticket_id)
-            else:
-                ticket = Ticket.objects.get(pk=ticket_id, user=request.user)
-            
-            message_id = request.data.get('message_id')
-            file = request.FILES.get('file')
-            
-            if not message_id or not file:
-                return Response(
-                    {"error": "Both message_id and file are required"},
-                    status=status.HTTP_400_BAD_REQUEST
+            message = get_visible_message(request.user, ticket_id, message_id)
+            ticket = message.ticket
+
+            with transaction.atomic():
+                attachment = TicketAttachment.objects.create(
+                    ticket=ticket,
+                    message=message,
+                    file=file,
+                    uploaded_by=request.user
                 )
-            
-            try:
-                message = TicketMessage.objects.get(pk=message_id, ticket=ticket)
-            except TicketMessage.DoesNotExist:
-                return Response(
-                    {"error": "Message not found"},
-                    status=status.HTTP_404_NOT_FOUND
+                charge([attachment])
+
+                # Create activity log
+                record_activity(
+                    ticket, 'attachment_added', request.user, f'Attachment added: {attachment.filename}',
+                    attachment_id=attachment.pk, message_id=message.pk
                 )
             
-            attachment = TicketAttachment.objects.create(
-                ticket=ticket,
-                message=message,
-                file=file,
-                uploaded_by=request.user
-            )
-            
-            # Create activity log
-            TicketActivity.objects.create(
-                ticket=ticket,
-                action='attachment_added',
-                performed_by=request.user,
-                details=f'Attachment added: {attachment.filename}'
-            )
-            
             serializer = TicketAttachmentSerializer(attachment, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Ticket.DoesNotExist:
@@ -381,6 +556,11 @@ class TicketAttachmentUploadView(APIView):
                 {"error": "Ticket not found or you don't have permission to access it"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        except TicketMessage.DoesNotExist:
+            return Response(
+                {"error": "Message not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
 
 class TicketActivityListView(APIView):
@@ -388,38 +568,190 @@ class TicketActivityListView(APIView):
     List all activities for a ticket.
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': QueryBudget(4, paginated=True)}
 
     @extend_schema(
         operation_id='list_ticket_activities',
         summary='List Ticket Activities',
-        description='Get all activity logs for a specific ticket.',
+        description=(
+            'Get the activity log for a specific ticket, newest first. '
+            'Results are cursor-paginated; follow `next` to load older entries, '
+            'including entries that have been moved to the archive.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='cursor',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Opaque cursor taken from the `next` link of a previous page',
+                required=False
+            ),
+            OpenApiParameter(
+                name='page_size',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Number of activities per page',
+                required=False
+            ),
+        ],
         responses={
-            200: TicketActivitySerializer(many=True),
+            200: TicketActivityPageSerializer,
+            400: {'description': 'Invalid cursor'},
             404: {'description': 'Ticket not found'},
         }
     )
     def get(self, request, ticket_id):
         try:
-            if request.user.is_staff:
-                ticket = Ticket.objects.get(pk=ticket_id)
-            else:
-                ticket = Ticket.objects.get(pk=ticket_id, user=request.user)
-            
-            activities = ticket.activities.all()
-            serializer = TicketActivitySerializer(activities, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            ticket = Ticket.objects.visible_to(request.user).get(pk=ticket_id)
+        except Ticket.DoesNotExist:
+            return Response(
+                {"error": "Ticket not found or you don't have permission to access it"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            cursor = decode_cursor(request.query_params.get('cursor'))
+        except InvalidCursor:
+            return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+        page_size = get_page_size(
+            request, settings.TICKET_ACTIVITY_PAGE_SIZE, settings.TICKET_ACTIVITY_MAX_PAGE_SIZE
+        )
+        activities = ticket.activities.select_related('performed_by').order_by('-timestamp', '-id')
+        if cursor:
+            activities = activities.filter(before_position('timestamp', cursor))
+        page = list(activities[:page_size + 1])
+
+        # Older history may have been archived out of the database
+        if len(page) <= page_size:
+            position = (page[-1].timestamp, page[-1].id) if page else cursor
+            page.extend(self.get_archived_activities(ticket, position, page_size + 1 - len(page)))
+
+        next_url = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            next_url = build_page_url(request, 'cursor', encode_cursor(page[-1].timestamp, page[-1].id))
+
+        serializer = TicketActivitySerializer(page, many=True)
+        return Response({'next': next_url, 'results': serializer.data}, status=status.HTTP_200_OK)
+
+    def get_archived_activities(self, ticket, before, limit):
+        """
+        Load up to limit archived activities older than before as unsaved
+        TicketActivity instances.
+        """
+        rows = list(islice(iter_archived_rows(ticket, before), limit))
+        if not rows:
+            return []
+
+        users = User.objects.in_bulk({row['performed_by_id'] for row in rows})
+        activities = []
+        for row in rows:
+            activity = TicketActivity(
+                id=row['id'],
+                ticket=ticket,
+                action=row['action'],
+                details=row['details'],
+                timestamp=row['timestamp'],
+            )
+            activity.performed_by = users.get(UUID(row['performed_by_id']))
+            activities.append(activity)
+        return activities
+
+
+class TicketSuggestionListView(APIView):
+    """
+    Suggest replies to a ticket from similar resolved tickets (staff only).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': QueryBudget(6)}
+
+    @extend_schema(
+        operation_id='list_ticket_suggestions',
+        summary='Suggest Replies',
+        description=(
+            'Resolved tickets most similar to this one, best first, with the latest replies '
+            'staff wrote on them.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='limit',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Number of similar tickets to return',
+                required=False
+            ),
+        ],
+        responses={
+            200: TicketSuggestionSerializer(many=True),
+            403: {'description': 'Permission denied'},
+            404: {'description': 'Ticket not found'},
+        }
+    )
+    def get(self, request, ticket_id):
+        if not request.user.is_staff:
+            return Response(
+                {"error": "Only staff members can see suggested replies"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        try:
+            ticket = Ticket.objects.visible_to(request.user).only('id', 'topic', 'description').get(pk=ticket_id)
         except Ticket.DoesNotExist:
             return Response(
                 {"error": "Ticket not found or you don't have permission to access it"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        limit = get_page_size(request, settings.TICKET_SUGGESTION_LIMIT, settings.TICKET_SUGGESTION_MAX_LIMIT, 'limit')
+        serializer = TicketSuggestionSerializer(suggest(ticket, request.user, limit), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class AttachmentStorageReportView(APIView):
+    """
+    Tickets and users using the most attachment storage (admin only).
+    """
+    permission_classes = [IsAdmin]
+    query_budget = {'get': QueryBudget(3)}
+
+    @extend_schema(
+        operation_id='attachment_storage_report',
+        summary='Attachment Storage Report',
+        description=(
+            'The tickets holding the most attachment storage and the users who uploaded the '
+            'most, largest first, from the totals kept as attachments are added and deleted.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='limit',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Number of tickets and of users to return',
+                required=False
+            ),
+        ],
+        responses={
+            200: AttachmentStorageReportSerializer,
+            403: {'description': 'Permission denied - admins only'},
+        }
+    )
+    def get(self, request):
+        limit = get_page_size(
+            request, settings.ATTACHMENT_STORAGE_REPORT_LIMIT, settings.ATTACHMENT_STORAGE_REPORT_MAX_LIMIT, 'limit'
+        )
+        # attachment_bytes > 0 matches the partial indexes the top rows are read from
+        tickets = Ticket.objects.filter(attachment_bytes__gt=0).select_related('user').order_by('-attachment_bytes')
+        users = User.objects.filter(attachment_bytes__gt=0).order_by('-attachment_bytes')
+        serializer = AttachmentStorageReportSerializer({'tickets': tickets[:limit], 'users': users[:limit]})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 class MyTicketsView(APIView):
     """
     List all tickets for the authenticated user.
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': QueryBudget(2)}
 
     @extend_schema(
         operation_id='list_my_tickets',
@@ -430,7 +762,7 @@ class MyTicketsView(APIView):
         }
     )
     def get(self, request):
-        tickets = Ticket.objects.filter(user=request.user)
+        tickets = Ticket.objects.filter(user=request.user).for_list()
         serializer = TicketListSerializer(tickets, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -440,6 +772,7 @@ class AssignedTicketsView(APIView):
     List all tickets assigned to the authenticated staff member.
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': QueryBudget(2)}
 
     @extend_schema(
         operation_id='list_assigned_tickets',
@@ -457,6 +790,348 @@ class AssignedTicketsView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        tickets = Ticket.objects.filter(assigned_to=request.user)
+        tickets = Ticket.objects.filter(assigned_to=request.user).for_list()
         serializer = TicketListSerializer(tickets, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class TicketImportView(APIView):
+    """
+    Import tickets from a legacy helpdesk export (admin only).
+    """
+    permission_classes = [IsAdmin]
+    # For a stream that fits in one batch; each further batch adds about as many
+    query_budget = {'post': QueryBudget(14)}
+
+    @extend_schema(
+        operation_id='import_tickets',
+        summary='Import Tickets',
+        description=(
+            'Stream an NDJSON export of tickets, one ticket per line with its messages and '
+            'attachment metadata nested, into the database in batches. Progress is checkpointed '
+            'under `source`: if the upload is interrupted, send the same stream again and the '
+            'lines already imported are skipped. Use `manage.py import_tickets` for very large exports.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='source',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Name of the stream the checkpoint is kept under',
+                required=True
+            ),
+            OpenApiParameter(
+                name='create_users',
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                description='Create unknown ticket requesters as customers',
+                required=False
+            ),
+        ],
+        request={'application/x-ndjson': {'type': 'string', 'format': 'binary'}},
+        responses={
+            200: TicketImportResultSerializer,
+            400: {'description': 'Missing source or empty body'},
+            403: {'description': 'Permission denied - admins only'},
+            409: {'description': 'The same source is being imported by another request'},
+        }
+    )
+    def post(self, request):
+        source = request.query_params.get('source', '').strip()
+        if not source:
+            return Response({"error": "The source parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if request.stream is None:
+            return Response({"error": "The request body is empty"}, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = TicketImporter(
+            source,
+            create_users=request.query_params.get('create_users', '').lower() in ('1', 'true', 'yes'),
+        )
+        try:
+            checkpoint = importer.run(request.stream)
+        except CheckpointConflict as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+
+        serializer = TicketImportResultSerializer({'checkpoint': checkpoint, 'errors': importer.errors})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class OutboxEventListView(APIView):
+    """
+    Read ticket events from the outbox by offset (admin only).
+    """
+    permission_classes = [IsAdmin]
+    query_budget = {'get': QueryBudget(2, paginated=True)}
+
+    @extend_schema(
+        operation_id='list_outbox_events',
+        summary='List Ticket Events',
+        description=(
+            'Ticket events (creation, status, priority and assignee changes, messages, '
+            'attachments and deletions) in the order they were committed. Pass the `next_offset` '
+            'of the previous page as `after` to continue, or name a `consumer` to start after the '
+            'offset it last committed.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='after',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Return events with a greater offset',
+                required=False
+            ),
+            OpenApiParameter(
+                name='consumer',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description="Start after this consumer's committed offset when `after` is not given",
+                required=False
+            ),
+            OpenApiParameter(
+                name='type',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Comma-separated event types to include',
+                required=False
+            ),
+            OpenApiParameter(
+                name='page_size',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Number of events per page',
+                required=False
+            ),
+        ],
+        responses={
+            200: OutboxEventPageSerializer,
+            400: {'description': 'Invalid offset'},
+            403: {'description': 'Permission denied - admins only'},
+        }
+    )
+    def get(self, request):
+        after = request.query_params.get('after')
+        consumer = request.query_params.get('consumer')
+        try:
+            after = int(after) if after is not None else (get_offset(consumer) if consumer else 0)
+        except ValueError:
+            return Response({"error": "after must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        event_types = [value for value in request.query_params.get('type', '').split(',') if value]
+        page_size = get_page_size(request, settings.OUTBOX_PAGE_SIZE, settings.OUTBOX_MAX_PAGE_SIZE)
+        events = read_events(after, page_size + 1, event_types)
+
+        next_url = None
+        if len(events) > page_size:
+            events = events[:page_size]
+            next_url = build_page_url(request, 'after', events[-1].id)
+        serializer = OutboxEventPageSerializer({
+            'next_offset': events[-1].id if events else after,
+            'next': next_url,
+            'events': events,
+        })
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class ConsumerOffsetView(APIView):
+    """
+    Read or commit the offset of an outbox consumer (admin only).
+    """
+    permission_classes = [IsAdmin]
+    query_budget = {'get': QueryBudget(2), 'put': QueryBudget(4)}
+
+    @extend_schema(
+        operation_id='get_consumer_offset',
+        summary='Get Consumer Offset',
+        description='The offset of the last event the consumer has committed (0 if none).',
+        responses={
+            200: ConsumerOffsetSerializer,
+            403: {'description': 'Permission denied - admins only'},
+        }
+    )
+    def get(self, request, consumer):
+        offset = ConsumerOffset.objects.filter(consumer=consumer).first() or ConsumerOffset(consumer=consumer)
+        return Response(ConsumerOffsetSerializer(offset).data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        operation_id='commit_consumer_offset',
+        summary='Commit Consumer Offset',
+        description=(
+            'Record that the consumer has processed every event up to `offset`. '
+            'Committed offsets never move backwards.'
+        ),
+        request=ConsumerOffsetSerializer,
+        responses={
+            200: ConsumerOffsetSerializer,
+            400: {'description': 'Bad request'},
+            403: {'description': 'Permission denied - admins only'},
+        }
+    )
+    def put(self, request, consumer):
+        serializer = ConsumerOffsetSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if len(consumer) > ConsumerOffset._meta.get_field('consumer').max_length:
+            return Response({"error": "Consumer name is too long"}, status=status.HTTP_400_BAD_REQUEST)
+
+        offset = commit_offset(consumer, serializer.validated_data['offset'])
+        return Response(ConsumerOffsetSerializer(offset).data, status=status.HTTP_200_OK)
+
+
+class WebhookSubscriptionListView(APIView):
+    """
+    List webhook subscriptions or register a new one (admin only).
+    """
+    permission_classes = [IsAdmin]
+    query_budget = {'get': QueryBudget(2), 'post': QueryBudget(2)}
+
+    @extend_schema(
+        operation_id='list_webhooks',
+        summary='List Webhooks',
+        description='List every webhook subscription.',
+        responses={
+            200: WebhookSubscriptionSerializer(many=True),
+            403: {'description': 'Permission denied - admins only'},
+        }
+    )
+    def get(self, request):
+        subscriptions = WebhookSubscription.objects.all()
+        return Response(WebhookSubscriptionSerializer(subscriptions, many=True).data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        operation_id='create_webhook',
+        summary='Create Webhook',
+        description=(
+            'Register an endpoint for ticket events. It receives the events recorded from now on, '
+            'signed with the returned `secret`.'
+        ),
+        request=WebhookSubscriptionSerializer,
+        responses={
+            201: WebhookSubscriptionSerializer,
+            400: {'description': 'Bad request'},
+            403: {'description': 'Permission denied - admins only'},
+        }
+    )
+    def post(self, request):
+        serializer = WebhookSubscriptionSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save(created_by=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class WebhookSubscriptionDetailView(APIView):
+    """
+    Retrieve, update or delete a webhook subscription (admin only).
+    """
+    permission_classes = [IsAdmin]
+    query_budget = {'get': QueryBudget(2), 'put': QueryBudget(3), 'delete': QueryBudget(6)}
+
+    @extend_schema(
+        operation_id='get_webhook',
+        summary='Get Webhook',
+        responses={
+            200: WebhookSubscriptionSerializer,
+            403: {'description': 'Permission denied - admins only'},
+            404: {'description': 'Webhook not found'},
+        }
+    )
+    def get(self, request, pk):
+        try:
+            subscription = WebhookSubscription.objects.get(pk=pk)
+        except WebhookSubscription.DoesNotExist:
+            return Response({"error": "Webhook not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(WebhookSubscriptionSerializer(subscription).data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        operation_id='update_webhook',
+        summary='Update Webhook',
+        description='Update a webhook subscription. Set `is_active` to false to pause delivery.',
+        request=WebhookSubscriptionSerializer,
+        responses={
+            200: WebhookSubscriptionSerializer,
+            400: {'description': 'Bad request'},
+            403: {'description': 'Permission denied - admins only'},
+            404: {'description': 'Webhook not found'},
+        }
+    )
+    def put(self, request, pk):
+        try:
+            subscription = WebhookSubscription.objects.get(pk=pk)
+        except WebhookSubscription.DoesNotExist:
+            return Response({"error": "Webhook not found"}, status=status.HTTP_404_NOT_FOUND)
+        serializer = WebhookSubscriptionSerializer(subscription, data=request.data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        operation_id='delete_webhook',
+        summary='Delete Webhook',
+        description='Delete a webhook subscription, its offset and its dead letters.',
+        responses={
+            204: None,
+            403: {'description': 'Permission denied - admins only'},
+            404: {'description': 'Webhook not found'},
+        }
+    )
+    def delete(self, request, pk):
+        if not delete_subscriptions(WebhookSubscription.objects.filter(pk=pk)):
+            return Response({"error": "Webhook not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class WebhookDeadLetterListView(APIView):
+    """
+    List the requests a webhook gave up on (admin only).
+    """
+    permission_classes = [IsAdmin]
+    query_budget = {'get': QueryBudget(3, paginated=True)}
+
+    @extend_schema(
+        operation_id='list_webhook_dead_letters',
+        summary='List Webhook Dead Letters',
+        description='Requests that still failed after their last attempt, oldest first, with the payload sent.',
+        parameters=[
+            OpenApiParameter(
+                name='after',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Return dead letters with a greater id',
+                required=False
+            ),
+            OpenApiParameter(
+                name='page_size',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Number of dead letters per page',
+                required=False
+            ),
+        ],
+        responses={
+            200: WebhookDeadLetterPageSerializer,
+            400: {'description': 'Invalid id'},
+            403: {'description': 'Permission denied - admins only'},
+            404: {'description': 'Webhook not found'},
+        }
+    )
+    def get(self, request, pk):
+        if not WebhookSubscription.objects.filter(pk=pk).exists():
+            return Response({"error": "Webhook not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            after = int(request.query_params.get('after', 0))
+        except ValueError:
+            return Response({"error": "after must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        page_size = get_page_size(
+            request, settings.WEBHOOK_DEAD_LETTER_PAGE_SIZE, settings.WEBHOOK_DEAD_LETTER_MAX_PAGE_SIZE
+        )
+        dead_letters = list(
+            WebhookDeadLetter.objects.filter(subscription_id=pk, id__gt=after).order_by('id')[:page_size + 1]
+        )
+        next_url = None
+        if len(dead_letters) > page_size:
+            dead_letters = dead_letters[:page_size]
+            next_url = build_page_url(request, 'after', dead_letters[-1].id)
+        serializer = WebhookDeadLetterPageSerializer({'next': next_url, 'dead_letters': dead_letters})
+        return Response(serializer.data, status=status.HTTP_200_OK)
@@ -0,0 +1,359 @@
+"""
+Webhook delivery.
+
+Each active WebhookSubscription reads the outbox as its own consumer
+('webhook:<id>'). WebhookDispatcher groups the events after a subscription's
+offset into requests of up to batch_size events and POSTs them, with at
+most max_concurrency requests per subscription in flight, over a pool of
+keep-alive connections shared by every subscription.
+
+A failed request is retried with exponential backoff; once it has failed
+WEBHOOK_MAX_ATTEMPTS times (or the endpoint rejects it outright) it is kept
+as a WebhookDeadLetter and delivery moves on. The offset is committed after
+every request for a page of events has been delivered or dead-lettered, so
+delivery is at least once and, within a page, unordered: receivers should
+deduplicate on X-Webhook-Id and order by the events' offsets.
+
+Requests are signed with HMAC-SHA256 over '<timestamp>.<body>' using the
+subscription's secret:
+
+    X-Webhook-Timestamp: 1760000000
+    X-Webhook-Signature: sha256=<hex digest>
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import ssl
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from .events import commit_offset, read_events
+from .models import ConsumerOffset, OutboxEvent, WebhookSubscription, WebhookDeadLetter
+from .serializers import OutboxEventSerializer
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying; any other non-2xx status is dead-lettered at once
+RETRY_STATUSES = {408, 425, 429}
+# Response bodies are discarded; larger ones close the connection instead
+MAX_RESPONSE_BYTES = 1024 * 1024
+
+
+class ResponseError(Exception):
+    """
+    Raised when an endpoint sends something that is not an HTTP response.
+    """
+
+
+def sign(secret, timestamp, body):
+    digest = hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+    return f'sha256={digest}'
+
+
+async def read_response(reader):
+    """
+    Read an HTTP/1.x response and discard its body. Returns (status,
+    headers, keep_alive).
+    """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError('Connection closed before the response')
+    try:
+        version, status_code = line.decode('latin-1').split(None, 2)[:2]
+        status_code = int(status_code)
+    except ValueError:
+        raise ResponseError(f'Malformed status line {line[:100]!r}')
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    if status_code < 200 or status_code in (204, 304):
+        pass
+    elif 'chunked' in headers.get('transfer-encoding', '').lower():
+        received = 0
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            received += size
+            if not size or received > MAX_RESPONSE_BYTES:
+                break
+            await reader.readexactly(size + 2)
+        if size:
+            keep_alive = False
+        else:
+            while await reader.readline() not in (b'\r\n', b'\n', b''):
+                pass
+    elif 'content-length' in headers:
+        length = int(headers['content-length'])
+        if length > MAX_RESPONSE_BYTES:
+            keep_alive = False
+        else:
+            await reader.readexactly(length)
+    else:
+        # The body runs to the end of the connection
+        keep_alive = False
+    return status_code, headers, keep_alive
+
+
+class ConnectionPool:
+    """
+    A minimal asyncio HTTP/1.1 client for POSTing webhooks. Connections are
+    kept alive and reused per host; at most max_connections requests are in
+    flight and at most max_connections connections are kept idle.
+    """
+
+    def __init__(self, max_connections, timeout):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(max_connections)
+        self.idle = defaultdict(list)
+        self.idle_count = 0
+        self.ssl_context = ssl.create_default_context()
+
+    async def post(self, url, body, headers):
+        """
+        POST body to url and return (status, response headers).
+        """
+        parts = urlsplit(url)
+        secure = parts.scheme == 'https'
+        host = (parts.scheme, parts.hostname, parts.port or (443 if secure else 80))
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        lines = [
+            f'POST {target} HTTP/1.1',
+            f'Host: {parts.netloc.rpartition("@")[2]}',
+            'User-Agent: TicketingSystem-Webhooks',
+            'Content-Type: application/json',
+            f'Content-Length: {len(body)}',
+            *(f'{name}: {value}' for name, value in headers.items()),
+        ]
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+        async with self.slots:
+            return await asyncio.wait_for(self.exchange(host, request), self.timeout)
+
+    async def exchange(self, host, request):
+        while self.idle[host]:
+            reader, writer = self.idle[host].pop()
+            self.idle_count -= 1
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            try:
+                return await self.send(host, reader, writer, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The endpoint closed the idle connection; try another one
+                continue
+
+        scheme, hostname, port = host
+        reader, writer = await asyncio.open_connection(
+            hostname, port, ssl=self.ssl_context if scheme == 'https' else None
+        )
+        return await self.send(host, reader, writer, request)
+
+    async def send(self, host, reader, writer, request):
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_code, headers, keep_alive = await read_response(reader)
+        except BaseException:
+            # Including cancellation by the timeout: the connection is unusable
+            writer.close()
+            raise
+        if keep_alive and self.idle_count < self.max_connections:
+            self.idle[host].append((reader, writer))
+            self.idle_count += 1
+        else:
+            writer.close()
+        return status_code, headers
+
+    def close(self):
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle.clear()
+        self.idle_count = 0
+
+
+def start_offset(subscription):
+    """
+    The offset subscription resumes from. A new subscription starts with the
+    events recorded after it was created.
+    """
+    offset = ConsumerOffset.objects.filter(consumer=subscription.consumer).values_list('offset', flat=True).first()
+    if offset is None:
+        offset = OutboxEvent.objects.filter(created_at__lt=subscription.created_at).order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        offset = commit_offset(subscription.consumer, offset).offset
+    return offset
+
+
+def delete_subscriptions(subscriptions):
+    """
+    Delete the subscriptions in a queryset with their offsets, which would
+    otherwise keep prune_outbox from deleting the events after them.
+    Returns how many subscriptions were deleted.
+    """
+    with transaction.atomic():
+        ids = list(subscriptions.values_list('pk', flat=True))
+        if ids:
+            ConsumerOffset.objects.filter(
+                consumer__in=[WebhookSubscription(pk=pk).consumer for pk in ids]
+            ).delete()
+            WebhookSubscription.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+class WebhookDispatcher:
+    """
+    Deliver outbox events to every active WebhookSubscription. Use as an
+    async context manager around run_once() or run().
+    """
+
+    def __init__(self, max_connections=None, timeout=None, max_attempts=None, backoff_base=None,
+                 backoff_max=None, page_size=None):
+        self.max_connections = max_connections or settings.WEBHOOK_MAX_CONNECTIONS
+        self.timeout = timeout or settings.WEBHOOK_TIMEOUT
+        self.max_attempts = max_attempts or settings.WEBHOOK_MAX_ATTEMPTS
+        self.backoff_base = settings.WEBHOOK_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = settings.WEBHOOK_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.page_size = page_size or settings.WEBHOOK_PAGE_SIZE
+        self.pool = None
+        # Subscription id -> (max_concurrency, semaphore)
+        self.limits = {}
+        self.stats = Counter()
+
+    async def __aenter__(self):
+        self.pool = ConnectionPool(self.max_connections, self.timeout)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.pool.close()
+
+    async def run_once(self):
+        """
+        Deliver every pending event and return the delivery counts.
+        """
+        subscriptions = await sync_to_async(list)(WebhookSubscription.objects.filter(is_active=True))
+        await asyncio.gather(*(self.pump(subscription) for subscription in subscriptions))
+        return self.stats
+
+    async def run(self, interval=None):
+        """
+        Keep delivering, checking for new events every interval seconds. Each
+        subscription is pumped by its own task, so a failing endpoint only
+        holds back its own events.
+        """
+        interval = interval or settings.WEBHOOK_POLL_INTERVAL
+        tasks = {}
+        while True:
+            subscriptions = await sync_to_async(list)(WebhookSubscription.objects.filter(is_active=True))
+            for subscription in subscriptions:
+                task = tasks.get(subscription.pk)
+                if task is not None and task.done() and not task.cancelled() and task.exception():
+                    logger.error('Webhook %s failed', subscription.pk, exc_info=task.exception())
+                if task is None or task.done():
+                    tasks[subscription.pk] = asyncio.create_task(self.pump(subscription))
+            await asyncio.sleep(interval)
+
+    async def pump(self, subscription):
+        """
+        Deliver the events after subscription's offset, a page at a time.
+        """
+        limit, semaphore = self.limits.get(subscription.pk, (None, None))
+        if limit != subscription.max_concurrency:
+            semaphore = asyncio.Semaphore(subscription.max_concurrency)
+            self.limits[subscription.pk] = (subscription.max_concurrency, semaphore)
+
+        after = await sync_to_async(start_offset)(subscription)
+        while True:
+            events = await sync_to_async(read_events)(after, self.page_size, subscription.event_types)
+            if not events:
+                break
+            # Serialized once per page rather than once per request
+            serialized = OutboxEventSerializer(events, many=True).data
+            size = subscription.batch_size
+            dead_letters = await asyncio.gather(*(
+                self.deliver(subscription, serialized[start:start + size], semaphore)
+                for start in range(0, len(serialized), size)
+            ))
+            after = events[-1].id
+            await sync_to_async(self.commit)(subscription, [letter for letter in dead_letters if letter], after)
+            if len(events) < self.page_size:
+                break
+
+    def commit(self, subscription, dead_letters, offset):
+        with transaction.atomic():
+            WebhookDeadLetter.objects.bulk_create(dead_letters)
+            commit_offset(subscription.consumer, offset)
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Seconds to wait after the attempt-th failure: exponential, with
+        jitter so retries to one endpoint spread out.
+        """
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.backoff_max, int(retry_after)))
+        return delay
+
+    async def deliver(self, subscription, events, semaphore):
+        """
+        POST serialized events to subscription until it succeeds or runs out
+        of attempts. Returns an unsaved WebhookDeadLetter if it never did.
+        """
+        payload = {'subscription': str(subscription.pk), 'events': events}
+        body = json.dumps(payload, cls=DjangoJSONEncoder).encode()
+        first_offset, last_offset = events[0]['offset'], events[-1]['offset']
+        delivery_id = f'{subscription.pk}:{first_offset}-{last_offset}'
+
+        for attempt in range(1, self.max_attempts + 1):
+            timestamp = str(int(time.time()))
+            headers = {
+                'X-Webhook-Id': delivery_id,
+                'X-Webhook-Timestamp': timestamp,
+                'X-Webhook-Signature': sign(subscription.secret, timestamp, body),
+            }
+            retry_after = None
+            async with semaphore:
+                try:
+                    status_code, response_headers = await self.pool.post(subscription.url, body, headers)
+                except (OSError, EOFError, asyncio.TimeoutError, ResponseError, ValueError) as exc:
+                    status_code, error = None, str(exc) or exc.__class__.__name__
+                else:
+                    error = '' if 200 <= status_code < 300 else f'HTTP {status_code}'
+                    retry_after = response_headers.get('retry-after')
+
+            if not error:
+                self.stats['requests'] += 1
+                self.stats['events'] += len(events)
+                return None
+            self.stats['failures'] += 1
+            if status_code and status_code < 500 and status_code not in RETRY_STATUSES:
+                break
+            if attempt < self.max_attempts:
+                await asyncio.sleep(self.backoff(attempt, retry_after))
+
+        self.stats['dead_letters'] += 1
+        logger.warning('Webhook %s dead-lettered %s after %s attempts: %s', subscription.pk, delivery_id, attempt, error)
+        return WebhookDeadLetter(
+            subscription=subscription,
+            first_offset=first_offset,
+            last_offset=last_offset,
+            payload=payload,
+            attempts=attempt,
+            status_code=status_code,
+            error=error,
+        )
@@ -1,14 +1,16 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from TicketingSystem.admin_mixins import LargeTableAdminMixin
+from apps.Tickets.quotas import AttachmentRefundAdminMixin
 from .models import User, Order
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(AttachmentRefundAdminMixin, BaseUserAdmin):
     """
     Custom admin for User model with role-based management.
     """
-    list_display = ['email', 'username', 'user_type', 'is_active', 'is_staff', 'created_at']
+    list_display = ['email', 'username', 'user_type', 'is_active', 'is_staff', 'attachment_bytes', 'created_at']
     list_filter = ['user_type', 'is_active', 'is_staff', 'is_superuser', 'created_at']
     search_fields = ['email', 'username', 'first_name', 'last_name']
     ordering = ['-created_at']
@@ -36,7 +38,9 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
-    readonly_fields = ['created_at', 'updated_at', 'last_login', 'date_joined']
+    readonly_fields = ['created_at', 'updated_at', 'last_login', 'date_joined', 'attachment_bytes']
+    # Their uploads, and everything on their own tickets
+    attachment_lookups = ['uploaded_by', 'ticket__user']
     
     def save_model(self, request, obj, form, change):
         """
@@ -50,9 +54,13 @@ class UserAdmin(BaseUserAdmin):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['id', 'order_number', 'user', 'status', 'total_price', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['id', 'order_number', 'user__email', 'user__username']
+    list_select_related = ['user']
+    search_uuid_fields = ['id']
+    search_email_fields = ['user__email']
+    search_text_fields = ['order_number']
+    raw_id_fields = ['user']
     ordering = ['-created_at']
     readonly_fields = ['id', 'created_at', 'updated_at']
@@ -0,0 +1,86 @@
+"""
+Customer context for agents: a customer's recent orders with the number of
+tickets on each, how many of their tickets are in each status, and their
+latest tickets, in three queries.
+
+Contexts are cached for CUSTOMER_CONTEXT_CACHE_TTL seconds under a
+per-customer version, so that one cache delete drops every cached variant
+(agents limited to their assigned tickets each get their own). Ticket and
+order saves and deletes, and saves of the customer or their tickets'
+assignees, invalidate it through signals (see .signals) once their
+transaction commits; bulk inserts that bypass signals call
+invalidate_customer_context() themselves.
+"""
+import uuid
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from apps.Tickets.models import Ticket, ticket_visibility
+from .models import Order
+
+User = get_user_model()
+
+
+def version_key(customer_id):
+    return f'customer-context-version:{customer_id}'
+
+
+def cache_key(customer_id, viewer):
+    version = cache.get_or_set(version_key(customer_id), lambda: uuid.uuid4().hex, timeout=None)
+    scope = 'all' if ticket_visibility(viewer) is None else viewer.pk
+    return f'customer-context:{customer_id}:{version}:{scope}'
+
+
+def invalidate_customer_context(customer_ids):
+    """
+    Drop the cached contexts of the given customers once the current
+    transaction commits.
+    """
+    keys = [version_key(customer_id) for customer_id in set(customer_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def build_customer_context(customer, viewer):
+    """
+    The context of customer as viewer may see it. Only tickets viewer may
+    see are counted and listed.
+    """
+    counted = Q(tickets__deleted_at__isnull=True)
+    visibility = ticket_visibility(viewer, prefix='tickets__')
+    if visibility is not None:
+        counted &= visibility
+    orders = Order.objects.filter(user=customer).annotate(
+        ticket_count=Count('tickets', filter=counted)
+    ).order_by('-created_at', '-id')[:settings.CUSTOMER_CONTEXT_ORDERS]
+
+    tickets = Ticket.objects.visible_to(viewer).filter(user=customer)
+    status_counts = dict.fromkeys([value for value, _ in Ticket.STATUS_CHOICES], 0)
+    status_counts.update(tickets.order_by().values_list('status').annotate(count=Count('id')))
+    recent = tickets.select_related('assigned_to', 'order').order_by('-created_at', '-id')[
+        :settings.CUSTOMER_CONTEXT_TICKETS
+    ]
+    return {
+        'customer': customer,
+        'orders': list(orders),
+        'ticket_counts': status_counts,
+        'ticket_total': sum(status_counts.values()),
+        'recent_tickets': list(recent),
+    }
+
+
+def get_customer_context(customer_id, viewer, serialize):
+    """
+    Serialized context of the customer for viewer, from the cache when
+    possible. serialize turns build_customer_context()'s result into data.
+    Raises User.DoesNotExist for an unknown customer.
+    """
+    key = cache_key(customer_id, viewer)
+    data = cache.get(key)
+    if data is None:
+        customer = User.objects.get(pk=customer_id)
+        data = serialize(build_customer_context(customer, viewer))
+        cache.set(key, data, settings.CUSTOMER_CONTEXT_CACHE_TTL)
+    return data
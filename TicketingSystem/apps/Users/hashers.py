@@ -0,0 +1,76 @@
+"""
+Password hashing that runs on a bounded pool of worker threads.
+
+PBKDF2 releases the GIL, so hashing on worker threads uses every core, while
+the pool size caps how many hashes run at once: a burst of logins cannot
+starve other requests of CPU, and under ASGI the event loop is never the
+thread doing the work.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+
+THREAD_NAME_PREFIX = 'password-hashing'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASHING_THREADS,
+                    thread_name_prefix=THREAD_NAME_PREFIX,
+                )
+    return _pool
+
+
+def run_in_pool(func, *args):
+    """
+    Run func on the hashing pool and wait for the result. Calls made from a
+    pool thread run directly.
+    """
+    if threading.current_thread().name.startswith(THREAD_NAME_PREFIX):
+        return func(*args)
+    return hashing_pool().submit(func, *args).result()
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    The default PBKDF2-SHA256 hasher with its iteration count taken from
+    PASSWORD_HASH_ITERATIONS and its work done on the hashing pool. The
+    algorithm name is unchanged, so existing hashes keep verifying and are
+    upgraded on the next login when the iteration count changes.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+    def encode(self, password, salt, iterations=None):
+        return run_in_pool(super().encode, password, salt, iterations)
+
+    def verify(self, password, encoded):
+        return run_in_pool(super().verify, password, encoded)
+
+    def harden_runtime(self, password, encoded):
+        return run_in_pool(super().harden_runtime, password, encoded)
+
+
+async def amake_password(password):
+    """
+    make_password() for async code; waits without blocking the event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(hashing_pool(), make_password, password)
+
+
+async def acheck_password(password, encoded):
+    """
+    check_password() for async code; waits without blocking the event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(hashing_pool(), check_password, password, encoded)
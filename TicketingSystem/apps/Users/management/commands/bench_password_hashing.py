@@ -0,0 +1,66 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure password verifications (logins) per second per core for one or more '
+        'PBKDF2 iteration counts, single threaded and through the hashing pool.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, nargs='+',
+            help='Iteration counts to compare (default: the configured count).'
+        )
+        parser.add_argument('--duration', type=float, default=3.0, help='Seconds per measurement.')
+        parser.add_argument(
+            '--clients', type=int, default=None,
+            help='Concurrent login threads for the pooled run (default: 4 x PASSWORD_HASHING_THREADS).'
+        )
+
+    def handle(self, *args, **options):
+        hasher = get_hasher()
+        password = 'Bench-Passw0rd!2024'
+        pool_size = settings.PASSWORD_HASHING_THREADS
+        clients = options['clients'] or pool_size * 4
+        duration = options['duration']
+
+        self.stdout.write(
+            f'{hasher.algorithm}, {os.cpu_count()} CPUs, hashing pool of {pool_size} threads, '
+            f'{clients} concurrent clients'
+        )
+        self.stdout.write(f"{'iterations':>10} {'ms/login':>9} {'logins/s/core':>14} {'logins/s pooled':>16}")
+        for iterations in options['iterations'] or [hasher.iterations]:
+            encoded = hasher.encode(password, hasher.salt(), iterations)
+
+            def login():
+                return hasher.verify(password, encoded)
+
+            single = self.rate(login, duration, threads=1)
+            pooled = self.rate(login, duration, threads=clients)
+            self.stdout.write(
+                f'{iterations:>10} {1000 / single:>9.1f} {single:>14.1f} {pooled:>16.1f}'
+            )
+
+    def rate(self, func, duration, threads):
+        """
+        Calls of func per second with threads callers running for duration.
+        """
+        def worker(deadline):
+            calls = 0
+            while time.perf_counter() < deadline:
+                func()
+                calls += 1
+            return calls
+
+        func()
+        start = time.perf_counter()
+        deadline = start + duration
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            calls = sum(executor.map(worker, [deadline] * threads))
+        return calls / (time.perf_counter() - start)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0002_admin_search_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='attachment_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('attachment_bytes__gt', 0)), fields=['-attachment_bytes'], name='users_attachment_bytes_idx'),
+        ),
+    ]
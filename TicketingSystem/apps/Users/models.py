@@ -1,6 +1,9 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.conf import settings
+from TicketingSystem.model_mixins import CounterFieldsMixin
 import uuid
 
 
@@ -43,7 +46,7 @@ class UserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     """
     Custom User model for the ticketing system.
     """
@@ -59,8 +62,11 @@ class User(AbstractUser):
     email = models.EmailField(unique=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Combined size of the attachments the user uploaded (apps.Tickets.quotas)
+    attachment_bytes = models.BigIntegerField(default=0)
 
     objects = UserManager()
+    counter_fields = ('attachment_bytes',)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
@@ -69,6 +75,11 @@ class User(AbstractUser):
         db_table = 'users'
         indexes = [
             models.Index(fields=['user_type', 'is_active']),
+            models.Index(Upper('email'), name='users_email_upper_idx'),
+            models.Index(
+                fields=['-attachment_bytes'], condition=models.Q(attachment_bytes__gt=0),
+                name='users_attachment_bytes_idx'
+            ),
         ]
 
     def __str__(self):
@@ -98,6 +109,10 @@ class Order(models.Model):
     class Meta:
         db_table = 'orders'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+            GinIndex(OpClass(Upper('order_number'), name='gin_trgm_ops'), name='order_number_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.order_number
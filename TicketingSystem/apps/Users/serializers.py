@@ -2,7 +2,12 @@ from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
 from rest_framework_simplejwt.tokens import RefreshToken
+from TicketingSystem.instrumentation import TimedSerializerMixin
+from apps.Tickets.models import Ticket
+from .models import Order
 
 User = get_user_model()
 
@@ -26,6 +31,12 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         fields = ['email', 'username', 'password', 'password_confirmation', 
           'first_name', 'last_name']
         # SECURITY: user_type removed from fields to prevent privilege escalation
+        # Uniqueness is enforced by the insert itself (see create()) instead
+        # of one query per unique field up front
+        extra_kwargs = {
+            'email': {'validators': []},
+            'username': {'validators': [UnicodeUsernameValidator()]},
+        }
 
     extra_kwargs = {
         'first_name': {'required': True},
@@ -36,16 +47,6 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         if attrs['password'] != attrs['password_confirmation']:
             raise serializers.ValidationError({"password": "Password fields didn't match."})
-        
-        # Check if email already exists
-        if User.objects.filter(email=attrs['email']).exists():
-            raise serializers.ValidationError({"email": "A user with this email already exists."})
-        
-        # Check if username already exists (if provided)
-        username = attrs.get('username')
-        if username and User.objects.filter(username=username).exists():
-            raise serializers.ValidationError({"username": "A user with this username already exists."})
-        
         return attrs
 
     def create(self, validated_data):
@@ -53,10 +54,23 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         password = validated_data.pop('password')
         
         # SECURITY: Force user_type to 'customer' - agents/admins created via admin panel
-        user = User.objects.create_user(
-            password=password,
-            **validated_data
-        )
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    password=password,
+                    **validated_data
+                )
+        except IntegrityError:
+            # Duplicate email or username, including two concurrent registrations.
+            # Which constraint the database reports first is not defined, so look
+            # the duplicates up, reporting the email first when both are taken.
+            email = User.objects.normalize_email(validated_data['email'])
+            if User.objects.filter(email=email).exists():
+                raise serializers.ValidationError({"email": "A user with this email already exists."})
+            username = validated_data.get('username') or email.split('@')[0]
+            if User.objects.filter(username=username).exists():
+                raise serializers.ValidationError({"username": "A user with this username already exists."})
+            raise
         return user
     
     def to_representation(self, instance):
@@ -80,7 +94,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             '_refresh_token': str(refresh),  
         }
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'email', 'username', 'first_name', 'last_name', 
@@ -103,4 +117,36 @@ class ChangePasswordSerializer(serializers.Serializer):
         instance.save()
         return instance
 
-     
+
+class ContextOrderSerializer(serializers.ModelSerializer):
+    ticket_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'order_number', 'status', 'total_price', 'created_at', 'ticket_count']
+        read_only_fields = fields
+
+
+class ContextTicketSerializer(serializers.ModelSerializer):
+    assigned_to = serializers.SlugRelatedField(slug_field='username', read_only=True)
+    order = serializers.SlugRelatedField(slug_field='order_number', read_only=True)
+
+    class Meta:
+        model = Ticket
+        fields = ['id', 'topic', 'status', 'priority', 'order', 'assigned_to', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class ContextCustomerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'email', 'username', 'first_name', 'last_name', 'user_type', 'date_joined']
+        read_only_fields = fields
+
+
+class CustomerContextSerializer(TimedSerializerMixin, serializers.Serializer):
+    customer = ContextCustomerSerializer()
+    orders = ContextOrderSerializer(many=True)
+    ticket_counts = serializers.DictField(child=serializers.IntegerField())
+    ticket_total = serializers.IntegerField()
+    recent_tickets = ContextTicketSerializer(many=True)
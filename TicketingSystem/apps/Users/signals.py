@@ -0,0 +1,33 @@
+"""
+Drop cached customer contexts (see .context) when the customer's tickets or
+orders are saved or deleted, or when the customer or an assignee of their
+tickets is saved.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.Tickets.models import Ticket
+from .context import invalidate_customer_context
+
+# User fields shown in a context: the customer's own, and the username of
+# the staff their tickets are assigned to
+CUSTOMER_FIELDS = {'email', 'username', 'first_name', 'last_name', 'user_type', 'date_joined'}
+ASSIGNEE_FIELDS = {'username'}
+
+
+@receiver([post_save, post_delete], sender='Tickets.Ticket')
+@receiver([post_save, post_delete], sender='Users.Order')
+def invalidate_owner_context(sender, instance, **kwargs):
+    invalidate_customer_context([instance.user_id])
+
+
+@receiver(post_save, sender='Users.User')
+def invalidate_user_context(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        return
+    fields = CUSTOMER_FIELDS if update_fields is None else CUSTOMER_FIELDS & set(update_fields)
+    customer_ids = [instance.pk] if fields else []
+    if instance.user_type != 'customer' and (update_fields is None or ASSIGNEE_FIELDS & set(update_fields)):
+        customer_ids.extend(
+            Ticket.all_objects.filter(assigned_to=instance).order_by().values_list('user_id', flat=True).distinct()
+        )
+    invalidate_customer_context(customer_ids)
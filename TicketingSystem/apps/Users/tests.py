@@ -1,3 +1,279 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from TicketingSystem.query_budget import missing_budgets
+from TicketingSystem.testing import QueryBudgetTestCase
+from apps.Tickets.models import Ticket
+from . import urls
+from .models import User, Order
+from .views import (
+    LoginView,
+    RegisterView,
+    LogoutView,
+    CookieTokenRefreshView,
+    UserProfileView,
+    ChangePasswordView,
+    CustomerContextView,
+)
 
-# Create your tests here.
+PASSWORD = 'Passw0rd!2024'
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    """
+    Authentication and profile endpoints must run a bounded number of
+    queries however many users exist.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.password_hash = make_password(PASSWORD)
+        cls.user = User.objects.create(
+            email='customer@example.com', username='customer', password=cls.password_hash
+        )
+
+    def setUp(self):
+        self.user_count = 0
+
+    def grow_users(self, size):
+        """
+        Make sure at least size other users exist.
+        """
+        User.objects.bulk_create([
+            User(email=f'user{index}@example.com', username=f'user{index}', password=self.password_hash)
+            for index in range(self.user_count, size)
+        ])
+        self.user_count = max(self.user_count, size)
+
+    def authenticate(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def set_refresh_cookie(self):
+        self.client.cookies[settings.REFRESH_TOKEN_COOKIE_NAME] = str(RefreshToken.for_user(self.user))
+
+    def test_every_endpoint_has_a_budget(self):
+        self.assertEqual(missing_budgets(urls.urlpatterns), [])
+
+    def test_login(self):
+        def setup(size):
+            self.grow_users(size)
+            return {
+                'path': reverse('users:v1-login'), 'format': 'json',
+                'data': {'email': self.user.email, 'password': PASSWORD},
+            }
+
+        self.assertQueryBudget(LoginView, 'post', setup)
+
+    def test_register(self):
+        def setup(size):
+            self.grow_users(size)
+            return {
+                'path': reverse('users:v1-register'), 'format': 'json',
+                'data': {
+                    'email': f'new{size}@example.com', 'username': f'new{size}',
+                    'password': PASSWORD, 'password_confirmation': PASSWORD,
+                    'first_name': 'New', 'last_name': 'User',
+                },
+            }
+
+        self.assertQueryBudget(RegisterView, 'post', setup)
+
+    def test_logout(self):
+        self.authenticate()
+
+        def setup(size):
+            self.grow_users(size)
+            self.set_refresh_cookie()
+            return {'path': reverse('users:v1-logout')}
+
+        self.assertQueryBudget(LogoutView, 'post', setup)
+
+    def test_refresh(self):
+        def setup(size):
+            self.grow_users(size)
+            self.set_refresh_cookie()
+            return {'path': reverse('users:v1-token-refresh')}
+
+        self.assertQueryBudget(CookieTokenRefreshView, 'post', setup)
+
+    def test_profile(self):
+        self.authenticate()
+
+        def setup(size):
+            self.grow_users(size)
+            return {'path': reverse('users:v1-profile')}
+
+        self.assertQueryBudget(UserProfileView, 'get', setup)
+
+    def test_update_profile(self):
+        self.authenticate()
+
+        def setup(size):
+            self.grow_users(size)
+            return {'path': reverse('users:v1-profile'), 'format': 'json', 'data': {'first_name': f'Name{size}'}}
+
+        self.assertQueryBudget(UserProfileView, 'patch', setup)
+        self.assertQueryBudget(UserProfileView, 'put', setup)
+
+    def test_change_password(self):
+        self.authenticate()
+
+        def setup(size):
+            self.grow_users(size)
+            return {
+                'path': reverse('users:v1-change-password'), 'format': 'json',
+                'data': {
+                    'old_password': PASSWORD, 'new_password': PASSWORD,
+                    'new_password_confirmation': PASSWORD,
+                },
+            }
+
+        self.assertQueryBudget(ChangePasswordView, 'post', setup)
+
+    def test_customer_context(self):
+        agent = User.objects.create(email='agent@example.com', username='agent', user_type='agent', is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(agent).access_token}')
+
+        def setup(size):
+            self.grow_users(size)
+            count = Order.objects.count()
+            orders = Order.objects.bulk_create([
+                Order(user=self.user, order_number=f'ORD-{index}', total_price=10)
+                for index in range(count, size)
+            ])
+            Ticket.objects.bulk_create([
+                Ticket(user=self.user, order=order, topic='Late delivery', description='Where is it?')
+                for order in orders
+            ])
+            # Measure the uncached path
+            cache.clear()
+            return {'path': reverse('users:v1-customer-context', args=[self.user.pk])}
+
+        self.assertQueryBudget(CustomerContextView, 'get', setup)
+
+
+class RegistrationTests(APITestCase):
+    """
+    Registering a taken email or username is refused with an error on the
+    field, the email when both are taken.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create(email='taken@example.com', username='taken', password=make_password(PASSWORD))
+
+    def register(self, email, username):
+        return self.client.post(reverse('users:v1-register'), {
+            'email': email, 'username': username, 'password': PASSWORD, 'password_confirmation': PASSWORD,
+            'first_name': 'New', 'last_name': 'User',
+        }, format='json')
+
+    def test_duplicate_email(self):
+        response = self.register('taken@example.com', 'fresh')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'email'})
+
+    def test_duplicate_username(self):
+        response = self.register('fresh@example.com', 'taken')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'username'})
+
+    def test_duplicate_email_and_username(self):
+        response = self.register('taken@example.com', 'taken')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'email'})
+
+
+class CustomerContextTests(APITestCase):
+    """
+    Agents get a customer's orders and ticket history in one call, cached
+    until the customer, their tickets or their orders change.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(email='customer@example.com', username='customer')
+        cls.agent = User.objects.create(
+            email='agent@example.com', username='agent', user_type='agent', is_staff=True
+        )
+        cls.other_agent = User.objects.create(
+            email='other@example.com', username='other', user_type='agent', is_staff=True
+        )
+        cls.orders = [
+            Order.objects.create(user=cls.customer, order_number=f'ORD-{index}', total_price=10)
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def context(self, user, customer=None):
+        self.client.force_authenticate(user)
+        return self.client.get(reverse('users:v1-customer-context', args=[(customer or self.customer).pk]))
+
+    def test_context(self):
+        first, second, _ = self.orders
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.create(user=self.customer, order=first, topic='Late', description='Late.')
+            Ticket.objects.create(
+                user=self.customer, order=first, topic='Broken', description='Broken.', status='resolved'
+            )
+            Ticket.objects.create(user=self.customer, order=second, topic='Refund', description='Refund.')
+
+        response = self.context(self.agent)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['customer']['email'], 'customer@example.com')
+        self.assertEqual(
+            {order['order_number']: order['ticket_count'] for order in response.data['orders']},
+            {'ORD-0': 2, 'ORD-1': 1, 'ORD-2': 0}
+        )
+        self.assertEqual(response.data['ticket_total'], 3)
+        self.assertEqual((response.data['ticket_counts']['open'], response.data['ticket_counts']['resolved']), (2, 1))
+        self.assertEqual(response.data['recent_tickets'][0]['topic'], 'Refund')
+
+        # Served from the cache until a ticket or order of the customer changes
+        with self.assertNumQueries(0):
+            self.assertEqual(self.context(self.agent).data, response.data)
+        ticket = Ticket.objects.get(topic='Late')
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.status = 'closed'
+            ticket.save()
+        self.assertEqual(self.context(self.agent).data['ticket_counts']['closed'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(user=self.customer, order_number='ORD-3', total_price=10)
+        self.assertEqual(self.context(self.agent).data['orders'][0]['order_number'], 'ORD-3')
+
+    def test_user_changes(self):
+        Ticket.objects.create(user=self.customer, assigned_to=self.agent, topic='Late', description='Late.')
+        self.context(self.agent)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.first_name = 'Ada'
+            self.customer.save()
+        self.assertEqual(self.context(self.agent).data['customer']['first_name'], 'Ada')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agent.username = 'agent-ada'
+            self.agent.save(update_fields=['username'])
+        self.assertEqual(self.context(self.agent).data['recent_tickets'][0]['assigned_to'], 'agent-ada')
+        # Logins do not touch the context
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.customer.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+    @override_settings(TICKET_AGENT_SCOPE='assigned')
+    def test_scoped_agents(self):
+        Ticket.objects.create(user=self.customer, assigned_to=self.agent, topic='Mine', description='Mine.')
+        Ticket.objects.create(user=self.customer, assigned_to=self.other_agent, topic='Theirs', description='Theirs.')
+        self.assertEqual(self.context(self.agent).data['ticket_total'], 1)
+        self.assertEqual(self.context(self.other_agent).data['recent_tickets'][0]['topic'], 'Theirs')
+
+    def test_permissions(self):
+        self.assertEqual(self.context(self.customer).status_code, 403)
+        unknown = User(pk='00000000-0000-0000-0000-000000000000')
+        self.assertEqual(self.context(self.agent, customer=unknown).status_code, 404)
@@ -13,4 +13,7 @@ urlpatterns = [
     # User profile endpoints
     path('profile/', views.UserProfileView.as_view(), name='v1-profile'),
     path('profile/change-password/', views.ChangePasswordView.as_view(), name='v1-change-password'),
+
+    # Orders and ticket history of a customer, for agents
+    path('<uuid:pk>/context/', views.CustomerContextView.as_view(), name='v1-customer-context'),
 ]
\ No newline at end of file
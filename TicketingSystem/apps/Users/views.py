@@ -7,7 +7,11 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 from django.conf import settings
+from TicketingSystem.query_budget import QueryBudget
 from apps.Users.serializers import CustomTokenObtainPairSerializer, UserRegistrationSerializer, UserProfileSerializer, ChangePasswordSerializer
+from apps.Users.serializers import CustomerContextSerializer
+from .context import get_customer_context
+from .models import User
 
 
 @extend_schema(
@@ -25,6 +29,7 @@ class LoginView(TokenObtainPairView):
     Only access token is returned in response body.
     """
     serializer_class = CustomTokenObtainPairSerializer
+    query_budget = {'post': QueryBudget(2)}
     
     def finalize_response(self, request, response, *args, **kwargs):
         """Set refresh token as HttpOnly cookie"""
@@ -61,6 +66,7 @@ class RegisterView(generics.CreateAPIView):
     """
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = {'post': QueryBudget(2)}
     
     def finalize_response(self, request, response, *args, **kwargs):
         """Set refresh token as HttpOnly cookie"""
@@ -95,6 +101,7 @@ class LogoutView(APIView):
     blacklists it, and clears the cookie.
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'post': QueryBudget(6)}
 
     def post(self, request):
         try:
@@ -155,6 +162,7 @@ class LogoutView(APIView):
 class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserProfileSerializer
+    query_budget = {'get': QueryBudget(1), 'put': QueryBudget(2), 'patch': QueryBudget(2)}
 
     def get_object(self):
         return self.request.user
@@ -172,6 +180,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 )
 class ChangePasswordView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'post': QueryBudget(2)}
 
     def post(self, request):
         serializer = ChangePasswordSerializer(data=request.data, context={'request': request})
@@ -189,6 +198,38 @@ class ChangePasswordView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@extend_schema(
+    tags=['v1 - User Profile'],
+    summary='Customer Context',
+    description=(
+        "A customer's recent orders with their ticket counts, how many of their tickets are in each "
+        'status, and their latest tickets (staff only). Only tickets the caller may see are counted.'
+    ),
+    responses={
+        200: CustomerContextSerializer,
+        403: OpenApiResponse(description='Permission denied'),
+        404: OpenApiResponse(description='User not found'),
+    }
+)
+class CustomerContextView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': QueryBudget(5)}
+
+    def get(self, request, pk):
+        if not request.user.is_staff:
+            return Response(
+                {"error": "Only staff members can see customer context"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        try:
+            data = get_customer_context(
+                pk, request.user, lambda context: CustomerContextSerializer(context).data
+            )
+        except User.DoesNotExist:
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data, status=status.HTTP_200_OK)
+
+
 @extend_schema(
     tags=['v1 - Authentication'],
     summary='Refresh Access Token',
@@ -207,6 +248,7 @@ class CookieTokenRefreshView(TokenRefreshView):
     instead of request body, and sets the new rotated refresh token back as cookie.
     """
     permission_classes = [permissions.AllowAny]
+    query_budget = {'post': QueryBudget(9)}
     
     def post(self, request, *args, **kwargs):
         # Get refresh token from HttpOnly cookie
@@ -0,0 +1,23 @@
+"""
+Scenario-based load testing for the Ticketing System REST API.
+
+Run against a local server, for example:
+
+    python -m loadtest run --base-url http://localhost:8000 --duration 60 \
+        --customers 20 --agents 5 --auth-users 5 \
+        --agent a1@example.com:password --output results.json
+
+and compare two result files with:
+
+    python -m loadtest compare before.json after.json
+
+The virtual users all share the client's IP, so the server's IP rate limits
+(300 ticket creations an hour by default) are hit within seconds. Start the
+server with the limits lifted, or raised, for a load test:
+
+    THROTTLE_IP_TICKETS= THROTTLE_IP_MESSAGES= THROTTLE_IP_ATTACHMENTS= \
+    THROTTLE_CUSTOMER_TICKETS= THROTTLE_CUSTOMER_MESSAGES= THROTTLE_CUSTOMER_ATTACHMENTS= \
+        python manage.py runserver
+
+Throttled (429) responses are reported in their own column, not as errors.
+"""
@@ -0,0 +1,114 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from .client import ApiClient
+from .report import Recorder, compare, git_revision, print_summary
+from .scenarios import SCENARIOS, new_run_id
+
+
+def parse_credentials(value):
+    email, _, password = value.partition(':')
+    if not email or not password:
+        raise argparse.ArgumentTypeError('expected EMAIL:PASSWORD')
+    return email, password
+
+
+def run_user(scenario, stop, think_time, rng):
+    try:
+        scenario.setup()
+        while not stop.is_set():
+            scenario.step()
+            if think_time:
+                stop.wait(rng.expovariate(1 / think_time))
+    finally:
+        scenario.client.close()
+
+
+def run(options):
+    if options.agents_count and not options.agents:
+        sys.exit('Agent scenarios need at least one --agent EMAIL:PASSWORD (staff account).')
+    options.run_id = new_run_id()
+
+    recorder = Recorder()
+    stop = threading.Event()
+    mix = [('customer', options.customers), ('agent', options.agents_count), ('auth', options.auth_users)]
+    users = [(name, index) for name, count in mix for index in range(count)]
+    threads = []
+
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    for position, (name, index) in enumerate(users):
+        rng = random.Random(f'{options.seed}-{name}-{index}')
+        scenario = SCENARIOS[name](ApiClient(options.base_url, recorder), rng, options, index)
+        thread = threading.Thread(
+            target=run_user, args=(scenario, stop, options.think_time, rng), daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+        if options.ramp_up and position < len(users) - 1:
+            time.sleep(options.ramp_up / len(users))
+
+    stop.wait(max(0.0, options.duration - (time.perf_counter() - start)))
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=30)
+    elapsed = time.perf_counter() - start
+
+    summary = recorder.summarize(elapsed)
+    summary['meta'] = {
+        'revision': git_revision(),
+        'base_url': options.base_url,
+        'started_at': started_at.isoformat(),
+        'duration_s': round(elapsed, 2),
+        'customers': options.customers,
+        'agents': options.agents_count,
+        'auth_users': options.auth_users,
+        'think_time_s': options.think_time,
+        'seed': options.seed,
+    }
+    print_summary(summary, sys.stdout)
+    if summary['total']['throttled']:
+        print('Requests were throttled; lift the THROTTLE_* limits on the server to measure throughput.')
+    if options.output:
+        with open(options.output, 'w') as handle:
+            json.dump(summary, handle, indent=2)
+        print(f'Results written to {options.output}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description='Load test the ticketing API.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the scenarios against a server.')
+    run_parser.add_argument('--base-url', default='http://localhost:8000')
+    run_parser.add_argument('--duration', type=float, default=60, help='Test length in seconds.')
+    run_parser.add_argument('--ramp-up', type=float, default=5, help='Seconds to start all virtual users.')
+    run_parser.add_argument('--customers', type=int, default=20, help='Customer virtual users.')
+    run_parser.add_argument('--agents', dest='agents_count', type=int, default=5, help='Agent virtual users.')
+    run_parser.add_argument('--auth-users', type=int, default=5, help='Login/refresh virtual users.')
+    run_parser.add_argument(
+        '--agent', dest='agents', action='append', type=parse_credentials, default=[],
+        metavar='EMAIL:PASSWORD', help='Staff account used by agent users (repeatable).'
+    )
+    run_parser.add_argument('--password', default='LoadTest-Passw0rd!', help='Password for registered users.')
+    run_parser.add_argument('--think-time', type=float, default=0.5, help='Mean pause between steps in seconds.')
+    run_parser.add_argument('--seed', default='loadtest')
+    run_parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    compare_parser = commands.add_parser('compare', help='Compare two result files.')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    options = parser.parse_args(argv)
+    if options.command == 'run':
+        run(options)
+    else:
+        compare(options.before, options.after, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import http.client
+import json
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+
+class ApiClient:
+    """
+    A keep-alive HTTP client for one virtual user. Keeps the JWT access
+    token and cookies (including the refresh token cookie) between requests
+    and reports every request to the recorder.
+    """
+
+    def __init__(self, base_url, recorder, timeout=30):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection_class = connection_class
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self.recorder = recorder
+        self.connection = None
+        self.access_token = None
+        self.cookies = {}
+
+    def request(self, method, path, name, body=None, params=None):
+        """
+        Send a request and record its latency under name (a route template
+        such as 'GET /api/v1/tickets/{id}/'). Returns (status, parsed body).
+        """
+        if params:
+            path = f'{path}?' + '&'.join(f'{key}={value}' for key, value in params.items())
+        headers = {'Accept': 'application/json'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        if self.access_token:
+            headers['Authorization'] = f'Bearer {self.access_token}'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in self.cookies.items())
+
+        start = time.perf_counter()
+        try:
+            status, data = self._send(method, path, payload, headers)
+        except (OSError, http.client.HTTPException) as exc:
+            self.close()
+            self.recorder.record(name, time.perf_counter() - start, 0, error=type(exc).__name__)
+            return 0, None
+        self.recorder.record(name, time.perf_counter() - start, status)
+        return status, data
+
+    def _send(self, method, path, payload, headers):
+        if self.connection is None:
+            self.connection = self.connection_class(self.netloc, timeout=self.timeout)
+        self.connection.request(method, path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        raw = response.read()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie(header)
+            for key, morsel in cookie.items():
+                if morsel['max-age'] == '0' or not morsel.value:
+                    self.cookies.pop(key, None)
+                else:
+                    self.cookies[key] = morsel.value
+        if response.getheader('Connection', '').lower() == 'close':
+            self.close()
+        try:
+            data = json.loads(raw) if raw else None
+        except ValueError:
+            data = None
+        return response.status, data
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,125 @@
+import json
+import math
+import subprocess
+import threading
+from collections import defaultdict
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """
+    Thread-safe collector of request latencies grouped by endpoint.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, seconds, status, error=None):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][error or status] += 1
+
+    def summarize(self, elapsed):
+        """
+        Per-endpoint and overall latency percentiles (ms) and throughput.
+        """
+        with self.lock:
+            names = sorted(self.latencies)
+            endpoints = {name: self._summarize(self.latencies[name], self.statuses[name], elapsed) for name in names}
+            all_latencies = [value for name in names for value in self.latencies[name]]
+            all_statuses = defaultdict(int)
+            for name in names:
+                for status, count in self.statuses[name].items():
+                    all_statuses[status] += count
+        return {
+            'endpoints': endpoints,
+            'total': self._summarize(all_latencies, all_statuses, elapsed),
+        }
+
+    @staticmethod
+    def _summarize(latencies, statuses, elapsed):
+        values = sorted(latencies)
+        # 429s are the rate limits doing their job, not failures; see
+        # THROTTLE_* in the settings to lift them for a run
+        throttled = statuses.get(429, 0)
+        errors = sum(
+            count for status, count in statuses.items()
+            if not isinstance(status, int) or status == 0 or (status >= 400 and status != 429)
+        )
+        return {
+            'requests': len(values),
+            'errors': errors,
+            'throttled': throttled,
+            'rps': round(len(values) / elapsed, 2) if elapsed else 0.0,
+            'mean_ms': round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+            'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(summary, stream):
+    header = f"{'endpoint':<48} {'reqs':>7} {'err':>5} {'429':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    stream.write(header + '\n' + '-' * len(header) + '\n')
+    rows = list(summary['endpoints'].items()) + [('TOTAL', summary['total'])]
+    for name, stats in rows:
+        stream.write(
+            f"{name:<48} {stats['requests']:>7} {stats['errors']:>5} {stats['throttled']:>5} {stats['rps']:>8.1f} "
+            f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}\n"
+        )
+
+
+def compare(before_path, after_path, stream):
+    """
+    Print the change in throughput and latency between two result files.
+    """
+    with open(before_path) as handle:
+        before = json.load(handle)
+    with open(after_path) as handle:
+        after = json.load(handle)
+
+    stream.write(
+        f"{before['meta'].get('revision')} -> {after['meta'].get('revision')}\n"
+    )
+    header = f"{'endpoint':<48} {'rps':>16} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18}"
+    stream.write(header + '\n' + '-' * len(header) + '\n')
+
+    def delta(old, new):
+        if not old:
+            return f'{new:>8.1f}        '
+        return f'{new:>8.1f} ({(new - old) / old * 100:+5.0f}%)'
+
+    names = sorted(set(before['endpoints']) | set(after['endpoints']))
+    for name in names + ['TOTAL']:
+        old = before['total'] if name == 'TOTAL' else before['endpoints'].get(name)
+        new = after['total'] if name == 'TOTAL' else after['endpoints'].get(name)
+        if old is None or new is None:
+            stream.write(f"{name:<48} {'only in ' + ('after' if old is None else 'before'):>16}\n")
+            continue
+        stream.write(
+            f"{name:<48} {delta(old['rps'], new['rps']):>16} {delta(old['p50_ms'], new['p50_ms']):>18} "
+            f"{delta(old['p95_ms'], new['p95_ms']):>18} {delta(old['p99_ms'], new['p99_ms']):>18}\n"
+        )
@@ -0,0 +1,225 @@
+import itertools
+import uuid
+
+TICKETS = '/api/v1/tickets/'
+PRIORITIES = ['low', 'medium', 'high', 'critical']
+TOPICS = [
+    'Order has not arrived', 'Refund request', 'Payment failed', 'Wrong item delivered',
+    'Cannot log in', 'Invoice is missing', 'Package damaged', 'Change delivery address',
+]
+WORDS = (
+    'order delivery refund payment card account package item tracking number invoice '
+    'address broken late missing charged twice support please help urgent thanks'
+).split()
+
+_sequence = itertools.count(1)
+
+
+def sentence(rng, words=20):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(words // 2, words))).capitalize() + '.'
+
+
+def results(data):
+    """
+    Return the list of items from a list endpoint, paginated or not.
+    """
+    if isinstance(data, dict):
+        return data.get('results') or []
+    return data or []
+
+
+class Scenario:
+    """
+    Base class for a virtual user. setup() runs once, then step() runs in a
+    loop until the test ends.
+    """
+
+    def __init__(self, client, rng, options, index):
+        self.client = client
+        self.rng = rng
+        self.options = options
+        self.index = index
+
+    def setup(self):
+        pass
+
+    def step(self):
+        raise NotImplementedError
+
+    def pick(self, weighted_actions):
+        actions, weights = zip(*weighted_actions)
+        return self.rng.choices(actions, weights)[0]
+
+    def register(self):
+        email = f'loadtest-{self.options.run_id}-{next(_sequence)}@example.com'
+        status, data = self.client.request(
+            'POST', '/api/v1/users/auth/register/', 'POST /api/v1/users/auth/register/',
+            body={
+                'email': email,
+                'username': email.split('@')[0],
+                'password': self.options.password,
+                'password_confirmation': self.options.password,
+                'first_name': 'Load',
+                'last_name': 'Test',
+            }
+        )
+        if status == 201:
+            self.client.access_token = data['access']
+        return email
+
+    def login(self, email, password):
+        status, data = self.client.request(
+            'POST', '/api/v1/users/auth/login/', 'POST /api/v1/users/auth/login/',
+            body={'email': email, 'password': password}
+        )
+        if status == 200:
+            self.client.access_token = data['access']
+            return data.get('user')
+        return None
+
+    def refresh(self):
+        status, data = self.client.request(
+            'POST', '/api/v1/users/auth/refresh/', 'POST /api/v1/users/auth/refresh/'
+        )
+        if status == 200:
+            self.client.access_token = data['access']
+        return status
+
+
+class CustomerScenario(Scenario):
+    """
+    A customer who opens tickets, follows up with messages and checks on
+    their tickets.
+    """
+
+    def setup(self):
+        self.register()
+        self.tickets = []
+
+    def step(self):
+        if not self.tickets:
+            return self.create_ticket()
+        self.pick([
+            (self.create_ticket, 2),
+            (self.post_message, 4),
+            (self.view_ticket, 3),
+            (self.view_messages, 3),
+            (self.list_my_tickets, 2),
+        ])()
+
+    def create_ticket(self):
+        status, data = self.client.request(
+            'POST', TICKETS, 'POST /api/v1/tickets/',
+            body={
+                'topic': self.rng.choice(TOPICS),
+                'description': sentence(self.rng, 60),
+                'priority': self.rng.choice(PRIORITIES),
+            }
+        )
+        if status == 201:
+            self.tickets = (self.tickets + [data['id']])[-20:]
+
+    def post_message(self):
+        ticket_id = self.rng.choice(self.tickets)
+        self.client.request(
+            'POST', f'{TICKETS}{ticket_id}/messages/', 'POST /api/v1/tickets/{id}/messages/',
+            body={'message': sentence(self.rng, 30)}
+        )
+
+    def view_ticket(self):
+        ticket_id = self.rng.choice(self.tickets)
+        self.client.request('GET', f'{TICKETS}{ticket_id}/', 'GET /api/v1/tickets/{id}/')
+
+    def view_messages(self):
+        ticket_id = self.rng.choice(self.tickets)
+        self.client.request('GET', f'{TICKETS}{ticket_id}/messages/', 'GET /api/v1/tickets/{id}/messages/')
+
+    def list_my_tickets(self):
+        self.client.request('GET', '/api/v1/my-tickets/', 'GET /api/v1/my-tickets/')
+
+
+class AgentScenario(Scenario):
+    """
+    A support agent who polls their assigned tickets, claims open tickets and
+    works on them.
+    """
+
+    def setup(self):
+        email, password = self.options.agents[self.index % len(self.options.agents)]
+        user = self.login(email, password)
+        self.user_id = user and user['id']
+        self.assigned = []
+
+    def step(self):
+        if not self.user_id:
+            return
+        self.pick([
+            (self.poll_assigned, 6),
+            (self.claim_open_ticket, 1),
+            (self.update_ticket, 2),
+            (self.reply, 2),
+        ])()
+
+    def poll_assigned(self):
+        status, data = self.client.request('GET', '/api/v1/assigned-tickets/', 'GET /api/v1/assigned-tickets/')
+        if status == 200:
+            self.assigned = [ticket['id'] for ticket in results(data) if ticket['status'] != 'closed'][:50]
+
+    def claim_open_ticket(self):
+        status, data = self.client.request(
+            'GET', TICKETS, 'GET /api/v1/tickets/?status=open', params={'status': 'open'}
+        )
+        open_tickets = [ticket for ticket in results(data) if not ticket.get('assigned_to')] if status == 200 else []
+        if open_tickets:
+            ticket = self.rng.choice(open_tickets[:50])
+            self.client.request(
+                'PUT', f"{TICKETS}{ticket['id']}/", 'PUT /api/v1/tickets/{id}/',
+                body={'assigned_to': self.user_id, 'status': 'in_progress'}
+            )
+
+    def update_ticket(self):
+        if not self.assigned:
+            return self.poll_assigned()
+        ticket_id = self.rng.choice(self.assigned)
+        body = self.pick([
+            ({'priority': self.rng.choice(PRIORITIES)}, 3),
+            ({'status': 'resolved'}, 2),
+            ({'status': 'closed'}, 1),
+        ])
+        self.client.request('PUT', f'{TICKETS}{ticket_id}/', 'PUT /api/v1/tickets/{id}/', body=body)
+
+    def reply(self):
+        if not self.assigned:
+            return self.poll_assigned()
+        ticket_id = self.rng.choice(self.assigned)
+        self.client.request(
+            'POST', f'{TICKETS}{ticket_id}/messages/', 'POST /api/v1/tickets/{id}/messages/',
+            body={'message': sentence(self.rng, 40)}
+        )
+
+
+class AuthScenario(Scenario):
+    """
+    A user who logs in and keeps their session alive with token refreshes.
+    """
+
+    def setup(self):
+        self.email = self.register()
+
+    def step(self):
+        if self.login(self.email, self.options.password) is None:
+            return
+        for _ in range(self.rng.randint(1, 3)):
+            if self.refresh() != 200:
+                break
+
+
+SCENARIOS = {
+    'customer': CustomerScenario,
+    'agent': AgentScenario,
+    'auth': AuthScenario,
+}
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:8]